@@ -1,19 +1,229 @@
 import os
-from sqlalchemy import create_engine
+import time
+import threading
+from uuid import uuid4
+from fastapi import Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from app.utils.pool_metrics import TimedQueuePool, TimedAsyncQueuePool
+from app.utils.request_metrics import REQUEST_METRICS, REQUEST_PROFILING, instrument_engine
+from app.utils.slow_queries import SLOW_QUERY_MS, log_slow_queries
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# ----------------------------
+# Connection pool settings
+# ----------------------------
+# Keep DB_POOL_SIZE + DB_MAX_OVERFLOW at or above the threadpool size (40) per worker, and
+# (pool + overflow) * workers below the server's max_connections.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 disables
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"  # drop dead connections after a failover
+# Behind pgbouncer in transaction mode: no app-side pool and no server-side prepared statements
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    # psycopg2 never uses server-side prepared statements, so only asyncpg needs special handling
+    if DB_PGBOUNCER:
+        # pgbouncer does the pooling; a second pool in front of it only hides its queue
+        options = {"poolclass": NullPool}
+        if url.startswith("postgresql+asyncpg"):
+            # asyncpg prepares every statement; named prepared statements don't survive
+            # transaction pooling, so turn the caches off and use unique names
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        return options
+    if url.startswith("sqlite") and ":memory:" in url:
+        return {}  # single shared connection, nothing to tune
+    return {
+        "poolclass": TimedAsyncQueuePool if is_async else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+if REQUEST_METRICS or REQUEST_PROFILING:
+    # per-request SQL statement count / DB time / rows for /metrics and X-Profile
+    instrument_engine(engine)
+if SLOW_QUERY_MS:
+    # statements over SLOW_QUERY_MS go to the slow query log, with sampled plans
+    log_slow_queries(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
-# Dependency for FastAPI routes
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# ----------------------------
+# Read replica (DATABASE_READ_URL)
+# ----------------------------
+# Report/export endpoints use get_read_db, which reads from the replica unless:
+#   - no replica is configured,
+#   - the request sends "X-Force-Primary: 1" (read-your-writes right after a change), or
+#   - replica lag is above DB_REPLICA_MAX_LAG seconds (or the replica is unreachable).
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "2"))
+FORCE_PRIMARY_HEADER = "X-Force-Primary"
+
+# 0 when the replica has replayed everything it received, else seconds since the last replayed commit
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+read_engine = None
+ReadSessionLocal = None
+if DATABASE_READ_URL:
+    read_engine = create_engine(DATABASE_READ_URL, **engine_options(DATABASE_READ_URL))
+    read_engine.pool.metrics_name = "replica"
+    if REQUEST_METRICS or REQUEST_PROFILING:
+        instrument_engine(read_engine)
+    if SLOW_QUERY_MS:
+        log_slow_queries(read_engine)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+_replica_lag = {"seconds": 0.0, "checked_at": float("-inf")}
+_replica_lag_lock = threading.Lock()
+
+
+def _lag_is_stale() -> bool:
+    return time.monotonic() - _replica_lag["checked_at"] >= DB_REPLICA_LAG_CHECK_INTERVAL
+
+
+def replica_lag() -> float:
+    """
+    Replica lag in seconds, re-measured at most every DB_REPLICA_LAG_CHECK_INTERVAL seconds.
+    An unreachable replica reports infinite lag so callers fall back to the primary.
+    """
+    if _lag_is_stale():
+        with _replica_lag_lock:
+            if _lag_is_stale():
+                if read_engine.dialect.name != "postgresql":
+                    lag = 0.0  # e.g. a local SQLite copy; nothing to measure
+                else:
+                    try:
+                        with read_engine.connect() as conn:
+                            lag = float(conn.execute(REPLICA_LAG_SQL).scalar() or 0)
+                    except Exception:
+                        lag = float("inf")
+                _replica_lag.update(seconds=lag, checked_at=time.monotonic())
+    return _replica_lag["seconds"]
+
+
+def use_replica(request: Request) -> bool:
+    if read_engine is None or request.headers.get(FORCE_PRIMARY_HEADER) == "1":
+        return False
+    return replica_lag() <= DB_REPLICA_MAX_LAG
+
+
+def get_read_db(request: Request, primary=Depends(get_db)):
+    # falling back reuses the request's primary session (the auth dependencies already hold it)
+    if not use_replica(request):
+        yield primary
+        return
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def stream_rows(request: Request, query, batch_size: int = 1000):
+    """
+    Rows of `query` for a streamed response, read through a session of the stream's own (replica
+    or primary, as get_read_db would pick): the request's sessions are closed before the stream
+    is done. The session opens with the first row and closes when the stream ends or is dropped.
+    """
+    db = ReadSessionLocal() if use_replica(request) else SessionLocal()
+    try:
+        yield from query.with_session(db).yield_per(batch_size)
+    finally:
+        db.close()
+
+
+# ----------------------------
+# Optional async engine (USE_ASYNC_DB=1)
+# ----------------------------
+# Used by the async versions of the hot endpoints (app/routers/async_routes.py), which
+# don't tie up a threadpool worker while waiting on the database.
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+USE_ASYNC_DB = os.getenv("USE_ASYNC_DB", "0") == "1"
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (to_async_url(DATABASE_URL) if DATABASE_URL else None)
+
+async_engine = None
+AsyncSessionLocal = None
+if USE_ASYNC_DB:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+    async_engine.sync_engine.pool.metrics_name = "async"
+    if REQUEST_METRICS or REQUEST_PROFILING:
+        instrument_engine(async_engine.sync_engine)
+    if SLOW_QUERY_MS:
+        log_slow_queries(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+AsyncReadSessionLocal = None
+if USE_ASYNC_DB and DATABASE_READ_URL:
+    ASYNC_DATABASE_READ_URL = to_async_url(DATABASE_READ_URL)
+    async_read_engine = create_async_engine(
+        ASYNC_DATABASE_READ_URL, **engine_options(ASYNC_DATABASE_READ_URL, is_async=True)
+    )
+    async_read_engine.sync_engine.pool.metrics_name = "async_replica"
+    if REQUEST_METRICS or REQUEST_PROFILING:
+        instrument_engine(async_read_engine.sync_engine)
+    if SLOW_QUERY_MS:
+        log_slow_queries(async_read_engine.sync_engine)
+    AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_read_db(request: Request, primary=Depends(get_async_db)):
+    replica = AsyncReadSessionLocal is not None and request.headers.get(FORCE_PRIMARY_HEADER) != "1"
+    if replica:
+        # the lag probe is a blocking query; only leave the event loop when it's actually due
+        lag = await run_in_threadpool(replica_lag) if _lag_is_stale() else _replica_lag["seconds"]
+        replica = lag <= DB_REPLICA_MAX_LAG
+    if not replica:
+        yield primary
+        return
+    async with AsyncReadSessionLocal() as db:
+        yield db
@@ -1,7 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app import database
 from app.database import engine, Base
-from app.routers import auth, superadmin, administrator, teacher, classes, attendance
+from app.routers import auth, superadmin, administrator, teacher, classes, attendance, imports, async_routes, internal
+from app.utils.import_jobs import resume_pending_imports
+from app.utils.change_bus import change_bus
+from app.utils.request_metrics import REQUEST_METRICS, REQUEST_PROFILING, RequestMetricsMiddleware
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.compression import COMPRESSION, CompressionMiddleware
+from app.utils.admission import ADMISSION_CONTROL, AdmissionMiddleware
 
 # Initialize app
 app = FastAPI(
@@ -10,23 +17,68 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# ✅ Allow frontend requests (Flutter Web / Desktop running on localhost:55304)
+# gzip/brotli by Accept-Encoding; inside the metrics and profiling middleware so their
+# timings include the compression
+if COMPRESSION:
+    app.add_middleware(CompressionMiddleware)
+
+# X-Profile: <superadmin token> profiles one request in place, off unless REQUEST_PROFILING=1
+# (added first so it runs inside the metrics middleware and shares its SQL hooks)
+if REQUEST_PROFILING:
+    app.add_middleware(ProfilingMiddleware)
+
+# Priority queues and load shedding (429 + Retry-After), off unless ADMISSION_CONTROL=1; inside
+# the metrics middleware so shed requests and the time spent queueing show up in /metrics
+if ADMISSION_CONTROL:
+    app.add_middleware(AdmissionMiddleware)
 
+# Per-route latency and SQL counts, scraped from /metrics
+if REQUEST_METRICS:
+    app.add_middleware(RequestMetricsMiddleware)
+
+# ✅ Allow frontend requests (Flutter Web / Desktop running on localhost:55304)
+# Added last so it is the outermost middleware: preflights are answered before admission control
+# and the 429s it sends carry the CORS headers (and expose Retry-After) like any other response.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],        # or ["*"] to allow all
     allow_credentials=True,
     allow_methods=["*"],          # allow all methods (GET, POST, PUT, DELETE)
     allow_headers=["*"],          # allow all headers (Authorization, Content-Type, etc.)
+    expose_headers=["Retry-After"],
 )
 
 # Include routers
+# Async hot endpoints first: the first matching route wins, so they replace the sync ones
+if database.USE_ASYNC_DB:
+    app.include_router(async_routes.router)
+
 app.include_router(auth.router)
 app.include_router(superadmin.router)
 app.include_router(administrator.router)
 app.include_router(teacher.router)
 app.include_router(classes.router)
 app.include_router(attendance.router)
+app.include_router(imports.router)
+app.include_router(internal.router)
+app.include_router(internal.metrics_router)
+
+
+@app.on_event("startup")
+def resume_imports():
+    # pick up background imports interrupted by a restart
+    resume_pending_imports()
+
+
+@app.on_event("startup")
+def start_change_bus():
+    # hear about writes handled by the other workers (caches, live attendance streams)
+    change_bus.start()
+
+
+@app.on_event("shutdown")
+def stop_change_bus():
+    change_bus.stop()
 
 # Health check
 @app.get("/")
@@ -1,8 +1,8 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, Boolean, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
-from sqlalchemy import DateTime, JSON
+from sqlalchemy import DateTime, JSON, LargeBinary
 from sqlalchemy.sql import func
 
 # -----------------------------
@@ -53,6 +53,22 @@ class School(Base):
     classes = relationship("Class", back_populates="school")
 
 
+# -----------------------------
+# School calendar (instructional days, one row per academic year)
+# -----------------------------
+class SchoolCalendar(Base):
+    __tablename__ = "school_calendars"
+    __table_args__ = (UniqueConstraint("school_id", "year", name="uq_school_calendar_year"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    school_id = Column(Integer, ForeignKey("schools.id", ondelete="CASCADE"), nullable=False)
+    year = Column(Integer, nullable=False)  # calendar year the academic year starts in
+    # one bit per day from the year's first day, 1 = instructional; see app/utils/school_calendar.py
+    days = Column(LargeBinary, nullable=False)
+    weekdays = Column(Integer, nullable=False)  # bitmask of the weekly pattern (bit 0 = Monday)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
 # -----------------------------
 # Teacher
 # -----------------------------
@@ -103,7 +119,15 @@ class Student(Base):
     created_at = Column(DateTime, server_default=func.now())
     class_id = Column(Integer, ForeignKey("classes.id"), nullable=False)
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
-    face_embedding=Column(JSON,nullable=True)
+    # raw vector bytes, see app/utils/face_embeddings.py
+    face_embedding = Column(LargeBinary, nullable=True)
+    face_embedding_dim = Column(Integer, nullable=True)
+    face_embedding_dtype = Column(String(10), nullable=True)  # float32 / float16
+    face_embedding_model = Column(String(50), nullable=True)
+    face_samples = Column(LargeBinary, nullable=True)  # every enrolled sample; face_embedding is their centroid
+    face_sample_count = Column(Integer, nullable=True)
+    # bumped on every ORM update; with the embedding count it fingerprints a school's ANN index
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     # Relationships
     class_ = relationship("Class", back_populates="students")
@@ -116,6 +140,9 @@ class Student(Base):
     
 class Attendance(Base):
     __tablename__ = "attendance"
+    # one record per student per day (every marking path stores midnight); lets marking upsert
+    # on (student_id, date)
+    __table_args__ = (UniqueConstraint("student_id", "date", name="uq_attendance_student_date"),)
     id = Column(Integer, primary_key=True, index=True)
     date = Column(DateTime, server_default=func.now())
     status = Column(String(10), nullable=False)  # Present/Absent
@@ -125,3 +152,27 @@ class Attendance(Base):
     student = relationship("Student", back_populates="attendances")
     teacher = relationship("Teacher", back_populates="attendances")
 
+
+# -----------------------------
+# Import jobs (chunked uploads processed in the background)
+# -----------------------------
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(20), nullable=False)  # teachers / classes / students
+    filename = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False, default="uploading")  # uploading/queued/running/done/failed
+    school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
+    administrator_id = Column(Integer, ForeignKey("administrators.id"), nullable=False)
+    total_bytes = Column(Integer, nullable=False)
+    received_bytes = Column(Integer, nullable=False, default=0)
+    rows_processed = Column(Integer, nullable=False, default=0)  # checkpoint: rows committed so far
+    rows_imported = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    errors = Column(JSON, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    owner = Column(String(32), nullable=True)  # token of the worker running it; checkpoints require it
+    finished_at = Column(DateTime, nullable=True)
@@ -1,27 +1,61 @@
 # app/routers/administrator.py
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from passlib.context import CryptContext
-from typing import List, Optional
-from datetime import datetime
+from sqlalchemy import func, update
+from typing import List, Optional, Tuple
+from datetime import date, datetime, timedelta
+import time
 
 from app import models, schemas, database
-from app.utils.auth_utils import get_current_user, RoleChecker
+from app.utils.auth_utils import get_current_user, get_password_hash, RoleChecker
 from app.utils.excel_utils import (
-    read_teachers_excel,
-    read_classes_excel,
-    read_students_excel,
+    read_teachers_upload,
+    read_classes_upload,
+    read_students_upload,
     generate_attendance_excel,
+    generate_attendance_csv,
+    XLSX_MEDIA_TYPE,
+    CSV_MEDIA_TYPE,
 )
-
-router = APIRouter(prefix="/administrator", tags=["Administrator"])
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.utils.import_jobs import import_class_row, import_student_rows, import_teacher_rows
+from app.utils.embedding_cache import embedding_cache
+from app.utils.face_embeddings import (
+    FACE_EMBEDDING_DIM,
+    FACE_MATCH_THRESHOLD,
+    decode_embedding,
+    read_samples_upload,
+    sample_columns,
+    set_student_embedding,
+)
+from app.utils.ann_index import school_indexes
+from app.utils.attendance_utils import attendance_totals_query, mark_present, today_start, unmarked_today_query
+from app.utils.live_attendance import school_attendance_events
+from app.utils.school_calendar import (
+    academic_year,
+    build_days,
+    calendar_cache,
+    expected_days,
+    expected_range,
+    weekday_mask,
+    YearCalendar,
+)
+from app.utils.change_bus import change_bus
+from app.utils.query_budget import query_budget
+from app.utils.fast_json import schema_columns, rows_response
+from app.utils.lazy_imports import LazyModule
+
+# SQL statements per request, auth lookups included; reports must not grow with the school size
+router = APIRouter(prefix="/administrator", tags=["Administrator"], dependencies=[Depends(query_budget(8))])
+# uploads write one row per line (batched into few statements on PostgreSQL, not on SQLite),
+# so they only get the repeated-SELECT check
+upload_budget = query_budget(None)
+
+np = LazyModule("numpy")  # face enrollment only
 admin_required = RoleChecker(["administrator"])
 get_db = database.get_db
+get_read_db = database.get_read_db  # reports/exports: replica when configured and caught up
 
 
 # ----------------------------
@@ -55,7 +89,7 @@ def create_teacher(
     if db.query(models.Teacher).filter(models.Teacher.email == teacher.email).first():
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = pwd_context.hash(teacher.password)
+    hashed_pw = get_password_hash(teacher.password)
     new_teacher = models.Teacher(
         name=teacher.name,
         email=teacher.email,
@@ -65,6 +99,7 @@ def create_teacher(
     db.add(new_teacher)
     db.commit()
     db.refresh(new_teacher)
+    change_bus.publish("teacher", new_teacher.school_id, new_teacher.id)
     return new_teacher
 
 
@@ -93,10 +128,11 @@ def update_teacher(
     if teacher.email:
         db_teacher.email = teacher.email
     if teacher.password:
-        db_teacher.password = pwd_context.hash(teacher.password)
+        db_teacher.password = get_password_hash(teacher.password)
 
     db.commit()
     db.refresh(db_teacher)
+    change_bus.publish("teacher", db_teacher.school_id, db_teacher.id)
     return db_teacher
 
 
@@ -113,12 +149,14 @@ def delete_teacher(
     if not teacher:
         raise HTTPException(status_code=404, detail="Teacher not found")
 
+    school_id = school.id
     db.delete(teacher)
     db.commit()
+    change_bus.publish("teacher", school_id, teacher_id)
     return {"detail": "Teacher deleted"}
 
 
-@router.post("/teachers/upload-excel", dependencies=[Depends(admin_required)])
+@router.post("/teachers/upload-excel", dependencies=[Depends(admin_required), Depends(upload_budget)])
 def upload_teachers(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -126,25 +164,98 @@ def upload_teachers(
 ):
     school = get_admin_school(db, admin.id)
     """
-    Excel should contain columns: name,email,password (password can be plain; it'll be hashed)
-    read_teachers_excel must return an iterable of Pydantic-like objects with .name/.email/.password
+    Excel (.xlsx) or CSV should contain columns: name,email,password (password can be plain; it'll be hashed)
+    For large files use the chunked upload under /imports, which runs in the background.
+    read_teachers_upload must return an iterable of Pydantic-like objects with .name/.email/.password
     """
-    teachers = read_teachers_excel(file.file)
-    count = 0
-    for t in teachers:
-        if not db.query(models.Teacher).filter(models.Teacher.email == t.email).first():
-            db_teacher = models.Teacher(
-                name=t.name,
-                email=t.email,
-                password=pwd_context.hash(t.password),
-                school_id=school.id,
-            )
-            db.add(db_teacher)
-            count += 1
+    teachers = read_teachers_upload(file)
+    school_id = school.id
+    count = import_teacher_rows(db, school_id, teachers)
     db.commit()
+    change_bus.publish("teacher", school_id)
     return {"message": f"{count} teachers imported successfully"}
 
 
+# ----------------------------
+# 📸 Face Enrollment (many samples per student, whole class per request)
+# ----------------------------
+@router.post("/classes/{class_id}/enroll", dependencies=[Depends(admin_required), Depends(query_budget(10))])
+def enroll_class_faces(
+    class_id: int,
+    file: UploadFile = File(...),
+    student_ids: str = Form(...),
+    append: bool = Query(False),
+    model_version: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    admin=Depends(get_admin_user),
+):
+    """
+    Upload face samples for a class as a .npy file or raw little-endian float32 bytes.
+    - shape (students, samples, dim): `student_ids` lists one id per student
+    - shape (samples, dim): `student_ids` lists one id per sample row
+    `student_ids` is comma-separated. Each student's samples replace (or with append=true,
+    extend) what is stored, and their normalised centroid becomes face_embedding.
+    """
+    start = time.perf_counter()
+    school = get_admin_school(db, admin.id)
+    cls = db.query(models.Class).filter(models.Class.id == class_id, models.Class.school_id == school.id).first()
+    if not cls:
+        raise HTTPException(status_code=404, detail="Class not found")
+
+    data = file.file.read()
+    try:
+        samples = read_samples_upload(data, is_npy=data[:6] == b"\x93NUMPY")
+        ids = [int(x) for x in student_ids.split(",") if x.strip()]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(ids) != samples.shape[0]:
+        raise HTTPException(status_code=400, detail=f"Got {len(ids)} student ids for {samples.shape[0]} rows")
+
+    by_student = {}
+    for student_id, rows in zip(ids, samples):
+        by_student.setdefault(student_id, []).append(rows.reshape(-1, FACE_EMBEDDING_DIM))
+
+    columns = [models.Student.id] + ([models.Student.face_samples, models.Student.face_embedding_dtype] if append else [])
+    existing = {
+        r.id: r
+        for r in db.query(*columns)
+        .filter(models.Student.id.in_(by_student), models.Student.class_id == cls.id)
+        .all()
+    }
+    missing = sorted(set(by_student) - set(existing))
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Students not in this class: {missing}")
+
+    mappings = []
+    for student_id, parts in by_student.items():
+        student_samples = np.concatenate(parts)
+        old = existing[student_id]
+        if append and old.face_samples:
+            previous = decode_embedding(old.face_samples, old.face_embedding_dtype).reshape(-1, FACE_EMBEDDING_DIM)
+            student_samples = np.concatenate([previous, student_samples])
+        mappings.append({"id": student_id, **sample_columns(student_samples, model_version)})
+
+    # one executemany UPDATE, one commit
+    db.execute(update(models.Student), mappings)
+    db.commit()
+
+    embedding_cache.invalidate(cls.id)
+    school_indexes.students_enrolled(
+        db,
+        school.id,
+        [m["id"] for m in mappings],
+        np.stack([decode_embedding(m["face_embedding"]) for m in mappings]),
+    )
+    change_bus.publish("class", school.id, cls.id)
+    change_bus.publish("student", school.id, *(m["id"] for m in mappings))
+    return {
+        "class_id": cls.id,
+        "students_enrolled": len(mappings),
+        "samples_stored": sum(m["face_sample_count"] for m in mappings),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
 # ----------------------------
 # 🏫 Class Management
 # ----------------------------
@@ -166,6 +277,7 @@ def create_class(
     db.add(db_class)
     db.commit()
     db.refresh(db_class)
+    change_bus.publish("class", db_class.school_id, db_class.id)
     return db_class
 
 
@@ -201,6 +313,7 @@ def update_class(
 
     db.commit()
     db.refresh(db_class)
+    change_bus.publish("class", db_class.school_id, db_class.id)
     return db_class
 
 
@@ -217,12 +330,14 @@ def delete_class(
     if not db_class:
         raise HTTPException(status_code=404, detail="Class not found")
 
+    school_id = school.id
     db.delete(db_class)
     db.commit()
+    change_bus.publish("class", school_id, class_id)
     return {"detail": "Class deleted"}
 
 
-@router.post("/classes/upload-excel", dependencies=[Depends(admin_required)])
+@router.post("/classes/upload-excel", dependencies=[Depends(admin_required), Depends(upload_budget)])
 def upload_classes(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -230,17 +345,18 @@ def upload_classes(
 ):
     school = get_admin_school(db, admin.id)
     """
-    Excel should contain columns: name,teacher_id
+    Excel (.xlsx) or CSV should contain columns: name,teacher_id
     Note: teacher_id should refer to teacher belonging to same school (we do not enforce here; you can extend)
-    read_classes_excel should return objects with .name and .teacher_id
+    read_classes_upload should return objects with .name and .teacher_id
     """
-    classes = read_classes_excel(file.file)
+    classes = read_classes_upload(file)
+    school_id = school.id
     count = 0
     for c in classes:
-        db_class = models.Class(name=c.name, teacher_id=c.teacher_id, school_id=school.id)
-        db.add(db_class)
-        count += 1
+        if import_class_row(db, school_id, c):
+            count += 1
     db.commit()
+    change_bus.publish("class", school_id)
     return {"message": f"{count} classes imported successfully"}
 
 
@@ -265,12 +381,18 @@ def create_student(
     db.add(new_student)
     db.commit()
     db.refresh(new_student)
+    change_bus.publish("student", new_student.school_id, new_student.id)
     return new_student
 
 @router.get("/students", response_model=List[schemas.StudentOut], dependencies=[Depends(admin_required)])
 def list_students(db: Session = Depends(get_db), admin=Depends(get_admin_user)):
     school = get_admin_school(db, admin.id)
-    return db.query(models.Student).join(models.Class).filter(models.Class.school_id == school.id).all()
+    students = (
+        db.query(*schema_columns(schemas.StudentOut, models.Student))
+        .join(models.Class, models.Student.class_id == models.Class.id)
+        .filter(models.Class.school_id == school.id)
+    )
+    return rows_response(schemas.StudentOut, students)
 
 
 @router.put("/students/{student_id}", response_model=schemas.StudentOut, dependencies=[Depends(admin_required)])
@@ -286,6 +408,7 @@ def update_student(
     ).first()
     if not db_student:
         raise HTTPException(status_code=404, detail="Student not found")
+    old_class_id, old_school_id = db_student.class_id, db_student.school_id
 
     if student.name:
         db_student.name = student.name
@@ -296,41 +419,92 @@ def update_student(
     if student.school_id:
         db_student.school_id = student.school_id
     if student.face_embedding:
-        db_student.face_embedding = student.face_embedding
-
+        try:
+            set_student_embedding(db_student, student.face_embedding, student.face_embedding_model)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     db.commit()
+    if student.face_embedding or db_student.class_id != old_class_id:
+        embedding_cache.invalidate(old_class_id, db_student.class_id)
+        change_bus.publish("class", db_student.school_id, old_class_id, db_student.class_id)
+    if student.face_embedding or db_student.school_id != old_school_id:
+        school_indexes.student_changed(db, db_student, old_school_id)
     db.refresh(db_student)
+    change_bus.publish("student", db_student.school_id, db_student.id)
     return db_student
 
 
-@router.post("/students/upload-excel", dependencies=[Depends(admin_required)])
+@router.post("/students/upload-excel", dependencies=[Depends(admin_required), Depends(upload_budget)])
 def upload_students(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     admin=Depends(get_admin_user),
 ):
     """
-    Excel expected to contain student id (existing) and fields to update (name, roll_no).
-    read_students_excel should return objects with .id, .name, .roll_no
+    Excel (.xlsx) or CSV expected to contain student id (existing) and fields to update (name, roll_no).
+    read_students_upload should return objects with .id, .name, .roll_no
     """
-    students = read_students_excel(file.file)
-    count = 0
-    for s in students:
-        db_student = db.query(models.Student).filter(models.Student.id == s.id).first()
-        if db_student:
-            school = get_admin_school(db, admin.id)
-            # Only update if student belongs to admin's school
-            cls = db.query(models.Class).filter(models.Class.id == db_student.class_id).first()
-            if not cls or cls.school_id != school.id:
-                continue
-            db_student.name = s.name
-            db_student.roll_no = s.roll_no
-            count += 1
+    students = read_students_upload(file)
+    school = get_admin_school(db, admin.id)
+    school_id = school.id
+    count = import_student_rows(db, school_id, students)
     db.commit()
+    change_bus.publish("student", school_id)
     return {"message": f"{count} students updated successfully"}
 
 
+# ----------------------------
+# 📅 School Calendar
+# ----------------------------
+@router.get("/calendar", response_model=schemas.SchoolCalendarOut, dependencies=[Depends(admin_required)])
+def get_school_calendar(
+    year: Optional[int] = Query(None, ge=1900),
+    db: Session = Depends(get_db),
+    admin=Depends(get_admin_user),
+):
+    """
+    Instructional days of an academic year (default: the current one), as the weekly pattern
+    plus the holidays and extra days that differ from it.
+    """
+    school = get_admin_school(db, admin.id)
+    year = year or academic_year(date.today())
+    return calendar_cache.get(db, school.id, [year])[year].describe()
+
+
+@router.put("/calendar/{year}", response_model=schemas.SchoolCalendarOut, dependencies=[Depends(admin_required)])
+def set_school_calendar(
+    year: int,
+    data: schemas.SchoolCalendarIn,
+    db: Session = Depends(get_db),
+    admin=Depends(get_admin_user),
+):
+    """
+    Replace the academic year starting in `year`. Attendance percentages are computed against
+    its instructional days.
+    """
+    if not all(0 <= d <= 6 for d in data.weekdays):
+        raise HTTPException(status_code=400, detail="Weekdays go from 0 (Monday) to 6 (Sunday)")
+    try:
+        days = build_days(year, data.weekdays, data.holidays, data.extra_days)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    school = get_admin_school(db, admin.id)
+    school_id = school.id
+    calendar = db.query(models.SchoolCalendar).filter(
+        models.SchoolCalendar.school_id == school_id, models.SchoolCalendar.year == year
+    ).first()
+    if calendar is None:
+        calendar = models.SchoolCalendar(school_id=school_id, year=year)
+        db.add(calendar)
+    calendar.days = days
+    calendar.weekdays = weekday_mask(data.weekdays)
+    db.commit()
+    calendar_cache.invalidate(school_id)
+    change_bus.publish("calendar", school_id, year)
+    return YearCalendar(year, days, tuple(sorted(set(data.weekdays))), stored=True).describe()
+
+
 # ----------------------------
 # 📊 Attendance Stats + Excel
 # ----------------------------
@@ -347,6 +521,20 @@ def _apply_date_filters(query, date_column, month: Optional[int], year: Optional
     return query
 
 
+def _report_range(month: Optional[int], year: Optional[int], start_date: Optional[datetime], end_date: Optional[datetime]) -> Tuple[Optional[date], Optional[date]]:
+    """
+    First and last day the same filters cover (None where open-ended), for the expected days.
+    """
+    first = start_date.date() if start_date else None
+    last = end_date.date() if end_date else None
+    if month and year:
+        month_first = date(year, month, 1)
+        month_last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        first = max(first, month_first) if first else month_first
+        last = min(last, month_last) if last else month_last
+    return first, last
+
+
 @router.get("/attendance/student/{student_id}", dependencies=[Depends(admin_required)])
 def student_attendance(
     student_id: int,
@@ -354,7 +542,7 @@ def student_attendance(
     year: Optional[int] = Query(None, ge=1900),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     admin=Depends(get_admin_user),
 ):
     school = get_admin_school(db, admin.id)
@@ -369,11 +557,18 @@ def student_attendance(
     records = q.all()
     total = len(records)
     present = len([r for r in records if r.status.lower() == "present"])
+    # instructional days in the range, so unrecorded days count against the rate
+    first, last = _report_range(month, year, start_date, end_date)
+    dates = [r.date for r in records]
+    expected = int(expected_days(db, school.id, [
+        expected_range(first, last, min(dates, default=None), max(dates, default=None))
+    ])[0])
     return {
         "student": student.name,
         "total_classes": total,
+        "expected_days": expected,
         "present": present,
-        "attendance_%": (present / total * 100) if total else 0,
+        "attendance_%": (present / expected * 100) if expected else 0,
     }
 
 
@@ -384,7 +579,7 @@ def class_attendance(
     year: Optional[int] = Query(None, ge=1900),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     admin=Depends(get_admin_user),
 ):
     school = get_admin_school(db, admin.id)
@@ -395,14 +590,24 @@ def class_attendance(
         raise HTTPException(status_code=404, detail="Class not found")
 
     students = db.query(models.Student).filter(models.Student.class_id == db_class.id).all()
+    q = attendance_totals_query(db, models.Student.id, models.Student.class_id == db_class.id)
+    q = _apply_date_filters(q, models.Attendance.date, month, year, start_date, end_date)
+    totals = {student_id: (total, present or 0, first, last) for student_id, total, present, _, first, last in q}
+    # with a date filter, students with no records in it are expected every day of it
+    first, last = _report_range(month, year, start_date, end_date)
+    expected = expected_days(db, school.id, [
+        expected_range(first, last, *totals.get(s.id, (0, 0, None, None))[2:]) for s in students
+    ]).tolist()
     stats = []
-    for s in students:
-        q = db.query(models.Attendance).filter(models.Attendance.student_id == s.id)
-        q = _apply_date_filters(q, models.Attendance.date, month, year, start_date, end_date)
-        records = q.all()
-        total = len(records)
-        present = len([r for r in records if r.status.lower() == "present"])
-        stats.append({"student": s.name, "present": present, "total": total})
+    for s, student_expected in zip(students, expected):
+        total, present, _, _ = totals.get(s.id, (0, 0, None, None))
+        stats.append({
+            "student": s.name,
+            "present": present,
+            "total": total,
+            "expected": student_expected,
+            "attendance_%": (present / student_expected * 100) if student_expected else 0,
+        })
     return {"class": db_class.name, "stats": stats}
 
 
@@ -412,76 +617,215 @@ def school_attendance(
     year: Optional[int] = Query(None, ge=1900),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     admin=Depends(get_admin_user),
 ):
     school = get_admin_school(db, admin.id)
     classes = db.query(models.Class).filter(models.Class.school_id == school.id).all()
-    school_total, school_present = 0, 0
+    # students belong to the school through their class, like the classes above
+    roster = (
+        db.query(models.Student.id, models.Student.class_id)
+        .join(models.Class, models.Class.id == models.Student.class_id)
+        .filter(models.Class.school_id == school.id)
+        .all()
+    )
+    # per student, so each one's expected days start at their own first record
+    q = (
+        attendance_totals_query(db, models.Student.id, models.Class.school_id == school.id)
+        .join(models.Class, models.Class.id == models.Student.class_id)
+    )
+    q = _apply_date_filters(q, models.Attendance.date, month, year, start_date, end_date)
+    totals = {student_id: (total, present or 0, first, last) for student_id, total, present, _, first, last in q}
+    first, last = _report_range(month, year, start_date, end_date)
+    expected = expected_days(db, school.id, [
+        expected_range(first, last, *totals.get(student_id, (0, 0, None, None))[2:]) for student_id, _ in roster
+    ]).tolist()
+    by_class = {}  # class id -> [recorded, present, expected]
+    for (student_id, class_id), student_expected in zip(roster, expected):
+        total, present, _, _ = totals.get(student_id, (0, 0, None, None))
+        sums = by_class.setdefault(class_id, [0, 0, 0])
+        sums[0] += total
+        sums[1] += present
+        sums[2] += student_expected
+    school_total, school_present, school_expected = 0, 0, 0
     summary = []
 
     for c in classes:
-        students = db.query(models.Student).filter(models.Student.class_id == c.id).all()
-        class_total, class_present = 0, 0
-        for s in students:
-            q = db.query(models.Attendance).filter(models.Attendance.student_id == s.id)
-            q = _apply_date_filters(q, models.Attendance.date, month, year, start_date, end_date)
-            records = q.all()
-            class_total += len(records)
-            class_present += len([r for r in records if r.status.lower() == "present"])
+        class_total, class_present, class_expected = by_class.get(c.id, (0, 0, 0))
         school_total += class_total
         school_present += class_present
+        school_expected += class_expected
         summary.append({
             "class": c.name,
             "total": class_total,
+            "expected": class_expected,
             "present": class_present,
-            "attendance_%": (class_present / class_total * 100) if class_total else 0
+            "attendance_%": (class_present / class_expected * 100) if class_expected else 0
         })
 
     return {
-        "school_id": admin.school_id,
+        "school_id": school.id,
         "summary": summary,
-        "overall_%": (school_present / school_total * 100) if school_total else 0
+        "overall_%": (school_present / school_expected * 100) if school_expected else 0
     }
 
 
+@router.get("/attendance/unmarked", dependencies=[Depends(admin_required)])
+def unmarked_students(db: Session = Depends(get_db), admin=Depends(get_admin_user)):
+    """
+    Students with no attendance recorded yet today, by class (none on a day the school
+    calendar has off).
+    """
+    school = get_admin_school(db, admin.id)
+    today = today_start().date()
+    instructional = calendar_cache.year(db, school.id, today).is_open(today)
+    students = []
+    if instructional:
+        students = [
+            {"id": sid, "name": name, "roll_no": roll_no, "class_id": class_id}
+            for sid, name, roll_no, class_id in (
+                unmarked_today_query(db, models.Class.school_id == school.id)
+                .join(models.Class, models.Class.id == models.Student.class_id)
+            )
+        ]
+    return {"date": today, "instructional": instructional, "students": students}
+
+
+@router.get("/attendance/live", dependencies=[Depends(admin_required)])
+def live_school_attendance(db: Session = Depends(get_db), admin=Depends(get_admin_user)):
+    """
+    Server-Sent Events stream of today's roll call: a `snapshot` of every class, then a
+    `class` event (marked/present/absent and the change) at most once a second per class
+    as attendance is recorded. Replaces polling /attendance/school.
+    """
+    school = get_admin_school(db, admin.id)
+    # the stream stays open for hours; don't keep this session's pooled connection
+    db.close()
+    return StreamingResponse(
+        school_attendance_events(school.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/attendance/school/excel", dependencies=[Depends(admin_required)])
 def export_school_attendance(
+    request: Request,
     month: Optional[int] = Query(None, ge=1, le=12),
     year: Optional[int] = Query(None, ge=1900),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
-    db: Session = Depends(get_db),
+    fmt: str = Query("xlsx", alias="format", pattern="^(xlsx|csv)$"),
+    db: Session = Depends(get_read_db),
     admin=Depends(get_admin_user),
 ):
+    school = get_admin_school(db, admin.id)
     q = (
-        db.query(models.Attendance)
+        db.query(
+            models.Attendance.id,
+            models.Attendance.student_id,
+            models.Attendance.teacher_id,
+            models.Attendance.status,
+            models.Attendance.date,
+        )
         .join(models.Student)
         .join(models.Class)
-        .filter(models.Class.school_id == admin.school_id)
+        .filter(models.Class.school_id == school.id)
     )
     q = _apply_date_filters(q, models.Attendance.date, month, year, start_date, end_date)
-    records = q.all()
+    # CSV rows are read while the response streams, through the stream's own session
+    rows = database.stream_rows(request, q) if fmt == "csv" else q.yield_per(1000)
 
-    # convert attendance rows into serializable records for excel helper
-    records_for_excel = []
-    for a in records:
-        records_for_excel.append({
+    # convert attendance rows into serializable records for excel/csv helper
+    records = (
+        {
             "id": a.id,
             "student_id": a.student_id,
             "teacher_id": a.teacher_id,
             "status": a.status,
             "date": a.date.isoformat() if a.date else None,
-        })
+        }
+        for a in rows
+    )
+
+    if fmt == "csv":
+        return StreamingResponse(
+            generate_attendance_csv(records),
+            media_type=CSV_MEDIA_TYPE,
+            headers={"Content-Disposition": f"attachment; filename=school_{school.id}_attendance.csv"},
+        )
 
-    buf = generate_attendance_excel(records_for_excel)  # should return BytesIO
+    buf = generate_attendance_excel(list(records))  # should return BytesIO
     buf.seek(0)
     return StreamingResponse(
         buf,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename=school_{admin.school_id}_attendance.xlsx"},
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename=school_{school.id}_attendance.xlsx"},
     )
     
+# ----------------------------
+# 🚪 Gate Camera Recognition (school-wide)
+# ----------------------------
+@router.post("/attendance/school/recognize", response_model=schemas.RecognizeOut, dependencies=[Depends(admin_required)])
+def recognize_school_attendance(
+    payload: schemas.RecognizeRequest,
+    db: Session = Depends(get_db),
+    admin=Depends(get_admin_user),
+):
+    """
+    Match gate-camera probes against every enrolled student in the school using the
+    school's ANN index, and mark matched students present (recorded under their class teacher).
+    """
+    school = get_admin_school(db, admin.id)
+    if not payload.probes:
+        raise HTTPException(status_code=400, detail="No probes given")
+    try:
+        probes = np.asarray(payload.probes, dtype=np.float32)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Probes must all have the same length")
+    if probes.ndim != 2 or probes.shape[1] != FACE_EMBEDDING_DIM:
+        raise HTTPException(status_code=400, detail=f"Probes must have {FACE_EMBEDDING_DIM} values")
+
+    index = school_indexes.get(db, school.id)
+    start = time.perf_counter()
+    threshold = payload.threshold if payload.threshold is not None else FACE_MATCH_THRESHOLD
+    best_ids, scores = index.search(probes)
+    matched = scores >= threshold
+    match_ms = (time.perf_counter() - start) * 1000
+
+    matched_ids = set(best_ids[matched].tolist())
+    students = {}
+    if matched_ids:
+        students = {
+            r.id: r
+            for r in db.query(models.Student.id, models.Student.name, models.Class.teacher_id)
+            .join(models.Class, models.Student.class_id == models.Class.id)
+            .filter(models.Student.id.in_(matched_ids), models.Student.school_id == school.id)
+            .all()
+        }
+    # the index may briefly hold a student that was just moved or deleted
+    matched &= np.isin(best_ids, list(students))
+    matches = [
+        schemas.RecognizeMatch(
+            probe_index=int(i),
+            student_id=int(best_ids[i]),
+            name=students[int(best_ids[i])].name,
+            score=round(float(scores[i]), 4),
+        )
+        for i in np.flatnonzero(matched)
+    ]
+    marked = mark_present(db, {r.id: r.teacher_id for r in students.values()})
+    change_bus.publish("attendance", school.id, *students)
+
+    return schemas.RecognizeOut(
+        school_id=school.id,
+        matches=matches,
+        unmatched_probes=np.flatnonzero(~matched).tolist(),
+        marked_present=marked,
+        match_ms=round(match_ms, 3),
+    )
+
+
 # ----------------------------
 # 🎓 List Students by Class
 # ----------------------------
@@ -497,5 +841,5 @@ def list_students_by_class(class_id: int, db: Session = Depends(get_db), admin=D
     if not db_class:
         raise HTTPException(status_code=404, detail="Class not found in your school")
     
-    students = db.query(models.Student).filter(models.Student.class_id == db_class.id).all()
-    return students
+    students = db.query(*schema_columns(schemas.StudentOut, models.Student)).filter(models.Student.class_id == db_class.id)
+    return rows_response(schemas.StudentOut, students)
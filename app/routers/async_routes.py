@@ -0,0 +1,208 @@
+# app/routers/async_routes.py
+#
+# Async versions of the hot, I/O-bound endpoints. Only mounted when USE_ASYNC_DB=1;
+# app.main includes this router before the sync ones, so these take over the same paths.
+
+from typing import List, Optional
+from datetime import datetime, date, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models, schemas
+from app.database import get_async_db, get_async_read_db
+from app.utils.attendance_utils import today_start, upsert_attendance_async
+from app.utils.change_bus import change_bus
+from app.utils.auth_utils import (
+    verify_password,
+    create_access_token,
+    get_current_user_async,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+)
+from app.utils.query_budget import query_budget
+from app.utils.fast_json import schema_columns, rows_response
+
+router = APIRouter(dependencies=[Depends(query_budget(6))])  # SQL statements per request
+
+
+# ----------------------------
+# 🔑 Login
+# ----------------------------
+@router.post("/auth/login", tags=["Authentication"])
+async def login_async(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+):
+    user = None
+    role = None
+    for role_name, model in (
+        ("superadmin", models.SuperAdmin),
+        ("administrator", models.Administrator),
+        ("teacher", models.Teacher),
+    ):
+        user = (await db.execute(select(model).where(model.email == form_data.username))).scalars().first()
+        if user:
+            role = role_name
+            break
+
+    # bcrypt is CPU-bound; keep it off the event loop
+    if not user or not await run_in_threadpool(verify_password, form_data.password, user.password):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid email or password",
+        )
+
+    claims = {"sub": str(user.id), "role": role}
+    if role == "teacher":
+        claims["school_id"] = user.school_id
+    elif role == "administrator":
+        claims["school_id"] = await db.scalar(
+            select(models.School.id).where(models.School.administrator_id == user.id).limit(1)
+        )
+    access_token = create_access_token(
+        data=claims,
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "role": role,
+        "email": user.email,
+        "name": user.name,
+    }
+
+
+# ----------------------------
+# 📝 Attendance
+# ----------------------------
+@router.post("/attendance/mark", response_model=schemas.AttendanceOut, tags=["Attendance"])
+async def mark_attendance_async(payload: schemas.AttendanceCreate, db: AsyncSession = Depends(get_async_db)):
+    # the student's class decides the school, as in the report and the live feed
+    school_id = (
+        await db.execute(
+            select(models.Class.school_id)
+            .join(models.Student, models.Student.class_id == models.Class.id)
+            .where(models.Student.id == payload.student_id)
+        )
+    ).scalar()
+    if school_id is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+    if not await db.get(models.Teacher, payload.teacher_id):
+        raise HTTPException(status_code=404, detail="Teacher not found")
+    # today's record, like every other marking path: a second mark the same day updates it
+    today = today_start()
+    await upsert_attendance_async(db, {payload.student_id: (payload.teacher_id, payload.status)}, today)
+    change_bus.publish("attendance", school_id, payload.student_id)
+    return (
+        await db.execute(
+            select(models.Attendance).where(
+                models.Attendance.student_id == payload.student_id, models.Attendance.date == today
+            )
+        )
+    ).scalars().one()
+
+
+@router.get("/attendance/", response_model=List[schemas.AttendanceOut], tags=["Attendance"])
+async def list_attendance_async(
+    student_id: Optional[int] = Query(None),
+    class_id: Optional[int] = Query(None),
+    school_id: Optional[int] = Query(None),
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    q = select(*schema_columns(schemas.AttendanceOut, models.Attendance)).select_from(models.Attendance)
+    if student_id:
+        q = q.where(models.Attendance.student_id == student_id)
+    elif class_id:
+        q = q.join(models.Student).where(models.Student.class_id == class_id)
+    elif school_id:
+        q = q.join(models.Student).where(models.Student.school_id == school_id)
+
+    if start:
+        q = q.where(models.Attendance.date >= datetime.fromisoformat(start))
+    if end:
+        q = q.where(models.Attendance.date <= datetime.fromisoformat(end))
+    return rows_response(schemas.AttendanceOut, await db.execute(q))
+
+
+# ----------------------------
+# 👨‍🏫 Teacher
+# ----------------------------
+async def get_teacher_class_ids(current_user: dict, db: AsyncSession) -> List[int]:
+    if current_user["role"] != "teacher":
+        raise HTTPException(status_code=403, detail="Not a teacher")
+    result = await db.execute(select(models.Class.id).where(models.Class.teacher_id == current_user["id"]))
+    return list(result.scalars())
+
+
+@router.get("/teacher/students", response_model=List[schemas.StudentOut], tags=["Teacher"])
+async def get_students_async(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user_async),
+):
+    class_ids = await get_teacher_class_ids(current_user, db)
+    result = await db.execute(
+        select(*schema_columns(schemas.StudentOut, models.Student)).where(models.Student.class_id.in_(class_ids))
+    )
+    return rows_response(schemas.StudentOut, result)
+
+
+@router.get("/teacher/classes", tags=["Teacher"])
+async def get_teacher_classes_async(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user_async),
+):
+    if current_user["role"] != "teacher":
+        raise HTTPException(status_code=403, detail="Not a teacher")
+    # count in SQL instead of loading every student row
+    result = await db.execute(
+        select(models.Class.id, models.Class.name, func.count(models.Student.id))
+        .outerjoin(models.Student, models.Student.class_id == models.Class.id)
+        .where(models.Class.teacher_id == current_user["id"])
+        .group_by(models.Class.id, models.Class.name)
+    )
+    return [
+        {"class_id": class_id, "class_name": name, "total_students": total}
+        for class_id, name, total in result
+    ]
+
+
+@router.post("/teacher/attendance/student/{student_id}", tags=["Teacher"])
+async def mark_student_attendance_async(
+    student_id: int,
+    status: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user_async),
+):
+    class_ids = await get_teacher_class_ids(current_user, db)
+    # the class decides the school, as in the report and the live feed
+    row = (
+        await db.execute(
+            select(models.Student.id, models.Class.school_id)
+            .join(models.Class, models.Student.class_id == models.Class.id)
+            .where(models.Student.id == student_id, models.Student.class_id.in_(class_ids))
+        )
+    ).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Student not found in your class")
+
+    # asyncpg is strict about types, so compare the DateTime column against a datetime (midnight today)
+    today = today_start()
+    records = {row.id: (current_user["id"], status)}
+
+    # Create or override today's record (one upsert, safe against concurrent marks)
+    await upsert_attendance_async(db, records, today)
+    change_bus.publish("attendance", row.school_id, row.id)
+    attendance_id = (
+        await db.execute(
+            select(models.Attendance.id).where(
+                models.Attendance.student_id == row.id,
+                models.Attendance.date == today,
+            )
+        )
+    ).scalar()
+    return {"detail": "Attendance marked", "attendance_id": attendance_id}
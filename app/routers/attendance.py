@@ -5,32 +5,44 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from app import models, schemas
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.utils.attendance_utils import today_start, upsert_attendance
+from app.utils.query_budget import query_budget
+from app.utils.fast_json import schema_columns, rows_response
+from app.utils.change_bus import change_bus
 
-router = APIRouter(prefix="/attendance", tags=["Attendance"])
+router = APIRouter(prefix="/attendance", tags=["Attendance"], dependencies=[Depends(query_budget(5))])
 
 
 @router.post("/mark", response_model=schemas.AttendanceOut)
 def mark_attendance(payload: schemas.AttendanceCreate, db: Session = Depends(get_db)):
-    # verify student exists
-    student = db.query(models.Student).get(payload.student_id)
-    if not student:
+    # verify student exists; their class decides the school, as in the report and the live feed
+    school_id = (
+        db.query(models.Class.school_id)
+        .join(models.Student, models.Student.class_id == models.Class.id)
+        .filter(models.Student.id == payload.student_id)
+        .scalar()
+    )
+    if school_id is None:
         raise HTTPException(status_code=404, detail="Student not found")
     # verify teacher exists
     teacher = db.query(models.Teacher).get(payload.teacher_id)
     if not teacher:
         raise HTTPException(status_code=404, detail="Teacher not found")
     # Optionally: ensure teacher is allowed to mark this student's class (not enforced here)
-    att = models.Attendance(student_id=payload.student_id, teacher_id=payload.teacher_id, status=payload.status)
-    db.add(att)
-    db.commit()
-    db.refresh(att)
-    return att
+    # today's record, like every other marking path: a second mark the same day updates it
+    today = today_start()
+    upsert_attendance(db, {payload.student_id: (payload.teacher_id, payload.status)}, today)
+    change_bus.publish("attendance", school_id, payload.student_id)
+    return db.query(models.Attendance).filter(
+        models.Attendance.student_id == payload.student_id, models.Attendance.date == today
+    ).one()
 
 
 @router.get("/", response_model=List[schemas.AttendanceOut])
-def list_attendance(student_id: Optional[int] = Query(None), class_id: Optional[int] = Query(None), school_id: Optional[int] = Query(None), start: Optional[str] = Query(None), end: Optional[str] = Query(None), db: Session = Depends(get_db)):
-    q = db.query(models.Attendance)
+def list_attendance(student_id: Optional[int] = Query(None), class_id: Optional[int] = Query(None), school_id: Optional[int] = Query(None), start: Optional[str] = Query(None), end: Optional[str] = Query(None), db: Session = Depends(get_read_db)):
+    # plain rows straight to JSON: serializing ORM objects costs more than the query here
+    q = db.query(*schema_columns(schemas.AttendanceOut, models.Attendance)).select_from(models.Attendance)
     if student_id:
         q = q.filter(models.Attendance.student_id == student_id)
     elif class_id:
@@ -42,4 +54,4 @@ def list_attendance(student_id: Optional[int] = Query(None), class_id: Optional[
         q = q.filter(models.Attendance.date >= datetime.fromisoformat(start))
     if end:
         q = q.filter(models.Attendance.date <= datetime.fromisoformat(end))
-    return q.all()
\ No newline at end of file
+    return rows_response(schemas.AttendanceOut, q)
\ No newline at end of file
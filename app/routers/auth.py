@@ -10,10 +10,12 @@ from app.utils.auth_utils import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     get_db,
 )
+from app.utils.query_budget import query_budget
 
 router = APIRouter(
     prefix="/auth",
     tags=["Authentication"],
+    dependencies=[Depends(query_budget(4))],  # one lookup per role, at most
 )
 
 
@@ -55,9 +57,15 @@ def login(
         )
 
     # 🔹 Create JWT token
+    claims = {"sub": str(user.id), "role": role}  # 👈 sub must be string
+    # school for admission control's per-school fair share (app/utils/admission.py)
+    if role == "teacher":
+        claims["school_id"] = user.school_id
+    elif role == "administrator":
+        claims["school_id"] = db.query(models.School.id).filter(models.School.administrator_id == user.id).limit(1).scalar()
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user.id), "role": role},  # 👈 sub must be string
+        data=claims,
         expires_delta=access_token_expires,
     )
 
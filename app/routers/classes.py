@@ -4,8 +4,10 @@ from sqlalchemy.orm import Session
 
 from app import models, schemas
 from app.database import get_db
+from app.utils.change_bus import change_bus
+from app.utils.query_budget import query_budget
 
-router = APIRouter(prefix="/classes", tags=["Classes"])
+router = APIRouter(prefix="/classes", tags=["Classes"], dependencies=[Depends(query_budget(3))])
 
 
 @router.get("/", response_model=List[schemas.ClassOut])
@@ -29,6 +31,7 @@ def update_class(class_id: int, payload: schemas.ClassBase, db: Session = Depend
     cl.name = payload.name
     db.commit()
     db.refresh(cl)
+    change_bus.publish("class", cl.school_id, cl.id)
     return cl
 
 
@@ -37,6 +40,8 @@ def delete_class(class_id: int, db: Session = Depends(get_db)):
     cl = db.query(models.Class).get(class_id)
     if not cl:
         raise HTTPException(status_code=404, detail="Class not found")
+    school_id = cl.school_id
     db.delete(cl)
     db.commit()
+    change_bus.publish("class", school_id, class_id)
     return {"detail": "Class deleted"}
\ No newline at end of file
@@ -0,0 +1,139 @@
+# app/routers/imports.py
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+
+from app import models, schemas, database
+from app.routers.administrator import admin_required, get_admin_user, get_admin_school
+from app.utils.import_jobs import (
+    IMPORTERS,
+    IMPORT_STALE_SECONDS,
+    write_chunk,
+    enqueue_import,
+    rows_per_second,
+)
+from app.utils.query_budget import query_budget
+
+# the import itself runs in a background thread, outside any request budget
+router = APIRouter(prefix="/imports", tags=["Imports"], dependencies=[Depends(query_budget(6))])
+
+get_db = database.get_db
+
+
+# ----------------------------
+# Utility: job output + scope
+# ----------------------------
+def _job_out(job: models.ImportJob) -> schemas.ImportJobOut:
+    out = schemas.ImportJobOut.model_validate(job, from_attributes=True)
+    out.rows_per_second = rows_per_second(job)
+    return out
+
+
+def get_admin_job(db: Session, admin_id: int, job_id: int) -> models.ImportJob:
+    job = db.query(models.ImportJob).filter(
+        models.ImportJob.id == job_id, models.ImportJob.administrator_id == admin_id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return job
+
+
+# ----------------------------
+# 📥 Chunked, resumable upload
+# ----------------------------
+@router.post("/", response_model=schemas.ImportJobOut, dependencies=[Depends(admin_required)])
+def create_import(
+    payload: schemas.ImportJobCreate,
+    db: Session = Depends(get_db),
+    admin=Depends(get_admin_user),
+):
+    """
+    Start an upload. Same file formats and columns as the matching /administrator/*/upload-excel endpoint.
+    Then PUT chunks to /imports/{id}/chunks?offset=N and POST /imports/{id}/complete.
+    """
+    if payload.kind not in IMPORTERS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(IMPORTERS)}")
+    if not payload.filename.lower().endswith((".csv", ".xlsx")):
+        raise HTTPException(status_code=400, detail="Only .csv and .xlsx files are supported")
+    school = get_admin_school(db, admin.id)
+    job = models.ImportJob(
+        kind=payload.kind,
+        filename=payload.filename,
+        status="uploading",
+        school_id=school.id,
+        administrator_id=admin.id,
+        total_bytes=payload.total_bytes,
+        received_bytes=0,
+        rows_processed=0,
+        rows_imported=0,
+        error_count=0,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return _job_out(job)
+
+
+@router.put("/{job_id}/chunks", response_model=schemas.ImportJobOut, dependencies=[Depends(admin_required)])
+def upload_chunk(
+    job_id: int,
+    offset: int = Query(..., ge=0),
+    chunk: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    admin=Depends(get_admin_user),
+):
+    """
+    Write one chunk at `offset`. To resume an interrupted upload, GET the import and
+    continue from `received_bytes`.
+    """
+    job = get_admin_job(db, admin.id, job_id)
+    if job.status != "uploading":
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    if offset > job.received_bytes:
+        raise HTTPException(status_code=409, detail=f"Expected offset <= {job.received_bytes}")
+    data = chunk.file.read()
+    if offset + len(data) > job.total_bytes:
+        raise HTTPException(status_code=400, detail="Chunk exceeds declared total_bytes")
+
+    job.received_bytes = write_chunk(job, offset, data)
+    db.commit()
+    db.refresh(job)
+    return _job_out(job)
+
+
+@router.post("/{job_id}/complete", response_model=schemas.ImportJobOut, dependencies=[Depends(admin_required)])
+def complete_upload(
+    job_id: int,
+    db: Session = Depends(get_db),
+    admin=Depends(get_admin_user),
+):
+    job = get_admin_job(db, admin.id, job_id)
+    if job.status != "uploading":
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    if job.received_bytes != job.total_bytes:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete: {job.received_bytes} of {job.total_bytes} bytes received",
+        )
+    job.status = "queued"
+    db.commit()
+    db.refresh(job)
+    enqueue_import(job.id)
+    return _job_out(job)
+
+
+# ----------------------------
+# 📊 Progress
+# ----------------------------
+@router.get("/{job_id}", response_model=schemas.ImportJobOut, dependencies=[Depends(admin_required)])
+def get_import(
+    job_id: int,
+    db: Session = Depends(get_db),
+    admin=Depends(get_admin_user),
+):
+    job = get_admin_job(db, admin.id, job_id)
+    # a job whose worker died is picked up again by whoever polls it
+    if job.status == "running" and job.heartbeat_at < datetime.utcnow() - timedelta(seconds=IMPORT_STALE_SECONDS):
+        enqueue_import(job.id)
+    return _job_out(job)
@@ -0,0 +1,134 @@
+# app/routers/internal.py
+
+import os
+import ipaddress
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from app import database
+from app.utils.pool_metrics import pool_stats
+from app.utils.admission import admission
+from app.utils.change_bus import change_bus
+from app.utils.embedding_cache import embedding_cache
+from app.utils.live_attendance import live_attendance
+from app.utils.school_calendar import calendar_cache
+from app.utils.request_metrics import render_prometheus
+from app.utils.query_budget import query_budget
+from app.utils.slow_queries import SLOW_QUERY_MS, slow_queries
+
+# the only SQL here is the replica lag probe
+router = APIRouter(prefix="/internal", tags=["Internal"], include_in_schema=False,
+                   dependencies=[Depends(query_budget(1))])
+# /metrics sits at the root, where Prometheus scrapes by default
+metrics_router = APIRouter(tags=["Internal"], include_in_schema=False, dependencies=[Depends(query_budget(0))])
+
+# Scrapers/ops tools send this as X-Internal-Token. Without it only loopback clients get in: behind a
+# reverse proxy or load balancer every client looks private, so set a token for anything remote.
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN")
+
+
+# ----------------------------
+# Utility: internal access only
+# ----------------------------
+def internal_only(request: Request):
+    if INTERNAL_TOKEN:
+        if request.headers.get("X-Internal-Token") != INTERNAL_TOKEN:
+            raise HTTPException(status_code=403, detail="Not allowed")
+        return
+    try:
+        loopback = ipaddress.ip_address(request.client.host).is_loopback if request.client else False
+    except ValueError:
+        loopback = False
+    if not loopback:
+        raise HTTPException(status_code=403, detail="Not allowed")
+
+
+# ----------------------------
+# 🔌 Connection pool
+# ----------------------------
+@router.get("/pool", dependencies=[Depends(internal_only)])
+def get_pool_stats():
+    """
+    Live pool usage per engine: size, checked out, overflow, timeouts and a
+    histogram of how long checkouts waited for a connection.
+    """
+    stats = {"primary": pool_stats("primary", database.engine)}
+    if database.async_engine is not None:
+        stats["async"] = pool_stats("async", database.async_engine.sync_engine)
+    if database.read_engine is not None:
+        stats["replica"] = pool_stats("replica", database.read_engine)
+        stats["replica"]["lag_seconds"] = database.replica_lag()
+        stats["replica"]["max_lag_seconds"] = database.DB_REPLICA_MAX_LAG
+    return stats
+
+
+# ----------------------------
+# 🚦 Admission control
+# ----------------------------
+@router.get("/admission", dependencies=[Depends(internal_only)])
+def get_admission_stats():
+    """
+    This worker's admission slots and queues per priority, the schools holding the most slots
+    and how many requests were admitted, queued or shed.
+    """
+    return admission.stats()
+
+
+# ----------------------------
+# 🧠 Embedding cache
+# ----------------------------
+@router.get("/embedding-cache", dependencies=[Depends(internal_only)])
+def get_embedding_cache_stats():
+    return embedding_cache.stats()
+
+
+# ----------------------------
+# 📅 School calendars
+# ----------------------------
+@router.get("/school-calendars", dependencies=[Depends(internal_only)])
+def get_school_calendar_stats():
+    return calendar_cache.stats()
+
+
+# ----------------------------
+# 📡 Live attendance streams
+# ----------------------------
+@router.get("/live-attendance", dependencies=[Depends(internal_only)])
+def get_live_attendance_stats():
+    return live_attendance.stats()
+
+
+# ----------------------------
+# 📣 Change bus
+# ----------------------------
+@router.get("/change-bus", dependencies=[Depends(internal_only)])
+def get_change_bus_stats():
+    """
+    This worker's change bus: transport, connection state and message counts.
+    """
+    return change_bus.stats()
+
+
+# ----------------------------
+# 🐢 Slow queries
+# ----------------------------
+@router.get("/slow-queries", dependencies=[Depends(internal_only)])
+def get_slow_queries(limit: int = 50):
+    """
+    Statements over SLOW_QUERY_MS on this worker, grouped by normalized fingerprint and sorted
+    by total time, with the routes that ran them and the last sampled plan.
+    """
+    return {"threshold_ms": SLOW_QUERY_MS or None, "queries": slow_queries.snapshot(limit)}
+
+
+# ----------------------------
+# 📈 Prometheus metrics
+# ----------------------------
+@metrics_router.get("/metrics", dependencies=[Depends(internal_only)], response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Per-route request latency, SQL statements, DB time and rows, plus pool waits and
+    admission decisions, in Prometheus text format.
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -1,15 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Path, Request
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 from app import models, schemas
+from app.database import get_read_db, stream_rows
 from app.utils.auth_utils import get_db, RoleChecker
 from app.utils.auth_utils import get_password_hash
-from app.utils.excel_utils import export_students_to_excel, export_attendance_to_excel
+from app.utils.excel_utils import (
+    export_students_to_excel,
+    export_attendance_to_excel,
+    export_students_to_csv,
+    export_attendance_to_csv,
+)
+from app.utils.face_embeddings import set_student_embedding
+from app.utils.embedding_cache import embedding_cache
+from app.utils.ann_index import school_indexes
+from app.utils.change_bus import change_bus
+from app.utils.query_budget import query_budget
+from app.utils.fast_json import schema_columns, rows_response
+from app.utils.profiling import PROFILE_ID_PATTERN, list_profiles, load_profile, load_folded
 
 router = APIRouter(
     prefix="/superadmin",
     tags=["SuperAdmin"],
+    dependencies=[Depends(query_budget(6))],  # SQL statements per request, auth lookups included
 )
 
 superadmin_required = RoleChecker(["superadmin"])
@@ -26,6 +41,7 @@ def create_superadmin(superadmin: schemas.SuperAdminCreate, db: Session = Depend
     db.add(new_superadmin)
     db.commit()
     db.refresh(new_superadmin)
+    change_bus.publish("superadmin", None, new_superadmin.id)
     return new_superadmin
 
 
@@ -43,6 +59,7 @@ def update_superadmin(superadmin_id: int, update: schemas.SuperAdminCreate, db:
         setattr(superadmin, key, value)
     db.commit()
     db.refresh(superadmin)
+    change_bus.publish("superadmin", None, superadmin.id)
     return superadmin
 
 
@@ -53,6 +70,7 @@ def delete_superadmin(superadmin_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="SuperAdmin not found")
     db.delete(superadmin)
     db.commit()
+    change_bus.publish("superadmin", None, superadmin_id)
     return {"message": "SuperAdmin deleted successfully"}
 
 
@@ -70,6 +88,7 @@ def create_administrator(admin: schemas.AdministratorCreate, db: Session = Depen
     db.add(new_admin)
     db.commit()
     db.refresh(new_admin)
+    change_bus.publish("administrator", None, new_admin.id)
     return new_admin
 
 
@@ -91,6 +110,7 @@ def update_administrator(admin_id: int, update: schemas.AdministratorCreate, db:
 
     db.commit()
     db.refresh(admin)
+    change_bus.publish("administrator", None, admin.id)
     return admin
 
 
@@ -101,6 +121,7 @@ def delete_administrator(admin_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Administrator not found")
     db.delete(admin)
     db.commit()
+    change_bus.publish("administrator", None, admin_id)
     return {"message": "Administrator deleted successfully"}
 
 
@@ -113,6 +134,7 @@ def create_school(school: schemas.SchoolCreate, db: Session = Depends(get_db)):
     db.add(new_school)
     db.commit()
     db.refresh(new_school)
+    change_bus.publish("school", new_school.id, new_school.id)
     return new_school
 
 
@@ -130,6 +152,7 @@ def update_school(school_id: int, update: schemas.SchoolCreate, db: Session = De
         setattr(school, key, value)
     db.commit()
     db.refresh(school)
+    change_bus.publish("school", school.id, school.id)
     return school
 
 
@@ -140,6 +163,7 @@ def delete_school(school_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="School not found")
     db.delete(school)
     db.commit()
+    change_bus.publish("school", school_id, school_id)
     return {"message": "School deleted successfully"}
 
 
@@ -157,6 +181,7 @@ def create_teacher(teacher: schemas.TeacherCreate, db: Session = Depends(get_db)
     db.add(new_teacher)
     db.commit()
     db.refresh(new_teacher)
+    change_bus.publish("teacher", new_teacher.school_id, new_teacher.id)
     return new_teacher
 
 
@@ -170,6 +195,7 @@ def update_teacher(teacher_id: int, update: schemas.TeacherCreate, db: Session =
     teacher = db.query(models.Teacher).filter(models.Teacher.id == teacher_id).first()
     if not teacher:
         raise HTTPException(status_code=404, detail="Teacher not found")
+    old_school_id = teacher.school_id
     teacher.name = update.name
     teacher.email = update.email
     if update.password:  # ✅ hash only if provided
@@ -178,6 +204,9 @@ def update_teacher(teacher_id: int, update: schemas.TeacherCreate, db: Session =
 
     db.commit()
     db.refresh(teacher)
+    change_bus.publish("teacher", teacher.school_id, teacher.id)
+    if old_school_id != teacher.school_id:
+        change_bus.publish("teacher", old_school_id, teacher.id)
     return teacher
 
 
@@ -186,8 +215,10 @@ def delete_teacher(teacher_id: int, db: Session = Depends(get_db)):
     teacher = db.query(models.Teacher).filter(models.Teacher.id == teacher_id).first()
     if not teacher:
         raise HTTPException(status_code=404, detail="Teacher not found")
+    school_id = teacher.school_id
     db.delete(teacher)
     db.commit()
+    change_bus.publish("teacher", school_id, teacher_id)
     return {"message": "Teacher deleted successfully"}
 
 
@@ -200,12 +231,14 @@ def create_student(student: schemas.StudentCreate, db: Session = Depends(get_db)
     db.add(new_student)
     db.commit()
     db.refresh(new_student)
+    change_bus.publish("student", new_student.school_id, new_student.id)
     return new_student
 
 
 @router.get("/students", response_model=List[schemas.StudentOut], dependencies=[Depends(superadmin_required)])
 def list_students(db: Session = Depends(get_db)):
-    return db.query(models.Student).all()
+    # every student in the district: rows straight to JSON, no face embeddings loaded
+    return rows_response(schemas.StudentOut, db.query(*schema_columns(schemas.StudentOut, models.Student)))
 
 
 @router.put("/students/{student_id}", response_model=schemas.StudentOut, dependencies=[Depends(superadmin_required)])
@@ -218,13 +251,27 @@ def update_student(
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
+    old_class_id, old_school_id = student.class_id, student.school_id
+
     # Update only provided fields
     update_data = update.dict(exclude_unset=True)
+    model_version = update_data.pop("face_embedding_model", None)
+    if "face_embedding" in update_data:
+        try:
+            set_student_embedding(student, update_data.pop("face_embedding"), model_version)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     for key, value in update_data.items():
         setattr(student, key, value)
 
     db.commit()
+    if "face_embedding" in update.model_fields_set or student.class_id != old_class_id:
+        embedding_cache.invalidate(old_class_id, student.class_id)
+        change_bus.publish("class", student.school_id, old_class_id, student.class_id)
+    if "face_embedding" in update.model_fields_set or student.school_id != old_school_id:
+        school_indexes.student_changed(db, student, old_school_id)
     db.refresh(student)
+    change_bus.publish("student", student.school_id, student.id)
     return student
 
 
@@ -233,61 +280,86 @@ def delete_student(student_id: int, db: Session = Depends(get_db)):
     student = db.query(models.Student).filter(models.Student.id == student_id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
+    class_id, school_id = student.class_id, student.school_id
     db.delete(student)
     db.commit()
+    embedding_cache.invalidate(class_id)
+    school_indexes.student_removed(db, school_id, student_id)
+    change_bus.publish("class", school_id, class_id)
+    change_bus.publish("student", school_id, student_id)
     return {"message": "Student deleted successfully"}
 
 
 @router.get("/students/export-excel", dependencies=[Depends(superadmin_required)])
-def export_students(db: Session = Depends(get_db)):
-    students = db.query(models.Student).all()
-    students_data = [
+def export_students(
+    request: Request,
+    fmt: str = Query("xlsx", alias="format", pattern="^(xlsx|csv)$"),
+    db: Session = Depends(get_read_db),
+):
+    query = (
+        db.query(models.Student.id, models.Student.name, models.Student.roll_no, models.Class.name.label("class_name"))
+        .outerjoin(models.Class, models.Student.class_id == models.Class.id)
+    )
+    # CSV rows are read while the response streams, through the stream's own session
+    rows = stream_rows(request, query) if fmt == "csv" else query.yield_per(1000)
+    students_data = (
         {"id": s.id, "name": s.name, "roll_no": s.roll_no, "class_name": s.class_name}
-        for s in students
-    ]
-    return export_students_to_excel(students_data)
+        for s in rows
+    )
+    if fmt == "csv":
+        return export_students_to_csv(students_data)
+    return export_students_to_excel(list(students_data))
 
 
 # -----------------------------
 # Attendance Reports (view/export)
 # -----------------------------
-@router.get("/attendance/report", dependencies=[Depends(superadmin_required)])
+@router.get("/attendance/report", response_model=List[schemas.AttendanceOut], dependencies=[Depends(superadmin_required)])
 def attendance_report(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     school_id: Optional[int] = None,
     class_id: Optional[int] = None,
     student_id: Optional[int] = None,
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
 ):
-    query = db.query(models.Attendance)
+    query = db.query(*schema_columns(schemas.AttendanceOut, models.Attendance)).select_from(models.Attendance)
+    # Attendance has no school/class columns; filter through the student instead
+    if school_id or class_id:
+        query = query.join(models.Student, models.Attendance.student_id == models.Student.id)
     if school_id:
-        query = query.filter(models.Attendance.school_id == school_id)
+        query = query.filter(models.Student.school_id == school_id)
     if class_id:
-        query = query.filter(models.Attendance.class_id == class_id)
+        query = query.filter(models.Student.class_id == class_id)
     if student_id:
         query = query.filter(models.Attendance.student_id == student_id)
     if start_date:
         query = query.filter(models.Attendance.date >= start_date)
     if end_date:
         query = query.filter(models.Attendance.date <= end_date)
-    return query.all()
+    return rows_response(schemas.AttendanceOut, query)
 
 
 @router.get("/attendance/report/excel", dependencies=[Depends(superadmin_required)])
 def attendance_report_excel(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(get_read_db),
     school_id: Optional[int] = None,
     class_id: Optional[int] = None,
     student_id: Optional[int] = None,
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
+    fmt: str = Query("xlsx", alias="format", pattern="^(xlsx|csv)$"),
 ):
-    query = db.query(models.Attendance)
+    # Attendance has no school/class columns; filter through the student instead
+    query = (
+        db.query(models.Student.name.label("student_name"), models.Attendance.date, models.Attendance.status)
+        .join(models.Student, models.Attendance.student_id == models.Student.id)
+    )
     if school_id:
-        query = query.filter(models.Attendance.school_id == school_id)
+        query = query.filter(models.Student.school_id == school_id)
     if class_id:
-        query = query.filter(models.Attendance.class_id == class_id)
+        query = query.filter(models.Student.class_id == class_id)
     if student_id:
         query = query.filter(models.Attendance.student_id == student_id)
     if start_date:
@@ -295,9 +367,42 @@ def attendance_report_excel(
     if end_date:
         query = query.filter(models.Attendance.date <= end_date)
 
-    attendances = query.all()
-    attendance_data = [
-        {"student_name": a.student.name, "date": a.date, "status": a.status}
-        for a in attendances
-    ]
-    return export_attendance_to_excel(attendance_data)
\ No newline at end of file
+    # CSV rows are read while the response streams, through the stream's own session
+    rows = stream_rows(request, query) if fmt == "csv" else query.yield_per(1000)
+    attendance_data = (
+        {"student_name": a.student_name, "date": a.date, "status": a.status}
+        for a in rows
+    )
+    if fmt == "csv":
+        return export_attendance_to_csv(attendance_data)
+    return export_attendance_to_excel(list(attendance_data))
+
+
+# -----------------------------
+# Request profiles (X-Profile)
+# -----------------------------
+@router.get("/profiles", dependencies=[Depends(superadmin_required)])
+def get_profiles():
+    """
+    Requests profiled on this worker via the X-Profile header, newest first.
+    """
+    return list_profiles()
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(superadmin_required)])
+def get_profile(profile_id: str = Path(..., pattern=PROFILE_ID_PATTERN)):
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+
+@router.get("/profiles/{profile_id}/folded", dependencies=[Depends(superadmin_required)])
+def get_profile_stacks(profile_id: str = Path(..., pattern=PROFILE_ID_PATTERN)):
+    """
+    Collapsed stacks, e.g. `flamegraph.pl profile.folded > profile.svg` or drop into speedscope.
+    """
+    folded = load_folded(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(folded)
@@ -1,19 +1,39 @@
 # app/routers/teacher.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import date
 from fastapi.responses import StreamingResponse
 import io
-import openpyxl
+import time
 from typing import Optional
 from app import models, schemas, database
 from app.utils.auth_utils import get_current_user
-
-router = APIRouter(prefix="/teacher", tags=["Teacher"])
+from app.utils.excel_utils import openpyxl, stream_csv, XLSX_MEDIA_TYPE
+from app.utils.face_embeddings import (
+    FACE_EMBEDDING_DIM,
+    FACE_MATCH_THRESHOLD,
+    assign_one_to_one,
+    match_probes,
+    similarity_matrix,
+)
+from app.utils.embedding_cache import get_class_gallery, load_exact_rows
+from app.utils.attendance_utils import attendance_totals_query, today_start, unmarked_today_query, upsert_attendance
+from app.utils.school_calendar import calendar_cache, expected_days, expected_range
+from app.utils.change_bus import change_bus
+from app.utils.query_budget import query_budget
+from app.utils.lazy_imports import LazyModule
+from app.utils.fast_json import schema_columns, rows_response
+
+# SQL statements per request, auth lookups included; reports must not grow with the class size
+router = APIRouter(prefix="/teacher", tags=["Teacher"], dependencies=[Depends(query_budget(8))])
 
 get_db = database.get_db
+get_read_db = database.get_read_db  # reports/exports: replica when configured and caught up
+
+np = LazyModule("numpy")  # face recognition only
 
 
 # ----------------------------
@@ -40,7 +60,8 @@ def get_students(
 ):
     teacher = get_teacher_user(current_user, db)
     class_ids = [c.id for c in teacher.classes]
-    return db.query(models.Student).filter(models.Student.class_id.in_(class_ids)).all()
+    students = db.query(*schema_columns(schemas.StudentOut, models.Student)).filter(models.Student.class_id.in_(class_ids))
+    return rows_response(schemas.StudentOut, students)
 
 
 # ----------------------------
@@ -93,40 +114,113 @@ def mark_student_attendance(
     if not student:
         raise HTTPException(status_code=404, detail="Student not found in your class")
 
-    # Check if attendance already exists for today
-    attendance = (
-        db.query(models.Attendance)
+    # the class decides the school, as in the report and the live feed
+    school_id = next(c.school_id for c in teacher.classes if c.id == student.class_id)
+
+    # Create or override today's record (one upsert, safe against concurrent marks)
+    upsert_attendance(db, {student.id: (teacher.id, status)})
+    change_bus.publish("attendance", school_id, student.id)
+    attendance_id = (
+        db.query(models.Attendance.id)
         .filter(
             models.Attendance.student_id == student.id,
-            models.Attendance.date == date.today(),
+            models.Attendance.date == today_start(),
         )
-        .first()
+        .scalar()
     )
 
-    if attendance:
-        # Override existing attendance
-        attendance.status = status
+    return {"detail": "Attendance marked", "attendance_id": attendance_id}
+
+
+# ----------------------------
+# 🧑‍🤝‍🧑 Face Recognition Attendance
+# ----------------------------
+@router.post("/attendance/class/{class_id}/recognize", response_model=schemas.RecognizeOut)
+def recognize_class_attendance(
+    class_id: int,
+    payload: schemas.RecognizeRequest,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Match probe embeddings (one per detected face) against the class's enrolled
+    embeddings and mark every matched student present. Embeddings never leave the server.
+    With `frame=true` the probes are one classroom photo: no student is matched twice and
+    the rest of the class is marked absent. Unmatched probes are returned for review.
+    """
+    teacher = get_teacher_user(current_user, db)
+    cls = db.query(models.Class).filter(models.Class.id == class_id, models.Class.teacher_id == teacher.id).first()
+    if not cls:
+        raise HTTPException(status_code=404, detail="Class not found")
+    if not payload.probes:
+        raise HTTPException(status_code=400, detail="No probes given")
+    try:
+        probes = np.asarray(payload.probes, dtype=np.float32)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Probes must all have the same length")
+    if probes.ndim != 2 or probes.shape[1] != FACE_EMBEDDING_DIM:
+        raise HTTPException(status_code=400, detail=f"Probes must have {FACE_EMBEDDING_DIM} values")
+
+    student_ids, gallery = get_class_gallery(db, cls.id)
+
+    start = time.perf_counter()
+    threshold = payload.threshold if payload.threshold is not None else FACE_MATCH_THRESHOLD
+    exact_rows = lambda rows: load_exact_rows(db, [student_ids[i] for i in rows])
+    if payload.frame:
+        # full probe x student matrix, then a one-to-one assignment
+        similarity = similarity_matrix(gallery, probes, exact_rows)
+        pairs = assign_one_to_one(similarity, threshold, payload.assignment)
+        best = np.zeros(len(probes), dtype=np.intp)
+        scores = np.zeros(len(probes), dtype=np.float32)
+        matched = np.zeros(len(probes), dtype=bool)
+        for p, s in pairs:
+            best[p], scores[p], matched[p] = s, similarity[p, s], True
     else:
-        # Create new attendance
-        attendance = models.Attendance(
-            student_id=student.id,
-            teacher_id=teacher.id,
-            date=date.today(),
-            status=status,
+        best, scores, matched = match_probes(gallery, probes, threshold, exact_rows=exact_rows)
+    match_ms = (time.perf_counter() - start) * 1000
+
+    matched_ids = {student_ids[best[i]] for i in np.flatnonzero(matched)}
+    names = dict(
+        db.query(models.Student.id, models.Student.name).filter(models.Student.id.in_(matched_ids)).all()
+    ) if matched_ids else {}
+    matches = [
+        schemas.RecognizeMatch(
+            probe_index=int(i),
+            student_id=student_ids[best[i]],
+            name=names[student_ids[best[i]]],
+            score=round(float(scores[i]), 4),
         )
-        db.add(attendance)
+        for i in np.flatnonzero(matched)
+    ]
+    absent_ids = set()
+    if payload.frame:
+        class_ids = {sid for (sid,) in db.query(models.Student.id).filter(models.Student.class_id == cls.id)}
+        absent_ids = class_ids - matched_ids
+    # present and absent for the whole class in one upsert
+    records = {
+        **{sid: (teacher.id, "Absent") for sid in absent_ids},
+        **{sid: (teacher.id, "Present") for sid in matched_ids},
+    }
+    upsert_attendance(db, records)
+    change_bus.publish("attendance", cls.school_id, *records)
+
+    return schemas.RecognizeOut(
+        class_id=cls.id,
+        matches=matches,
+        unmatched_probes=np.flatnonzero(~matched).tolist(),
+        marked_present=len(matched_ids),
+        marked_absent=len(absent_ids),
+        match_ms=round(match_ms, 3),
+    )
 
-    db.commit()
-    db.refresh(attendance)
 
-    return {"detail": "Attendance marked", "attendance_id": attendance.id}
 # ----------------------------
 # 📊 Attendance Reports
 # ----------------------------
 @router.get("/attendance/student/{student_id}")
 def get_student_attendance(
     student_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: dict = Depends(get_current_user),
 ):
     teacher = get_teacher_user(current_user, db)
@@ -148,45 +242,63 @@ def get_student_attendance(
     total = len(records)
     present = len([r for r in records if r.status.lower() == "present"])
     absent = len([r for r in records if r.status.lower() == "absent"])
+    # instructional days since the first record, so unrecorded days count against the rate
+    dates = [r.date for r in records]
+    expected = int(expected_days(db, student.school_id, [
+        expected_range(None, None, min(dates, default=None), max(dates, default=None))
+    ])[0])
 
     return {
         "student": student.name,
         "total_days": total,
+        "expected_days": expected,
         "present": present,
         "absent": absent,
-        "attendance_%": (present / total * 100) if total else 0,
+        "attendance_%": (present / expected * 100) if expected else 0,
     }
 
 
 @router.get("/attendance/class")
 def get_class_attendance(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: dict = Depends(get_current_user),
 ):
     teacher = get_teacher_user(current_user, db)
 
     result = []
+    class_ids = [cls.id for cls in teacher.classes]
+
+    # every student of every class, and their totals, in two queries
+    students_by_class = {}
+    for s in db.query(models.Student).filter(models.Student.class_id.in_(class_ids)).order_by(models.Student.id):
+        students_by_class.setdefault(s.class_id, []).append(s)
+    totals = {
+        student_id: (total, present or 0, absent or 0, first, last)
+        for student_id, total, present, absent, first, last in attendance_totals_query(
+            db, models.Student.id, models.Student.class_id.in_(class_ids)
+        )
+    }
+    # expected days of every student at once, from the school calendar
+    student_ids = list(totals)
+    expected_by_student = dict(zip(student_ids, expected_days(db, teacher.school_id, [
+        expected_range(None, None, totals[sid][3], totals[sid][4]) for sid in student_ids
+    ]).tolist()))
 
     # Loop through each class the teacher teaches
     for cls in teacher.classes:
-        students = db.query(models.Student).filter(models.Student.class_id == cls.id).all()
         stats = []
 
-        for s in students:
-            records = db.query(models.Attendance).filter(
-                models.Attendance.student_id == s.id
-            ).all()
-
-            total = len(records)
-            present = len([r for r in records if r.status.lower() == "present"])
-            absent = len([r for r in records if r.status.lower() == "absent"])
+        for s in students_by_class.get(cls.id, []):
+            total, present, absent, _, _ = totals.get(s.id, (0, 0, 0, None, None))
+            expected = expected_by_student.get(s.id, 0)
 
             stats.append({
                 "student": s.name,
                 "total_days": total,
+                "expected_days": expected,
                 "present": present,
                 "absent": absent,
-                "attendance_%": (present / total * 100) if total else 0,
+                "attendance_%": (present / expected * 100) if expected else 0,
             })
 
         result.append({
@@ -197,97 +309,52 @@ def get_class_attendance(
 
     return {"teacher_id": teacher.id, "classes": result}
 
-# ----------------------------
-# 📤 Export Student Attendance to Excel
-# ----------------------------
-@router.get("/attendance/student/{student_id}/export")
-def export_student_attendance_excel(
-    student_id: int,
-    db: Session = Depends(get_db),
+@router.get("/attendance/unmarked")
+def get_unmarked_students(
+    db: Session = Depends(get_db),  # today's marks: the primary, a replica may lag
     current_user: dict = Depends(get_current_user),
 ):
+    """
+    Students in the teacher's classes with no attendance recorded yet today (none on a day
+    the school calendar has off).
+    """
     teacher = get_teacher_user(current_user, db)
-    class_ids = [c.id for c in teacher.classes]
-    student = (
-        db.query(models.Student)
-        .filter(models.Student.id == student_id, models.Student.class_id.in_(class_ids))
-        .first()
-    )
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found in your class")
-
-    records = db.query(models.Attendance).filter(models.Attendance.student_id == student.id).all()
-
-    # Create Excel workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Attendance"
-
-    ws.append(["Date", "Status"])
-    for r in records:
-        ws.append([r.date.strftime("%Y-%m-%d"), r.status])
-
-    # Save to bytes
-    stream = io.BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-
-    return StreamingResponse(
-        stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={
-            "Content-Disposition": f"attachment; filename=attendance_student_{student.id}.xlsx"
-        },
-    )
+    today = today_start().date()
+    instructional = calendar_cache.year(db, teacher.school_id, today).is_open(today)
+    students = []
+    if instructional:
+        class_ids = db.query(models.Class.id).filter(models.Class.teacher_id == teacher.id)
+        students = [
+            {"id": sid, "name": name, "roll_no": roll_no, "class_id": class_id}
+            for sid, name, roll_no, class_id in unmarked_today_query(db, models.Student.class_id.in_(class_ids))
+        ]
+    return {"date": today, "instructional": instructional, "students": students}
 
 
 # ----------------------------
-# 📤 Export Class Attendance to Excel
+# 📤 Export Student Attendance to Excel / CSV (with filters)
 # ----------------------------
-@router.get("/attendance/class/export")
-def export_class_attendance_excel(
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user),
-):
-    teacher = get_teacher_user(current_user, db)
-    class_ids = [c.id for c in teacher.classes]
-    students = db.query(models.Student).filter(models.Student.class_id.in_(class_ids)).all()
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Class Attendance"
-
-    ws.append(["Student Name", "Date", "Status"])
+def _apply_export_filters(query, month, year, start_date, end_date):
+    if month and year:
+        query = query.filter(
+            func.extract("month", models.Attendance.date) == month,
+            func.extract("year", models.Attendance.date) == year,
+        )
+    if start_date and end_date:
+        query = query.filter(models.Attendance.date.between(start_date, end_date))
+    return query
 
-    for s in students:
-        records = db.query(models.Attendance).filter(models.Attendance.student_id == s.id).all()
-        for r in records:
-            ws.append([s.name, r.date.strftime("%Y-%m-%d"), r.status])
 
-    # Save to bytes
-    stream = io.BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-    filename=f"attendance_teacher_{teacher.id}.xlsx"
-    return StreamingResponse(
-        stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={
-            "Content-Disposition": f"attachment; filename={filename}.xlsx"
-        },
-    )
-
-# ----------------------------
-# 📤 Export Student Attendance to Excel (with filters)
-# ----------------------------
 @router.get("/attendance/student/{student_id}/export")
 def export_student_attendance_excel(
+    request: Request,
     student_id: int,
     month: Optional[int] = None,   # e.g. 1 = Jan
     year: Optional[int] = None,    # e.g. 2025
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db),
+    fmt: str = Query("xlsx", alias="format", pattern="^(xlsx|csv)$"),
+    db: Session = Depends(get_read_db),
     current_user: dict = Depends(get_current_user),
 ):
     teacher = get_teacher_user(current_user, db)
@@ -300,16 +367,15 @@ def export_student_attendance_excel(
     if not student:
         raise HTTPException(status_code=404, detail="Student not found in your class")
 
-    query = db.query(models.Attendance).filter(models.Attendance.student_id == student.id)
+    query = db.query(models.Attendance.date, models.Attendance.status).filter(
+        models.Attendance.student_id == student.id
+    )
+    query = _apply_export_filters(query, month, year, start_date, end_date)
 
-    # Apply filters
-    if month and year:
-        query = query.filter(
-            db.extract("month", models.Attendance.date) == month,
-            db.extract("year", models.Attendance.date) == year,
-        )
-    if start_date and end_date:
-        query = query.filter(models.Attendance.date.between(start_date, end_date))
+    if fmt == "csv":
+        # read while the response streams, through the stream's own session
+        rows = ([r.date.strftime("%Y-%m-%d"), r.status] for r in database.stream_rows(request, query))
+        return stream_csv(["Date", "Status"], rows, f"attendance_student_{student.id}.csv")
 
     records = query.all()
 
@@ -328,7 +394,7 @@ def export_student_attendance_excel(
 
     return StreamingResponse(
         stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        media_type=XLSX_MEDIA_TYPE,
         headers={
             "Content-Disposition": f"attachment; filename=attendance_student_{student.id}.xlsx"
         },
@@ -336,44 +402,57 @@ def export_student_attendance_excel(
 
 
 # ----------------------------
-# 📤 Export Class Attendance to Excel (with filters)
+# 📤 Export Class Attendance to Excel / CSV (with filters)
 # ----------------------------
 @router.get("/attendance/class/export")
 def export_class_attendance_excel(
+    request: Request,
     month: Optional[int] = None,
     year: Optional[int] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db),
+    fmt: str = Query("xlsx", alias="format", pattern="^(xlsx|csv)$"),
+    db: Session = Depends(get_read_db),
     current_user: dict = Depends(get_current_user),
 ):
     teacher = get_teacher_user(current_user, db)
 
+    if fmt == "csv":
+        # CSV has no sheets, so the class becomes the first column
+        query = (
+            db.query(models.Class.name, models.Student.name, models.Attendance.date, models.Attendance.status)
+            .join(models.Student, models.Student.class_id == models.Class.id)
+            .join(models.Attendance, models.Attendance.student_id == models.Student.id)
+            .filter(models.Class.teacher_id == teacher.id)
+            .order_by(models.Class.id, models.Student.id, models.Attendance.date)
+        )
+        query = _apply_export_filters(query, month, year, start_date, end_date)
+        rows = (
+            [class_name, student_name, d.strftime("%Y-%m-%d"), status]
+            for class_name, student_name, d, status in database.stream_rows(request, query)
+        )
+        filename = f"attendance_teacher_{teacher.id}.csv"
+        return stream_csv(["Class", "Student Name", "Date", "Status"], rows, filename)
+
     wb = openpyxl.Workbook()
     wb.remove(wb.active)  # remove default sheet
 
-    # Loop through each class
+    # One sheet per class, filled from a single query over all of the teacher's classes
+    sheets = {}
     for cls in teacher.classes:
-        ws = wb.create_sheet(title=cls.name)
-        ws.append(["Student Name", "Date", "Status"])
-
-        students = db.query(models.Student).filter(models.Student.class_id == cls.id).all()
-
-        for s in students:
-            query = db.query(models.Attendance).filter(models.Attendance.student_id == s.id)
-
-            # Apply optional filters
-            if month and year:
-                query = query.filter(
-                    db.extract("month", models.Attendance.date) == month,
-                    db.extract("year", models.Attendance.date) == year,
-                )
-            if start_date and end_date:
-                query = query.filter(models.Attendance.date.between(start_date, end_date))
-
-            records = query.all()
-            for r in records:
-                ws.append([s.name, r.date.strftime("%Y-%m-%d"), r.status])
+        sheets[cls.id] = wb.create_sheet(title=cls.name)
+        sheets[cls.id].append(["Student Name", "Date", "Status"])
+
+    query = (
+        db.query(models.Student.class_id, models.Student.name, models.Attendance.date, models.Attendance.status)
+        .join(models.Attendance, models.Attendance.student_id == models.Student.id)
+        .filter(models.Student.class_id.in_(list(sheets)))
+        .order_by(models.Student.id, models.Attendance.date)
+    )
+    # Apply optional filters
+    query = _apply_export_filters(query, month, year, start_date, end_date)
+    for class_id, student_name, d, status in query.yield_per(1000):
+        sheets[class_id].append([student_name, d.strftime("%Y-%m-%d"), status])
 
     # Save workbook to bytes
     stream = io.BytesIO()
@@ -383,6 +462,6 @@ def export_class_attendance_excel(
     filename = f"attendance_teacher_{teacher.id}.xlsx"
     return StreamingResponse(
         stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        media_type=XLSX_MEDIA_TYPE,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
\ No newline at end of file
+    )
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Literal, Optional
 
 # Token payloads
 class Token(BaseModel):
@@ -81,6 +81,25 @@ class SchoolOut(SchoolBase):
         orm_mode = True
 
 
+# -----------------------------
+# School calendar
+# -----------------------------
+class SchoolCalendarIn(BaseModel):
+    weekdays: List[int] = [0, 1, 2, 3, 4, 5]  # 0 = Monday
+    holidays: List[date] = []  # days off that the weekly pattern would count
+    extra_days: List[date] = []  # instructional days outside the weekly pattern
+
+class SchoolCalendarOut(BaseModel):
+    year: int
+    start: date
+    end: date
+    weekdays: List[int]
+    instructional_days: int
+    holidays: List[date]
+    extra_days: List[date]
+    stored: bool  # False: the default calendar, nothing saved for this year
+
+
 # -----------------------------
 # Teacher
 # -----------------------------
@@ -148,6 +167,7 @@ class StudentUpdate(BaseModel):
     class_id: Optional[int] = None
     school_id: Optional[int] = None
     face_embedding: Optional[list[float]]=None
+    face_embedding_model: Optional[str] = None  # defaults to FACE_MODEL_VERSION
 
 class StudentOut(StudentBase):
     id: int
@@ -179,4 +199,75 @@ class AttendanceOut(AttendanceBase):
     teacher_id: int
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+# -----------------------------
+# Imports
+# -----------------------------
+# Rows read from Excel/CSV uploads (columns documented on the upload endpoints)
+class TeacherImport(BaseModel):
+    name: str
+    email: EmailStr
+    password: str
+
+class ClassImport(BaseModel):
+    name: str
+    teacher_id: int
+
+class StudentImport(BaseModel):
+    id: int
+    name: str
+    roll_no: str
+
+
+class ImportJobCreate(BaseModel):
+    kind: str   # teachers / classes / students
+    filename: str
+    total_bytes: int
+
+class ImportJobOut(BaseModel):
+    id: int
+    kind: str
+    filename: str
+    status: str
+    total_bytes: int
+    received_bytes: int
+    rows_processed: int
+    rows_imported: int
+    error_count: int
+    errors: Optional[list] = None
+    rows_per_second: Optional[float] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+
+# -----------------------------
+# Face recognition
+# -----------------------------
+class RecognizeRequest(BaseModel):
+    probes: list[list[float]]  # one embedding per detected face
+    threshold: Optional[float] = None  # cosine similarity; defaults to FACE_MATCH_THRESHOLD
+    # frame mode (class endpoint): every probe comes from one photo of the whole class, so
+    # students are assigned one-to-one and everyone not in the photo is marked absent
+    frame: bool = False
+    assignment: Literal["greedy", "hungarian"] = "greedy"
+
+class RecognizeMatch(BaseModel):
+    probe_index: int
+    student_id: int
+    name: str
+    score: float
+
+class RecognizeOut(BaseModel):
+    class_id: Optional[int] = None  # class kiosk
+    school_id: Optional[int] = None  # school-wide gate camera
+    matches: list[RecognizeMatch]
+    unmatched_probes: list[int]
+    marked_present: int
+    marked_absent: int = 0
+    match_ms: float
@@ -0,0 +1,280 @@
+"""
+Seed a synthetic district for local load testing: schools (one administrator each), teachers,
+classes, students (optionally with face embeddings) and years of school-day attendance.
+
+    python app/seed_district.py --schools 20 --students-per-class 40 --years 3 --embeddings 3
+
+The same arguments against the same (e.g. empty) database always produce the same rows.
+Rows are loaded with COPY on PostgreSQL (psycopg2) and batched executemany elsewhere, in id
+order, so nothing is read back while loading. Every seeded user gets the --password password.
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import csv
+import io
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, select, text
+
+from app import models
+from app.database import Base, engine
+from app.utils.auth_utils import get_password_hash
+from app.utils.face_embeddings import FACE_EMBEDDING_DIM, normalize_rows, sample_columns
+from app.utils.school_calendar import academic_year, pack_days, weekday_mask, year_span
+
+LOAD_BATCH_ROWS = 50_000
+
+FIRST_NAMES = [
+    "Aarav", "Vivaan", "Aditya", "Vihaan", "Arjun", "Sai", "Reyansh", "Ayaan", "Krishna", "Ishaan",
+    "Ananya", "Diya", "Aadhya", "Saanvi", "Pari", "Anika", "Navya", "Myra", "Sara", "Kavya",
+    "Rohan", "Kabir", "Meera", "Riya", "Nikhil", "Priya", "Tanvi", "Harsh", "Neha", "Yash",
+]
+LAST_NAMES = [
+    "Sharma", "Verma", "Gupta", "Singh", "Kumar", "Patel", "Reddy", "Iyer", "Nair", "Das",
+    "Jain", "Mehta", "Joshi", "Rao", "Chopra", "Bose", "Mishra", "Pandey", "Yadav", "Khan",
+]
+
+# ---------------------------
+# SCHOOL CALENDAR
+# ---------------------------
+# (month, day) ranges with no school: summer break, winter break
+BREAKS = [((5, 1), (6, 15)), ((12, 25), (12, 31)), ((1, 1), (1, 1))]
+# relative absence rate by weekday (Mon..Sat) and by month
+WEEKDAY_FACTOR = np.array([1.2, 1.0, 1.0, 1.0, 1.25, 1.4])
+MONTH_FACTOR = np.array([1.2, 1.0, 0.9, 0.9, 1.0, 1.0, 1.3, 1.3, 1.1, 1.0, 1.0, 1.2])  # colds, monsoon
+# chance of staying away the day after an absence (illness runs for a few days)
+ABSENCE_STREAK = 0.45
+CHRONIC_SHARE = 0.08  # students with a much higher absence rate
+
+
+def school_days(start: date, end: date, days_per_week: int) -> list:
+    days = []
+    d = start
+    while d <= end:
+        on_break = any(lo <= (d.month, d.day) <= hi for lo, hi in BREAKS)
+        if d.weekday() < days_per_week and not on_break:
+            days.append(d)
+        d += timedelta(days=1)
+    return days
+
+
+def absence_rates(rng: np.random.Generator, n: int) -> np.ndarray:
+    # most students miss a few percent of days, a minority a fifth or more
+    rates = rng.beta(1.5, 30, size=n)
+    chronic = rng.random(n) < CHRONIC_SHARE
+    rates[chronic] = rng.beta(2, 8, size=int(chronic.sum()))
+    return rates
+
+
+# ---------------------------
+# BULK LOADING
+# ---------------------------
+def _copy_value(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        return "\\x" + value.hex()  # bytea hex input
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def _last_value_cache(process):
+    # a day's attendance rows share one datetime object; convert it once, not once per row
+    last = [None, None]
+
+    def cached(value):
+        if value is not last[0]:
+            last[0], last[1] = value, process(value)
+        return last[1]
+
+    return cached
+
+
+def bulk_load(conn, table, columns, rows) -> int:
+    """
+    Insert an iterable of row tuples (values in `columns` order) into `table`.
+    """
+    dialect = conn.dialect
+    psycopg2_copy = dialect.name == "postgresql" and dialect.driver == "psycopg2"
+    copy_sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    # positional drivers (sqlite3, mysql) take plain tuples, skipping per-row dict handling
+    placeholder = {"qmark": "?", "format": "%s"}.get(dialect.paramstyle)
+    raw_sql = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join([placeholder or ''] * len(columns))})"
+    processors = [table.c[c].type.dialect_impl(dialect).bind_processor(dialect) for c in columns]
+    processed = [(i, _last_value_cache(proc)) for i, proc in enumerate(processors) if proc is not None]
+    insert = table.insert()
+    total = 0
+    rows = iter(rows)
+    while True:
+        batch = [row for _, row in zip(range(LOAD_BATCH_ROWS), rows)]
+        if not batch:
+            return total
+        if psycopg2_copy:
+            buf = io.StringIO()
+            csv.writer(buf).writerows([_copy_value(v) for v in row] for row in batch)
+            buf.seek(0)
+            conn.connection.driver_connection.cursor().copy_expert(copy_sql, buf)
+        elif placeholder:
+            if processed:
+                converted = []
+                for row in batch:
+                    row = list(row)
+                    for i, proc in processed:
+                        row[i] = proc(row[i])
+                    converted.append(tuple(row))
+                batch = converted
+            conn.exec_driver_sql(raw_sql, batch)
+        else:
+            conn.execute(insert, [dict(zip(columns, row)) for row in batch])
+        total += len(batch)
+
+
+def next_id(conn, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def reset_sequences(conn):
+    # ids were assigned here, so move PostgreSQL's serial sequences past them
+    if conn.dialect.name != "postgresql":
+        return
+    for model in (models.Administrator, models.School, models.Teacher, models.Class, models.Student, models.Attendance):
+        table = model.__tablename__
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        ))
+
+
+def timed_load(conn, model, columns, rows):
+    start = time.perf_counter()
+    count = bulk_load(conn, model.__table__, columns, rows)
+    seconds = time.perf_counter() - start
+    print(f"  {model.__tablename__:<15}{count:>12,} rows  {seconds:8.1f}s  {count / max(seconds, 1e-9):>12,.0f} rows/s")
+    return count
+
+
+# ---------------------------
+# DISTRICT
+# ---------------------------
+def seed(args):
+    rng = np.random.default_rng(args.seed)
+    end = date.fromisoformat(args.end) if args.end else date.today()
+    days = school_days(end - timedelta(days=round(365 * args.years)), end, args.days_per_week)
+    password = get_password_hash(args.password)  # bcrypt is slow; one hash shared by every user
+    tag = f"seed{args.seed}"
+
+    def name():
+        return f"{FIRST_NAMES[rng.integers(len(FIRST_NAMES))]} {LAST_NAMES[rng.integers(len(LAST_NAMES))]}"
+
+    if args.create_tables:
+        Base.metadata.create_all(engine)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        admin_id = next_id(conn, models.Administrator)
+        school_id = next_id(conn, models.School)
+        teacher_id = next_id(conn, models.Teacher)
+        class_id = next_id(conn, models.Class)
+        student_id = next_id(conn, models.Student)
+        attendance_id = next_id(conn, models.Attendance)
+
+        admins, schools, teachers, classes, students = [], [], [], [], []
+        class_teacher = {}  # class id -> teacher id
+        class_students = []  # (class id, first student id, count)
+        for s in range(args.schools):
+            admins.append((admin_id, name(), f"admin{admin_id}@{tag}.example.com", password))
+            schools.append((school_id, f"School {school_id}", f"{s + 1} District Road", admin_id))
+            for t in range(args.teachers_per_school):
+                teachers.append((teacher_id, name(), f"teacher{teacher_id}@{tag}.example.com", password, school_id))
+                for c in range(args.classes_per_teacher):
+                    classes.append((class_id, f"Grade {(t % 12) + 1}-{chr(65 + c)} ({teacher_id})", school_id, teacher_id))
+                    class_teacher[class_id] = teacher_id
+                    size = max(1, int(round(args.students_per_class * rng.uniform(0.8, 1.2))))
+                    class_students.append((class_id, student_id, size))
+                    for roll in range(1, size + 1):
+                        students.append((student_id, name(), str(roll), class_id, school_id))
+                        student_id += 1
+                    class_id += 1
+                teacher_id += 1
+            admin_id += 1
+            school_id += 1
+
+        print(f"Seeding {len(schools)} schools, {len(teachers)} teachers, {len(classes)} classes, "
+              f"{len(students)} students, {len(days)} school days ({days[0] if days else '-'} .. {end})")
+        timed_load(conn, models.Administrator, ("id", "name", "email", "password"), admins)
+        timed_load(conn, models.School, ("id", "name", "address", "administrator_id"), schools)
+        # every school keeps the generated calendar, breaks included, so reports expect exactly these days
+        calendars = []
+        for year in range(academic_year(days[0]), academic_year(end) + 1) if days else ():
+            first, after = year_span(year)
+            bits = pack_days(year, school_days(first, after - timedelta(days=1), args.days_per_week))
+            calendars += [(school[0], year, bits, weekday_mask(range(args.days_per_week))) for school in schools]
+        timed_load(conn, models.SchoolCalendar, ("school_id", "year", "days", "weekdays"), calendars)
+        timed_load(conn, models.Teacher, ("id", "name", "email", "password", "school_id"), teachers)
+        timed_load(conn, models.Class, ("id", "name", "school_id", "teacher_id"), classes)
+
+        student_columns = ("id", "name", "roll_no", "class_id", "school_id")
+        if args.embeddings:
+            student_columns += ("face_embedding", "face_embedding_dim", "face_embedding_dtype",
+                                "face_embedding_model", "face_samples", "face_sample_count")
+
+        def student_rows():
+            for row in students:
+                if not args.embeddings:
+                    yield row
+                    continue
+                # a student's samples are noisy views of one identity vector
+                identity = rng.standard_normal(FACE_EMBEDDING_DIM).astype(np.float32)
+                noise = 0.3 * rng.standard_normal((args.embeddings, FACE_EMBEDDING_DIM)).astype(np.float32)
+                cols = sample_columns(normalize_rows(identity + noise))
+                yield row + tuple(cols[c] for c in student_columns[5:])
+
+        timed_load(conn, models.Student, student_columns, student_rows())
+
+        # attendance: one row per student per school day, absences as a two-state Markov chain
+        n_students = len(students)
+        first_student = students[0][0] if students else 0
+        teacher_of = np.empty(n_students, dtype=np.int64)
+        for cid, first, size in class_students:
+            teacher_of[first - first_student:first - first_student + size] = class_teacher[cid]
+        base = absence_rates(rng, n_students)
+        ids = np.arange(first_student, first_student + n_students)
+
+        def attendance_rows():
+            nonlocal attendance_id
+            absent = np.zeros(n_students, dtype=bool)
+            for d in days:
+                p = base * WEEKDAY_FACTOR[d.weekday()] * MONTH_FACTOR[d.month - 1]
+                absent = rng.random(n_students) < np.where(absent, ABSENCE_STREAK, p)
+                when = datetime(d.year, d.month, d.day)  # stored at midnight, like the API does
+                for sid, tid, away in zip(ids.tolist(), teacher_of.tolist(), absent.tolist()):
+                    yield attendance_id, when, "Absent" if away else "Present", sid, tid
+                    attendance_id += 1
+
+        timed_load(conn, models.Attendance, ("id", "date", "status", "student_id", "teacher_id"), attendance_rows())
+        reset_sequences(conn)
+    print(f"✅ Done in {time.perf_counter() - started:.1f}s. Log in as admin{schools[0][3] if schools else ''}@{tag}.example.com "
+          f"(or any teacherN@{tag}.example.com) with the seeded password.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schools", type=int, default=5)
+    parser.add_argument("--teachers-per-school", type=int, default=20)
+    parser.add_argument("--classes-per-teacher", type=int, default=1)
+    parser.add_argument("--students-per-class", type=int, default=40, help="average; each class varies by +-20%%")
+    parser.add_argument("--years", type=float, default=1.0, help="attendance history to generate")
+    parser.add_argument("--end", help="last attendance day (YYYY-MM-DD), default today")
+    parser.add_argument("--days-per-week", type=int, default=6, choices=range(1, 7), help="6 = Monday to Saturday")
+    parser.add_argument("--embeddings", type=int, default=0, metavar="SAMPLES", help="face samples per student (0 = none)")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--create-tables", action="store_true", help="create missing tables first (instead of alembic)")
+    seed(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# app/utils/admission.py
+import asyncio
+import math
+import os
+import random
+import re
+import time
+from collections import deque
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+
+from app.database import DB_MAX_OVERFLOW, DB_POOL_SIZE
+from app.utils.auth_utils import ALGORITHM, SECRET_KEY
+from app.utils.metrics import Histogram
+
+# Admission control: a worker runs at most ADMISSION_CONCURRENCY requests at once and queues
+# the rest by priority, instead of letting everything pile up in the threadpool and the DB pool
+# and time out together at the morning peak.
+#
+#   critical  attendance writes and login; may use every slot, ADMISSION_RESERVED are theirs only
+#   default   everything else
+#   bulk      exports, reports and spreadsheet uploads; at most ADMISSION_BULK_CONCURRENCY at
+#             once and a short queue, beyond which they get 429 with Retry-After right away
+#
+# Within a priority, a school holding more than ADMISSION_SCHOOL_SHARE of the slots waits while
+# other schools' requests go first (it still gets idle slots, so a lone school isn't capped).
+# Queued requests that don't start within ADMISSION_QUEUE_TIMEOUT get 429 as well.
+# Opt-in: with it on, clients can get 429s they never used to, so enable it once they retry on them.
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "0") == "1"
+# requests mostly hold a pooled connection from start to end, so the pool is the real capacity;
+# queueing here rather than in the pool also keeps threads free for the requests that have one
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+ADMISSION_RESERVED = int(os.getenv("ADMISSION_RESERVED", str(max(1, ADMISSION_CONCURRENCY // 4))))
+# exports build xlsx/CSV in Python and compete with everything else for the GIL; on one worker
+# three at once gave half the roll-call throughput of one at a time (benchmarks/admission.py)
+ADMISSION_BULK_CONCURRENCY = int(os.getenv("ADMISSION_BULK_CONCURRENCY", str(max(1, ADMISSION_CONCURRENCY // 8))))
+ADMISSION_SCHOOL_SHARE = float(os.getenv("ADMISSION_SCHOOL_SHARE", "0.5"))  # of ADMISSION_CONCURRENCY
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))  # seconds
+ADMISSION_QUEUE_LIMITS = {  # waiting requests per priority
+    "critical": int(os.getenv("ADMISSION_CRITICAL_QUEUE", "256")),
+    "default": int(os.getenv("ADMISSION_DEFAULT_QUEUE", "128")),
+    "bulk": int(os.getenv("ADMISSION_BULK_QUEUE", "8")),
+}
+ADMISSION_RETRY_AFTER_MAX = int(os.getenv("ADMISSION_RETRY_AFTER_MAX", "30"))  # seconds
+
+PRIORITIES = ("critical", "default", "bulk")  # dispatch order
+
+# (methods, path, priority), first match wins; anything else is "default"
+ROUTE_PRIORITIES = [
+    ({"POST"}, r"/auth/login", "critical"),
+    ({"POST"}, r"/attendance/mark", "critical"),
+    ({"POST"}, r"/teacher/attendance/student/\d+", "critical"),
+    ({"POST"}, r"/teacher/attendance/class/\d+/recognize", "critical"),
+    ({"POST"}, r"/administrator/attendance/school/recognize", "critical"),
+    ({"GET"}, r".*/(export|excel|export-excel)", "bulk"),
+    ({"GET"}, r"/administrator/attendance/school", "bulk"),
+    ({"GET"}, r"/superadmin/attendance/report", "bulk"),
+    ({"POST"}, r".*/upload-excel", "bulk"),
+]
+# never queued or shed: monitoring has to work best when the server is busiest
+EXEMPT_PATHS = re.compile(r"/|/metrics|/internal/.*|/docs|/redoc|/openapi\.json")
+
+_ROUTE_PRIORITIES = [(methods, re.compile(path + "/?"), priority) for methods, path, priority in ROUTE_PRIORITIES]
+
+
+def request_priority(method: str, path: str) -> Optional[str]:
+    """
+    Priority of a request from its method and path (routing hasn't run yet), None if exempt.
+    CORS preflights are exempt too: queueing them behind default traffic would hold up the
+    critical writes they precede.
+    """
+    if method == "OPTIONS" or EXEMPT_PATHS.fullmatch(path):
+        return None
+    for methods, pattern, priority in _ROUTE_PRIORITIES:
+        if method in methods and pattern.fullmatch(path):
+            return priority
+    return "default"
+
+
+def request_school(headers: list) -> Optional[int]:
+    """
+    The school_id claim of the request's bearer token; None for superadmins, tokens issued
+    before the claim existed and anonymous or invalid requests (authentication rejects those later).
+    """
+    for name, value in headers:
+        if name == b"authorization":
+            token = value.decode("latin-1")
+            if token[:7].lower() != "bearer ":
+                return None
+            try:
+                return jwt.decode(token[7:].strip(), SECRET_KEY, algorithms=[ALGORITHM]).get("school_id")
+            except JWTError:
+                return None
+    return None
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+
+
+class Waiter:
+    __slots__ = ("priority", "school", "future", "started")
+
+    def __init__(self, priority: str, school: Optional[int], future: asyncio.Future):
+        self.priority = priority
+        self.school = school
+        self.future = future
+        self.started = 0.0
+
+
+# ---------------------------
+# CONTROLLER
+# ---------------------------
+class AdmissionController:
+    """
+    Per-worker slots and priority queues. Everything runs on the event loop, so no locks:
+    acquire() queues the request and dispatches, release() frees its slot and dispatches again.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = ADMISSION_CONCURRENCY,
+        reserved: int = ADMISSION_RESERVED,
+        bulk_concurrency: int = ADMISSION_BULK_CONCURRENCY,
+        school_share: float = ADMISSION_SCHOOL_SHARE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        queue_limits: Optional[dict] = None,
+    ):
+        self.concurrency = concurrency
+        self.reserved = min(reserved, concurrency - 1)  # leave at least one slot for the rest
+        self.bulk_concurrency = bulk_concurrency
+        self.school_limit = max(1, int(concurrency * school_share))
+        self.queue_timeout = queue_timeout
+        self.queue_limits = queue_limits or ADMISSION_QUEUE_LIMITS
+        self.running = 0
+        self.in_flight = {p: 0 for p in PRIORITIES}
+        self.schools = {}  # school_id -> requests running
+        self.queues = {p: deque() for p in PRIORITIES}
+        # seconds a request holds its slot, moving average per priority, for Retry-After
+        self.service_seconds = {p: 1.0 for p in PRIORITIES}
+        # metrics
+        self.decisions = {}  # (priority, decision) -> count
+        self.queue_wait = {p: Histogram() for p in PRIORITIES}
+        self.deferred = 0  # waiters passed over because their school was over its share
+
+    def slots(self, priority: str) -> int:
+        if priority == "critical":
+            return self.concurrency
+        if priority == "bulk":
+            return min(self.bulk_concurrency, self.concurrency - self.reserved)
+        return self.concurrency - self.reserved
+
+    def _can_run(self, priority: str) -> bool:
+        if priority == "critical":
+            return self.running < self.concurrency
+        if self.running >= self.concurrency - self.reserved:
+            return False
+        return priority != "bulk" or self.in_flight["bulk"] < self.bulk_concurrency
+
+    def _next(self, queue: deque) -> Waiter:
+        # oldest waiter whose school is under its share; failing that the oldest one, so free
+        # slots are never left idle
+        for i, waiter in enumerate(queue):
+            if waiter.school is None or self.schools.get(waiter.school, 0) < self.school_limit:
+                if i:
+                    self.deferred += 1
+                    del queue[i]
+                    return waiter
+                return queue.popleft()
+        return queue.popleft()
+
+    def _dispatch(self):
+        for priority in PRIORITIES:
+            queue = self.queues[priority]
+            while queue and self._can_run(priority):
+                waiter = self._next(queue)
+                self.running += 1
+                self.in_flight[priority] += 1
+                if waiter.school is not None:
+                    self.schools[waiter.school] = self.schools.get(waiter.school, 0) + 1
+                waiter.started = time.perf_counter()
+                waiter.future.set_result(None)
+
+    def _count(self, priority: str, decision: str):
+        key = (priority, decision)
+        self.decisions[key] = self.decisions.get(key, 0) + 1
+
+    def retry_after(self, priority: str) -> int:
+        """
+        Seconds until the queue ahead should have drained, jittered so that the clients
+        turned away together don't all come back together.
+        """
+        estimate = (len(self.queues[priority]) + 1) * self.service_seconds[priority] / max(self.slots(priority), 1)
+        return min(ADMISSION_RETRY_AFTER_MAX, max(1, math.ceil(estimate * random.uniform(1.0, 1.5))))
+
+    async def acquire(self, priority: str, school: Optional[int]) -> Waiter:
+        """
+        Wait for a slot; raises Overloaded when the queue is full or the wait times out.
+        """
+        queue = self.queues[priority]
+        if len(queue) >= self.queue_limits[priority]:
+            self._count(priority, "shed_queue_full")
+            raise Overloaded(self.retry_after(priority))
+        waiter = Waiter(priority, school, asyncio.get_running_loop().create_future())
+        queue.append(waiter)
+        self._dispatch()
+        if waiter.future.done():
+            self._count(priority, "admitted")
+            self.queue_wait[priority].observe(0.0)
+            return waiter
+
+        queued = time.perf_counter()
+        try:
+            await asyncio.wait((waiter.future,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        self.queue_wait[priority].observe(time.perf_counter() - queued)
+        if not waiter.future.done():
+            self._abandon(waiter)
+            self._count(priority, "shed_timeout")
+            raise Overloaded(self.retry_after(priority))
+        self._count(priority, "queued")
+        return waiter
+
+    def _abandon(self, waiter: Waiter):
+        if waiter.future.done():  # got its slot just as it gave up
+            self.release(waiter)
+            return
+        self.queues[waiter.priority].remove(waiter)
+        waiter.future.cancel()
+
+    def release(self, waiter: Waiter):
+        priority = waiter.priority
+        self.running -= 1
+        self.in_flight[priority] -= 1
+        if waiter.school is not None:
+            left = self.schools[waiter.school] - 1
+            if left:
+                self.schools[waiter.school] = left
+            else:
+                del self.schools[waiter.school]
+        held = time.perf_counter() - waiter.started
+        self.service_seconds[priority] += 0.2 * (held - self.service_seconds[priority])
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "reserved": self.reserved,
+            "bulk_concurrency": self.bulk_concurrency,
+            "school_limit": self.school_limit,
+            "queue_timeout_seconds": self.queue_timeout,
+            "running": self.running,
+            "in_flight": dict(self.in_flight),
+            "queued": {p: len(q) for p, q in self.queues.items()},
+            "queue_limits": dict(self.queue_limits),
+            "busiest_schools": dict(sorted(self.schools.items(), key=lambda item: item[1], reverse=True)[:10]),
+            "service_seconds": {p: round(s, 3) for p, s in self.service_seconds.items()},
+            "decisions": {f"{p}:{d}": n for (p, d), n in sorted(self.decisions.items())},
+            "deferred": self.deferred,
+        }
+
+
+admission = AdmissionController()
+
+
+# ---------------------------
+# ASGI MIDDLEWARE
+# ---------------------------
+class AdmissionMiddleware:
+    """
+    Pure ASGI; the slot is held until the last body chunk is sent, so a streamed export counts
+    for as long as it runs. Event streams give their slot back once the response has started.
+    """
+
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        priority = request_priority(scope["method"], scope["path"])
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            waiter = await self.controller.acquire(priority, request_school(scope["headers"]))
+        except Overloaded as exc:
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry later"},
+                status_code=429,
+                headers={"Retry-After": str(exc.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        released = False
+
+        async def send_and_release(message):
+            nonlocal released
+            if message["type"] == "http.response.start" and not released:
+                for name, value in message.get("headers", ()):
+                    if name == b"content-type" and value.startswith(b"text/event-stream"):
+                        # open for hours and mostly idle (see app/utils/live_attendance.py)
+                        released = True
+                        self.controller.release(waiter)
+                        break
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_release)
+        finally:
+            if not released:
+                self.controller.release(waiter)
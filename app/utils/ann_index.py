@@ -0,0 +1,345 @@
+# app/utils/ann_index.py
+from __future__ import annotations
+
+import os
+import math
+import fcntl
+import threading
+from contextlib import contextmanager
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.lazy_imports import LazyModule
+from app.utils.face_embeddings import FACE_EMBEDDING_DIM, decode_embedding, embedding_matrix, normalize_rows
+
+np = LazyModule("numpy")
+
+# School-wide approximate nearest-neighbour index (IVF: k-means coarse quantiser + inverted
+# lists) for gate cameras that have to match a face against every student in the school.
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", "ann_indexes")
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))  # inverted lists scanned per probe
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))  # 0 = about sqrt(students)
+# below this many students a single list (exact search) is as fast as IVF
+ANN_MIN_TRAIN = int(os.getenv("ANN_MIN_TRAIN", "1000"))
+# retrain once the index has grown this much since the centroids were computed
+ANN_RETRAIN_GROWTH = float(os.getenv("ANN_RETRAIN_GROWTH", "2.0"))
+
+
+def auto_nlist(n: int) -> int:
+    if n < ANN_MIN_TRAIN:
+        return 1
+    return ANN_NLIST or max(1, int(math.sqrt(n)))
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    k unit-length centroids for unit-length rows (cosine k-means).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = (vectors @ centroids.T).argmax(axis=1)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=k)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        sums = np.zeros_like(centroids)
+        nonempty = counts > 0
+        sums[nonempty] = np.add.reduceat(vectors[order], starts[nonempty], axis=0)
+        # an empty cluster restarts from a random point
+        sums[~nonempty] = vectors[rng.choice(len(vectors), size=int((~nonempty).sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index over unit-length float32 vectors, keyed by student id.
+    Inner product on normalised vectors is cosine similarity.
+    """
+
+    def __init__(self, dim: int = FACE_EMBEDDING_DIM):
+        self.dim = dim
+        self.centroids = np.zeros((1, dim), dtype=np.float32)  # untrained: one list, exact search
+        self.list_ids = [np.empty(0, dtype=np.int64)]
+        self.list_vectors = [np.empty((0, dim), dtype=np.float32)]
+        self.where = {}  # student id -> list number
+        self.trained_size = 0
+        self.fingerprint = ""  # SchoolIndexes: the students table state this index reflects
+        self.lock = threading.RLock()
+
+    @property
+    def size(self) -> int:
+        return len(self.where)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.list_ids)
+
+    def train(self, ids: Sequence[int], vectors: np.ndarray, nlist: Optional[int] = None):
+        """
+        Rebuild from scratch: compute centroids and re-assign every vector.
+        """
+        vectors = normalize_rows(vectors)
+        nlist = min(nlist or auto_nlist(len(ids)), max(len(ids), 1))
+        with self.lock:
+            if nlist > 1:
+                self.centroids = spherical_kmeans(vectors, nlist)
+            else:
+                self.centroids = np.zeros((1, self.dim), dtype=np.float32)
+            self.list_ids = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+            self.list_vectors = [np.empty((0, self.dim), dtype=np.float32) for _ in range(nlist)]
+            self.where = {}
+            self.trained_size = len(ids)
+            self._add(np.asarray(ids, dtype=np.int64), vectors)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        if self.nlist == 1:
+            return np.zeros(len(vectors), dtype=np.intp)
+        return (vectors @ self.centroids.T).argmax(axis=1)
+
+    def _add(self, ids: np.ndarray, vectors: np.ndarray):
+        lists = self._assign(vectors)
+        for lst in np.unique(lists):
+            rows = lists == lst
+            self.list_ids[lst] = np.concatenate([self.list_ids[lst], ids[rows]])
+            self.list_vectors[lst] = np.concatenate([self.list_vectors[lst], vectors[rows]])
+            for student_id in ids[rows].tolist():
+                self.where[student_id] = int(lst)
+
+    def add(self, ids: Sequence[int], vectors: np.ndarray):
+        """
+        Insert (or replace) vectors; retrains once the index has outgrown its centroids.
+        """
+        with self.lock:
+            self.remove(ids)
+            self._add(np.asarray(ids, dtype=np.int64), normalize_rows(vectors))
+            if self.needs_retrain():
+                all_ids, all_vectors = self.export()
+                self.train(all_ids, all_vectors)
+
+    def remove(self, ids: Sequence[int]):
+        with self.lock:
+            by_list = {}
+            for student_id in ids:
+                lst = self.where.pop(int(student_id), None)
+                if lst is not None:
+                    by_list.setdefault(lst, []).append(int(student_id))
+            for lst, removed in by_list.items():
+                keep = ~np.isin(self.list_ids[lst], removed)
+                self.list_ids[lst] = self.list_ids[lst][keep]
+                self.list_vectors[lst] = self.list_vectors[lst][keep]
+
+    def needs_retrain(self) -> bool:
+        if self.nlist == 1:
+            return self.size >= ANN_MIN_TRAIN
+        return self.size > self.trained_size * ANN_RETRAIN_GROWTH or self.size < self.trained_size / ANN_RETRAIN_GROWTH
+
+    def export(self) -> Tuple[np.ndarray, np.ndarray]:
+        with self.lock:
+            return np.concatenate(self.list_ids), np.concatenate(self.list_vectors)
+
+    def search(self, probes: np.ndarray, nprobe: int = ANN_NPROBE) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best (student_id, cosine score) per probe, scanning the `nprobe` closest lists.
+        Probes with nothing to compare against get id -1 and score -inf.
+        """
+        probes = normalize_rows(probes)
+        best_ids = np.full(len(probes), -1, dtype=np.int64)
+        best_scores = np.full(len(probes), -np.inf, dtype=np.float32)
+        with self.lock:
+            nprobe = min(nprobe, self.nlist)
+            if nprobe < self.nlist:
+                top = np.argpartition(-(probes @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+            else:
+                top = np.broadcast_to(np.arange(self.nlist), (len(probes), self.nlist))
+            # one matrix multiply per inverted list, for every probe that visits it
+            for lst in np.unique(top):
+                vectors = self.list_vectors[lst]
+                if not len(vectors):
+                    continue
+                rows = np.flatnonzero((top == lst).any(axis=1))
+                scores = probes[rows] @ vectors.T
+                j = scores.argmax(axis=1)
+                top_scores = scores[np.arange(len(rows)), j]
+                better = top_scores > best_scores[rows]
+                best_scores[rows[better]] = top_scores[better]
+                best_ids[rows[better]] = self.list_ids[lst][j[better]]
+        return best_ids, best_scores
+
+    # ---------------------------
+    # Persistence
+    # ---------------------------
+    def save(self, path: str):
+        with self.lock:
+            ids, vectors = self.export()
+            counts = np.array([len(x) for x in self.list_ids], dtype=np.int64)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, centroids=self.centroids, ids=ids, vectors=vectors, counts=counts,
+                         trained_size=np.int64(self.trained_size), fingerprint=np.str_(self.fingerprint))
+            os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            index = cls(dim=data["centroids"].shape[1])
+            index.centroids = data["centroids"]
+            index.trained_size = int(data["trained_size"])
+            index.fingerprint = str(data["fingerprint"]) if "fingerprint" in data.files else ""
+            bounds = np.cumsum(data["counts"])[:-1]
+            index.list_ids = np.split(data["ids"], bounds)
+            index.list_vectors = np.split(data["vectors"], bounds)
+        for lst, ids in enumerate(index.list_ids):
+            for student_id in ids.tolist():
+                index.where[student_id] = lst
+        return index
+
+
+def school_fingerprint(db: Session, school_id: int) -> str:
+    """
+    Enrolled-student count plus the school's latest student update: changes whenever a write
+    reaches the students table, including ones (imports, scripts) that bypass SchoolIndexes.
+    """
+    count, latest = (
+        db.query(func.count(models.Student.face_embedding), func.max(models.Student.updated_at))
+        .filter(models.Student.school_id == school_id)
+        .one()
+    )
+    return f"{count}:{latest.isoformat() if latest else ''}"
+
+
+class SchoolIndexes:
+    """
+    One IVFIndex per school, loaded from ANN_INDEX_DIR or built from the database on first
+    use. Every change is saved straight away; other workers reload when the file changes.
+    Updates reload, modify and save under an flock on the school's lock file, so two workers
+    enrolling students at the same time can't drop each other's additions.
+    Each saved index carries the school's fingerprint; get() rebuilds when the database has
+    moved on without it.
+    """
+
+    def __init__(self, directory: str = ANN_INDEX_DIR):
+        self.directory = directory
+        self.indexes = {}  # school_id -> (index, file version)
+        self._locks = {}  # school_id -> lock, so one school's rebuild doesn't stall the others
+        self._locks_lock = threading.Lock()
+
+    def path(self, school_id: int) -> str:
+        return os.path.join(self.directory, f"school_{school_id}.npz")
+
+    def _school_lock(self, school_id: int) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(school_id, threading.Lock())
+
+    def _version(self, school_id: int) -> Optional[Tuple[int, int, int]]:
+        # every save replaces the file, so the inode changes even when two saves land within
+        # one tick of the (coarse) file system clock
+        try:
+            st = os.stat(self.path(school_id))
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    @contextmanager
+    def _locked(self, school_id: int):
+        """
+        This worker's lock for the school plus an exclusive flock shared with the other
+        workers, held from reading the school's file to saving it again.
+        """
+        with self._school_lock(school_id):
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"school_{school_id}.lock"), "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+                yield
+
+    def _save(self, db: Session, school_id: int, index: IVFIndex):
+        # called after the change is committed and applied, so index and table agree again
+        index.fingerprint = school_fingerprint(db, school_id)
+        index.save(self.path(school_id))
+        self.indexes[school_id] = (index, self._version(school_id))
+
+    def _current(self, school_id: int) -> Optional[IVFIndex]:
+        version = self._version(school_id)
+        entry = self.indexes.get(school_id)
+        if entry and entry[1] == version:
+            return entry[0]
+        if version is None:
+            return None
+        index = IVFIndex.load(self.path(school_id))
+        self.indexes[school_id] = (index, version)
+        return index
+
+    def build(self, db: Session, school_id: int, stale: Optional[IVFIndex] = None) -> IVFIndex:
+        """
+        Build the school's index from the database and save it, unless another worker has
+        meanwhile saved one (other than `stale`, the out-of-date index being replaced).
+        """
+        rows = (
+            db.query(models.Student.id, models.Student.face_embedding, models.Student.face_embedding_dtype)
+            .filter(
+                models.Student.school_id == school_id,
+                models.Student.face_embedding.isnot(None),
+                models.Student.face_embedding_dim == FACE_EMBEDDING_DIM,
+            )
+            .all()
+        )
+        ids, matrix = embedding_matrix(rows)
+        index = IVFIndex()
+        index.train(ids, matrix)
+        with self._locked(school_id):
+            # another worker built it meanwhile and may already have applied updates to it
+            current = self._current(school_id)
+            if current is not None and current is not stale:
+                return current
+            self._save(db, school_id, index)
+        return index
+
+    def get(self, db: Session, school_id: int) -> IVFIndex:
+        with self._school_lock(school_id):
+            index = self._current(school_id)
+        if index is None:
+            return self.build(db, school_id)
+        if index.fingerprint != school_fingerprint(db, school_id):
+            return self.build(db, school_id, stale=index)
+        return index
+
+    def student_changed(self, db: Session, student, old_school_id: Optional[int] = None):
+        """
+        Apply a committed enrollment change (new/cleared embedding, moved or deleted student)
+        to indexes that already exist; the others pick it up when first built.
+        """
+        if old_school_id is not None and old_school_id != student.school_id:
+            self.student_removed(db, old_school_id, student.id)
+        with self._locked(student.school_id):
+            index = self._current(student.school_id)
+            if index is None:
+                return
+            if student.face_embedding is not None and student.face_embedding_dim == index.dim:
+                vector = decode_embedding(student.face_embedding, student.face_embedding_dtype)
+                index.add([student.id], vector.reshape(1, -1))
+            else:
+                index.remove([student.id])
+            self._save(db, student.school_id, index)
+
+    def students_enrolled(self, db: Session, school_id: int, ids: Sequence[int], vectors: np.ndarray):
+        """
+        Bulk version of student_changed for a batch of new embeddings in one school (one save).
+        """
+        with self._locked(school_id):
+            index = self._current(school_id)
+            if index is not None:
+                index.add(ids, vectors)
+                self._save(db, school_id, index)
+
+    def student_removed(self, db: Session, school_id: int, student_id: int):
+        with self._locked(school_id):
+            index = self._current(school_id)
+            if index is not None:
+                index.remove([student_id])
+                self._save(db, school_id, index)
+
+
+school_indexes = SchoolIndexes()
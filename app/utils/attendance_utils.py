@@ -0,0 +1,148 @@
+# app/utils/attendance_utils.py
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import case, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query, Session
+
+from app import models
+from app.utils.lazy_imports import LazyModule
+
+# dialects whose INSERT supports ON CONFLICT DO UPDATE (the dialect packages load on first use)
+UPSERT_DIALECTS = {
+    "postgresql": LazyModule("sqlalchemy.dialects.postgresql"),
+    "sqlite": LazyModule("sqlalchemy.dialects.sqlite"),
+}
+
+
+def today_start() -> datetime:
+    # Attendance.date is a DateTime; "today" records are stored at midnight
+    return datetime.combine(date.today(), datetime.min.time())
+
+
+def upsert_statement(dialect_name: str, records: Dict[int, Tuple[int, str]], day: datetime):
+    """
+    INSERT .. ON CONFLICT (student_id, date) DO UPDATE for `records`, or None when the
+    dialect has no upsert. Shared by the sync and async endpoints.
+    """
+    dialect = UPSERT_DIALECTS.get(dialect_name)
+    if dialect is None:
+        return None
+    stmt = dialect.insert(models.Attendance).values([
+        {"student_id": sid, "teacher_id": tid, "date": day, "status": status}
+        for sid, (tid, status) in records.items()
+    ])
+    return stmt.on_conflict_do_update(
+        index_elements=["student_id", "date"],
+        set_={"status": stmt.excluded.status, "teacher_id": stmt.excluded.teacher_id},
+    )
+
+
+def upsert_attendance(db: Session, records: Dict[int, Tuple[int, str]], today: Optional[datetime] = None) -> int:
+    """
+    Set today's status for many students and commit. `records` maps
+    student id -> (teacher id, status). On PostgreSQL/SQLite this is a single
+    INSERT .. ON CONFLICT (student_id, date) DO UPDATE statement.
+    """
+    if not records:
+        return 0
+    today = today or today_start()
+    stmt = upsert_statement(db.get_bind().dialect.name, records, today)
+    if stmt is not None:
+        db.execute(stmt)
+    else:
+        existing = (
+            db.query(models.Attendance)
+            .filter(models.Attendance.student_id.in_(records), models.Attendance.date == today)
+            .all()
+        )
+        for attendance in existing:
+            attendance.teacher_id, attendance.status = records[attendance.student_id]
+        seen = {a.student_id for a in existing}
+        db.add_all(
+            models.Attendance(student_id=sid, teacher_id=tid, date=today, status=status)
+            for sid, (tid, status) in records.items()
+            if sid not in seen
+        )
+    db.commit()
+    return len(records)
+
+
+async def upsert_attendance_async(db: AsyncSession, records: Dict[int, Tuple[int, str]], today: datetime) -> int:
+    """
+    upsert_attendance for the async endpoints; `today` is a datetime (asyncpg is strict about types).
+    """
+    if not records:
+        return 0
+    stmt = upsert_statement(db.bind.dialect.name, records, today)
+    if stmt is not None:
+        await db.execute(stmt)
+    else:
+        existing = (
+            await db.execute(
+                select(models.Attendance).where(
+                    models.Attendance.student_id.in_(records), models.Attendance.date == today
+                )
+            )
+        ).scalars().all()
+        for attendance in existing:
+            attendance.teacher_id, attendance.status = records[attendance.student_id]
+        seen = {a.student_id for a in existing}
+        db.add_all(
+            models.Attendance(student_id=sid, teacher_id=tid, date=today, status=status)
+            for sid, (tid, status) in records.items()
+            if sid not in seen
+        )
+    await db.commit()
+    return len(records)
+
+
+def mark_present(db: Session, teacher_by_student: Dict[int, int]) -> int:
+    """
+    Mark students present for today in one transaction. `teacher_by_student` maps
+    student id -> teacher id.
+    """
+    return upsert_attendance(db, {sid: (tid, "Present") for sid, tid in teacher_by_student.items()})
+
+
+def attendance_totals_query(db: Session, key, *criteria) -> Query:
+    """
+    (key, total, present, absent, first, last) rows over Attendance joined to Student, grouped
+    by `key` (e.g. Student.id or Student.class_id), so reports need one query instead of one per
+    student. first/last are the earliest and latest record, for the expected days
+    (app/utils/school_calendar.py). Callers add their own date filters before iterating.
+    """
+    status = func.lower(models.Attendance.status)
+    return (
+        db.query(
+            key,
+            func.count(models.Attendance.id),
+            func.sum(case((status == "present", 1), else_=0)),
+            func.sum(case((status == "absent", 1), else_=0)),
+            func.min(models.Attendance.date),
+            func.max(models.Attendance.date),
+        )
+        .join(models.Student, models.Attendance.student_id == models.Student.id)
+        .filter(*criteria)
+        .group_by(key)
+    )
+
+
+def unmarked_today_query(db: Session, *criteria) -> Query:
+    """
+    (id, name, roll_no, class_id) of the students matching `criteria` with no attendance record
+    today. NOT EXISTS runs as an anti-join on uq_attendance_student_date (PostgreSQL and SQLite),
+    so this reads today's index entries, not the attendance history.
+    """
+    today = today_start()
+    marked = exists().where(
+        models.Attendance.student_id == models.Student.id,
+        models.Attendance.date >= today,
+        models.Attendance.date < today + timedelta(days=1),
+    )
+    return (
+        db.query(models.Student.id, models.Student.name, models.Student.roll_no, models.Student.class_id)
+        .filter(*criteria, ~marked)
+        .order_by(models.Student.class_id, models.Student.id)
+    )
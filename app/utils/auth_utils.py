@@ -1,13 +1,16 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app import database, models
+from app.utils.lazy_imports import LazyModule
 
 
 # ==============================
@@ -17,8 +20,8 @@ SECRET_KEY = "your_secret_key_here"   # 🔒 change this in production!
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-# password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# password hashing; passlib is imported with the first login / new account
+passlib_context = LazyModule("passlib.context")
 
 # Simple Bearer scheme (not OAuth2)
 bearer_scheme = HTTPBearer()
@@ -27,12 +30,17 @@ bearer_scheme = HTTPBearer()
 # ==============================
 # Password utils
 # ==============================
+@lru_cache(maxsize=None)
+def pwd_context():
+    return passlib_context.CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 
 # ==============================
@@ -48,29 +56,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 # ==============================
 # DB session
 # ==============================
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Same callable as database.get_db, so FastAPI shares one session per request between the
+# auth dependency and the endpoint (two separate sessions deadlock the pool under load).
+get_db = database.get_db
 
 
 # ==============================
 # Current user utils
 # ==============================
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    db: Session = Depends(get_db)
-):
-    token = credentials.credentials  # extract Bearer token
-
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+ROLE_MODELS = {
+    "superadmin": models.SuperAdmin,
+    "administrator": models.Administrator,
+    "teacher": models.Teacher,
+}
+
+
+def decode_access_token(token: str):
+    """
+    Return (user_id, role) from a JWT, or raise 401.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: int = payload.get("sub")
@@ -79,6 +89,14 @@ def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    return user_id, role
+
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    db: Session = Depends(get_db)
+):
+    user_id, role = decode_access_token(credentials.credentials)  # extract Bearer token
 
     # find user by role
     if role == "superadmin":
@@ -96,6 +114,24 @@ def get_current_user(
     return {"id": user.id, "role": role, "name": user.name, "email": user.email}
 
 
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    """
+    Same as get_current_user, for the async endpoints (USE_ASYNC_DB=1).
+    """
+    user_id, role = decode_access_token(credentials.credentials)
+    model = ROLE_MODELS.get(role)
+    if model is None:
+        raise credentials_exception
+    user = (await db.execute(select(model).where(model.id == int(user_id)))).scalars().first()
+    if user is None:
+        raise credentials_exception
+
+    return {"id": user.id, "role": role, "name": user.name, "email": user.email}
+
+
 # ==============================
 # Role checker
 # ==============================
@@ -0,0 +1,374 @@
+# app/utils/change_bus.py
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import select
+import socket
+import tempfile
+import threading
+import uuid
+from collections import deque
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+# Change notifications between uvicorn workers. Write paths publish compact (entity, school_id, id)
+# events after they commit; subscribers in every worker (live attendance streams, the embedding
+# cache) get them in batches. Transport: PostgreSQL LISTEN/NOTIFY, or Unix datagram sockets in a
+# shared directory when the database is SQLite (all workers on one host).
+CHANGE_BUS = os.getenv("CHANGE_BUS", "auto")  # auto | postgres | local | off (this worker only)
+# LISTEN needs a session-level connection; point this past PgBouncer in transaction mode
+CHANGE_BUS_URL = os.getenv("CHANGE_BUS_URL")
+CHANGE_BUS_CHANNEL = os.getenv("CHANGE_BUS_CHANNEL", "sih_changes")
+CHANGE_BUS_DIR = os.getenv("CHANGE_BUS_DIR")  # local transport; default is keyed by DATABASE_URL
+CHANGE_BUS_BATCH_MS = float(os.getenv("CHANGE_BUS_BATCH_MS", "50"))  # how long publishes are gathered
+CHANGE_BUS_MAX_BACKOFF = 30.0  # seconds between reconnect attempts, at most
+CHANGE_BUS_OUTBOX = 100_000  # changes waiting to be sent; older ones are dropped when full
+MAX_PAYLOAD = 7900  # NOTIFY payloads must stay under 8000 bytes
+
+
+class Change(NamedTuple):
+    entity: str  # "attendance", "student", "class", "teacher", "school", "administrator", "superadmin"
+    school_id: Optional[int]
+    id: Optional[int]  # None: several rows of this entity in the school (bulk uploads)
+
+
+class Subscriber(NamedTuple):
+    callback: Callable[[List[Change]], None]
+    entities: Optional[frozenset]
+    remote_only: bool
+    on_resync: Optional[Callable[[], None]]
+
+
+def encode(worker_id: str, changes: List[Change]) -> Iterable[Tuple[str, int]]:
+    """
+    (payload, number of changes) with JSON payloads of at most MAX_PAYLOAD bytes:
+    {"w": sender, "c": [[entity, school_id, id], ...]}.
+    """
+    head = f'{{"w":"{worker_id}","c":['
+    parts = []
+    size = len(head) + 2
+    for change in changes:
+        part = json.dumps(list(change), separators=(",", ":"))
+        if parts and size + len(part) + 1 > MAX_PAYLOAD:
+            yield head + ",".join(parts) + "]}", len(parts)
+            parts, size = [], len(head) + 2
+        parts.append(part)
+        size += len(part) + 1
+    if parts:
+        yield head + ",".join(parts) + "]}", len(parts)
+
+
+# ---------------------------
+# TRANSPORTS
+# ---------------------------
+class PostgresTransport:
+    """
+    pg_notify() on one autocommit connection, LISTEN on another. Both are plain psycopg2
+    connections outside the engine's pool, so they don't count toward pool size or query budgets.
+    """
+
+    def __init__(self, url: str, channel: str = CHANGE_BUS_CHANNEL):
+        if not re.fullmatch(r"[a-z_][a-z0-9_]*", channel):
+            raise ValueError(f"CHANGE_BUS_CHANNEL must be a lowercase identifier, got {channel!r}")
+        self.dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.channel = channel
+        self._send_conn = None
+
+    def _connect(self):
+        import psycopg2
+
+        # TCP keepalives, so a listener on a dead server notices and reconnects
+        conn = psycopg2.connect(self.dsn, keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+        conn.autocommit = True
+        return conn
+
+    def send(self, payload: str):
+        if self._send_conn is None or self._send_conn.closed:
+            self._send_conn = self._connect()
+        try:
+            with self._send_conn.cursor() as cur:
+                cur.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+        except Exception:
+            self._send_conn.close()
+            self._send_conn = None
+            raise
+
+    def listen(self, on_payloads, on_connected, stop: threading.Event):
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {self.channel}")
+            on_connected()
+            while not stop.is_set():
+                if not select.select([conn], [], [], 1.0)[0]:
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    payloads = [n.payload for n in conn.notifies]
+                    conn.notifies.clear()
+                    on_payloads(payloads)
+        finally:
+            conn.close()
+
+    def close(self):
+        if self._send_conn is not None:
+            self._send_conn.close()
+
+
+class LocalSocketTransport:
+    """
+    One Unix datagram socket per worker in `directory`; sending writes to every other socket
+    there. Sockets left behind by dead workers are removed when a send is refused.
+    """
+
+    def __init__(self, directory: str, worker_id: str):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{worker_id}.sock")
+        self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._send_sock.settimeout(1.0)  # a worker that stops reading must not stall the sender
+
+    def send(self, payload: str):
+        data = payload.encode()
+        for path in glob.glob(os.path.join(self.directory, "*.sock")):
+            if path == self.path:
+                continue
+            try:
+                self._send_sock.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            except OSError as e:  # full receive buffer (timeout) and the like: that worker misses it
+                logger.warning("Change bus: could not deliver to %s: %s", path, e)
+
+    def listen(self, on_payloads, on_connected, stop: threading.Event):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            sock.bind(self.path)
+            sock.settimeout(1.0)
+            on_connected()
+            while not stop.is_set():
+                try:
+                    payloads = [sock.recv(65536).decode()]
+                except socket.timeout:
+                    if not os.path.exists(self.path):
+                        raise ConnectionError("socket file was removed")
+                    continue
+                sock.setblocking(False)
+                while True:  # everything already queued goes out as one batch
+                    try:
+                        payloads.append(sock.recv(65536).decode())
+                    except BlockingIOError:
+                        break
+                sock.settimeout(1.0)
+                on_payloads(payloads)
+        finally:
+            sock.close()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        self._send_sock.close()
+
+
+def default_transport(worker_id: str):
+    """
+    Transport for CHANGE_BUS and the database URL, or None when the bus stays in-process.
+    """
+    from app.database import DATABASE_URL
+
+    url = CHANGE_BUS_URL or DATABASE_URL
+    mode = CHANGE_BUS
+    if mode == "auto":
+        mode = "postgres" if make_url(url).get_backend_name() == "postgresql" else "local"
+    if mode == "postgres":
+        return PostgresTransport(url)
+    if mode == "local":
+        directory = CHANGE_BUS_DIR or os.path.join(
+            tempfile.gettempdir(), "sih-changes-" + hashlib.sha1(DATABASE_URL.encode()).hexdigest()[:10]
+        )
+        return LocalSocketTransport(directory, worker_id)
+    return None
+
+
+# ---------------------------
+# BUS
+# ---------------------------
+class ChangeBus:
+    """
+    publish() hands changes to this worker's subscribers straight away (on the caller's
+    thread) and queues them for the other workers; a sender thread batches the queue every
+    CHANGE_BUS_BATCH_MS, a listener thread delivers the other workers' batches. Callbacks must
+    be quick and thread-safe.
+
+    After the listener reconnects, changes published in between are lost, so subscribers get
+    on_resync() and should drop what they cached.
+    """
+
+    def __init__(self, batch_ms: float = CHANGE_BUS_BATCH_MS):
+        self.batch_seconds = batch_ms / 1000
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.subscribers: List[Subscriber] = []
+        self.transport = None
+        self.connected = False
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self._outbox = deque(maxlen=CHANGE_BUS_OUTBOX)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def subscribe(self, callback: Callable[[List[Change]], None], entities: Optional[Iterable[str]] = None,
+                  remote_only: bool = False, on_resync: Optional[Callable[[], None]] = None):
+        """
+        Call `callback(changes)` for each batch of changes to `entities` (all when None).
+        `remote_only` skips this worker's own changes, for caches its write paths already update.
+        """
+        self.subscribers.append(Subscriber(callback, frozenset(entities) if entities else None, remote_only, on_resync))
+
+    def publish(self, entity: str, school_id: Optional[int], *ids: Optional[int]):
+        """
+        Call after committing. One change per id; no ids means "several in this school".
+        """
+        if ids:
+            changes = [Change(entity, school_id, i) for i in dict.fromkeys(ids) if i is not None]
+        else:
+            changes = [Change(entity, school_id, None)]
+        if not changes:
+            return
+        self._dispatch(changes, remote=False)
+        if self.transport is not None:
+            if len(self._outbox) + len(changes) > CHANGE_BUS_OUTBOX:
+                self.dropped += len(self._outbox) + len(changes) - CHANGE_BUS_OUTBOX
+            self._outbox.extend(changes)
+            self._wakeup.set()
+
+    def _dispatch(self, changes: List[Change], remote: bool):
+        for subscriber in self.subscribers:
+            if subscriber.remote_only and not remote:
+                continue
+            selected = changes if subscriber.entities is None else [c for c in changes if c.entity in subscriber.entities]
+            if selected:
+                try:
+                    subscriber.callback(selected)
+                except Exception:
+                    logger.exception("Change bus subscriber %r failed", subscriber.callback)
+
+    # ---------------------------
+    # Threads
+    # ---------------------------
+    def start(self, transport=None):
+        """
+        Connect to the other workers (app startup). Without it changes stay in this worker.
+        """
+        if self.transport is not None:
+            return
+        self.transport = transport or default_transport(self.worker_id)
+        if self.transport is None:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._send_loop, name="change-bus-send", daemon=True),
+            threading.Thread(target=self._listen_loop, name="change-bus-listen", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        if self.transport is None:
+            return
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self.transport.close()
+        self.transport = None
+        self.connected = False
+
+    def _send_loop(self):
+        while not self._stop.is_set():
+            self._wakeup.wait()
+            self._stop.wait(self.batch_seconds)  # gather what else is published meanwhile
+            self._wakeup.clear()
+            changes = []
+            while self._outbox:
+                changes.append(self._outbox.popleft())
+            for payload, count in encode(self.worker_id, changes):
+                try:
+                    self.transport.send(payload)
+                    self.sent += 1
+                except Exception as e:
+                    # other workers miss these; their caches still expire on their own TTLs
+                    self.dropped += count
+                    logger.warning("Change bus publish failed: %s", e)
+
+    def _listen_loop(self):
+        backoff = 0.5
+        first = True
+
+        def on_connected():
+            nonlocal backoff, first
+            self.connected, backoff = True, 0.5
+            if not first:
+                self.reconnects += 1
+                for subscriber in self.subscribers:
+                    if subscriber.on_resync is not None:
+                        try:
+                            subscriber.on_resync()
+                        except Exception:
+                            logger.exception("Change bus resync %r failed", subscriber.on_resync)
+            first = False
+
+        while not self._stop.is_set():
+            try:
+                self.transport.listen(self._received, on_connected, self._stop)
+            except Exception as e:
+                logger.warning("Change bus listener disconnected (retrying in %.1fs): %s", backoff, e)
+            self.connected = False
+            if self._stop.wait(backoff):
+                break
+            backoff = min(backoff * 2, CHANGE_BUS_MAX_BACKOFF)
+
+    def _received(self, payloads: List[str]):
+        changes = []
+        for payload in payloads:
+            try:
+                message = json.loads(payload)
+            except ValueError:
+                continue
+            if message.get("w") == self.worker_id:
+                continue  # our own NOTIFY coming back
+            changes += [Change(*c) for c in message.get("c", ())]
+        if changes:
+            self.received += len(changes)
+            self._dispatch(changes, remote=True)
+
+    def stats(self) -> dict:
+        return {
+            "transport": type(self.transport).__name__ if self.transport else None,
+            "connected": self.connected,
+            "worker_id": self.worker_id,
+            "subscribers": len(self.subscribers),
+            "queued": len(self._outbox),
+            "messages_sent": self.sent,
+            "changes_received": self.received,
+            "changes_dropped": self.dropped,
+            "reconnects": self.reconnects,
+        }
+
+
+change_bus = ChangeBus()
@@ -0,0 +1,151 @@
+# app/utils/compression.py
+import os
+import zlib
+from typing import Optional
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+
+# Negotiated response compression (brotli preferred, then gzip). JSON lists and CSV exports are
+# mostly repeated keys and status strings and shrink 10-20x; xlsx is already a zip and is
+# passed through. COMPRESSION=0 removes the middleware (e.g. when a proxy compresses instead).
+COMPRESSION = os.getenv("COMPRESSION", "1") == "1"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes; smaller bodies go out as is
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))  # 1-9
+# 0-11; 4 compresses better than gzip -6 at similar speed, 11 is far too slow per request
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# already compressed, or must reach the client event by event
+SKIP_MEDIA_TYPES = {
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/pdf",
+    "text/event-stream",
+}
+SKIP_MEDIA_PREFIXES = ("image/", "video/", "audio/")
+
+
+# ---------------------------
+# NEGOTIATION
+# ---------------------------
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    "br" or "gzip" from an Accept-Encoding header (q-values honoured, br wins ties), or None.
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in ("br", "gzip"):
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    media_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    return media_type not in SKIP_MEDIA_TYPES and not media_type.startswith(SKIP_MEDIA_PREFIXES)
+
+
+# ---------------------------
+# COMPRESSORS
+# ---------------------------
+class GzipCompressor:
+    def __init__(self, level: int = GZIP_LEVEL):
+        self._zlib = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        # sync flush: every streamed chunk reaches the client now instead of sitting in the window
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int = BROTLI_QUALITY):
+        self._brotli = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._brotli.process(data) + (self._brotli.finish() if final else self._brotli.flush())
+
+
+COMPRESSORS = {"br": BrotliCompressor, "gzip": GzipCompressor}
+
+
+# ---------------------------
+# ASGI MIDDLEWARE
+# ---------------------------
+class CompressionMiddleware:
+    """
+    Pure ASGI, so streamed responses (CSV exports) are compressed chunk by chunk as they are
+    produced, never buffered. The first body message decides: a complete body under
+    `minimum_size` or a non-compressible media type is sent untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message  # held until the first body chunk shows the size
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if not is_compressible(headers) or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = COMPRESSORS[encoding]()
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["content-length"]
+                if not more_body:
+                    body = compressor.compress(body, final=True)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start_message)
+
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body, final=not more_body),
+                "more_body": more_body,
+            })
+
+        await self.app(scope, receive, send_compressed)
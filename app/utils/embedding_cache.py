@@ -0,0 +1,247 @@
+# app/utils/embedding_cache.py
+from __future__ import annotations
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.change_bus import change_bus
+from app.utils.lazy_imports import LazyModule
+from app.utils.face_embeddings import FACE_EMBEDDING_DIM, embedding_matrix, normalize_rows, quantize_rows
+
+np = LazyModule("numpy")
+
+# Per-class, pre-normalised float32 embedding matrices, so recognition doesn't re-read and
+# re-decode every student's embedding on each request.
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Other workers hear about an invalidation through the change bus ("class" changes); the TTL
+# is the fallback for notifications lost while the bus was down (CHANGE_BUS=off).
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "300"))
+# Optional local directory for memory-mapped .npy copies shared by every worker on the host;
+# a copy older than EMBEDDING_CACHE_TTL is rebuilt from the database rather than reloaded
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+# Hold int8 codes instead of float32 (4x less memory); matching re-ranks the top candidates
+# against exact vectors from the mmap'd .npy when EMBEDDING_CACHE_DIR is set, else from the DB.
+EMBEDDING_CACHE_QUANTIZE = os.getenv("EMBEDDING_CACHE_QUANTIZE", "0") == "1"
+
+
+class EmbeddingCache:
+    """
+    LRU of class_id -> (student_ids, normalised matrix or QuantizedMatrix), bounded by total bytes.
+    Call invalidate() after committing any change to a student's embedding or class.
+    """
+
+    def __init__(self, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES, ttl: float = EMBEDDING_CACHE_TTL,
+                 directory: Optional[str] = EMBEDDING_CACHE_DIR, quantize: bool = EMBEDDING_CACHE_QUANTIZE):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = directory
+        self.quantize = quantize
+        self.entries = OrderedDict()  # class_id -> (ids, matrix, loaded_at, file_mtime)
+        # bumped by invalidate(); a load that raced with an invalidation isn't stored
+        self.generations = {}
+        # .npy copies written before this (time.time_ns()) are ignored: set by clear(), after
+        # which any of them may predate an invalidation this worker never heard about
+        self.files_after = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    # ---------------------------
+    # Files (EMBEDDING_CACHE_DIR)
+    # ---------------------------
+    def _paths(self, class_id: int):
+        base = os.path.join(self.directory, f"class_{class_id}")
+        return base + ".ids.npy", base + ".npy"
+
+    def _file_mtime(self, class_id: int) -> Optional[int]:
+        try:
+            return os.stat(self._paths(class_id)[1]).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _file_usable(self, mtime: Optional[int]) -> bool:
+        # the file's age, not when this worker loaded it, bounds how stale a shared copy can be
+        return mtime is not None and mtime >= self.files_after and time.time_ns() - mtime < self.ttl * 1e9
+
+    def _read_file(self, class_id: int):
+        ids_path, matrix_path = self._paths(class_id)
+        try:
+            mtime = os.stat(matrix_path).st_mtime_ns
+            matrix = np.load(matrix_path, mmap_mode="r")
+            ids = np.load(ids_path).tolist()
+        except (FileNotFoundError, ValueError):
+            return None
+        if len(ids) != matrix.shape[0]:
+            return None  # caught mid-rewrite by another worker
+        return ids, matrix, mtime
+
+    def _write_file(self, class_id: int, ids: List[int], matrix: np.ndarray) -> Optional[int]:
+        ids_path, matrix_path = self._paths(class_id)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        # ids first, then the matrix; readers check both have the same length
+        with open(ids_path + suffix, "wb") as f:
+            np.save(f, np.asarray(ids, dtype=np.int64))
+        os.replace(ids_path + suffix, ids_path)
+        with open(matrix_path + suffix, "wb") as f:
+            np.save(f, matrix)
+        os.replace(matrix_path + suffix, matrix_path)
+        return self._file_mtime(class_id)
+
+    # ---------------------------
+    # LRU
+    # ---------------------------
+    def _pop(self, class_id: int):
+        entry = self.entries.pop(class_id, None)
+        if entry:
+            self.bytes -= entry[1].nbytes
+
+    def get(self, class_id: int) -> Optional[Tuple[List[int], np.ndarray]]:
+        mtime = self._file_mtime(class_id) if self.directory else None
+        with self._lock:
+            entry = self.entries.get(class_id)
+            if entry:
+                ids, matrix, loaded_at, file_mtime = entry
+                if self.directory:
+                    fresh = mtime == file_mtime and self._file_usable(mtime)
+                else:
+                    fresh = time.monotonic() - loaded_at < self.ttl
+                if fresh:
+                    self.entries.move_to_end(class_id)
+                    self.hits += 1
+                    return ids, matrix
+                self._pop(class_id)
+        if self.directory and self._file_usable(mtime):
+            loaded = self._read_file(class_id)
+            if loaded and self._file_usable(loaded[2]):
+                gallery = self._store(class_id, *loaded)
+                with self._lock:
+                    self.hits += 1
+                return loaded[0], gallery
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store(self, class_id: int, ids: List[int], matrix: np.ndarray, file_mtime: Optional[int]):
+        if self.quantize:
+            # keep a memory-mapped float matrix around for re-ranking; it costs no private memory
+            matrix = quantize_rows(matrix, floats=matrix if isinstance(matrix, np.memmap) else None)
+        with self._lock:
+            self._pop(class_id)
+            if matrix.nbytes > self.max_bytes:
+                return matrix
+            self.entries[class_id] = (ids, matrix, time.monotonic(), file_mtime)
+            self.bytes += matrix.nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, old, _, _) = self.entries.popitem(last=False)
+                self.bytes -= old.nbytes
+                self.evictions += 1
+        return matrix
+
+    def generation(self, class_id: int) -> int:
+        return self.generations.get(class_id, 0)
+
+    def put(self, class_id: int, ids: List[int], matrix: np.ndarray, generation: int) -> Tuple[List[int], np.ndarray]:
+        if generation != self.generation(class_id):
+            return ids, matrix
+        file_mtime = None
+        if self.directory:
+            file_mtime = self._write_file(class_id, ids, matrix)
+            loaded = self._read_file(class_id)
+            if loaded:
+                ids, matrix, file_mtime = loaded  # keep the shared mapping, not a private copy
+        return ids, self._store(class_id, ids, matrix, file_mtime)
+
+    def invalidate(self, *class_ids: Optional[int]):
+        for class_id in {c for c in class_ids if c is not None}:
+            with self._lock:
+                self.generations[class_id] = self.generation(class_id) + 1
+                self._pop(class_id)
+            if self.directory:
+                for path in self._paths(class_id):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    def clear(self):
+        """
+        Drop every in-memory entry and stop trusting the .npy files written so far; each class
+        is rebuilt from the database (which rewrites its file) on next use.
+        """
+        with self._lock:
+            self.files_after = time.time_ns()
+            for class_id in list(self.entries):
+                self.generations[class_id] = self.generation(class_id) + 1
+                self._pop(class_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "classes": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "mmap_dir": self.directory,
+                "quantized": self.quantize,
+            }
+
+
+embedding_cache = EmbeddingCache()
+# roster or embedding changes made by other workers; this worker's write paths invalidate directly
+change_bus.subscribe(
+    lambda changes: embedding_cache.invalidate(*(c.id for c in changes)),
+    entities=["class"], remote_only=True, on_resync=embedding_cache.clear,
+)
+
+
+def get_class_gallery(db: Session, class_id: int) -> Tuple[List[int], np.ndarray]:
+    """
+    (student_ids, row-normalised matrix) of every enrolled student in a class, cached.
+    The matrix is a QuantizedMatrix when EMBEDDING_CACHE_QUANTIZE=1.
+    """
+    cached = embedding_cache.get(class_id)
+    if cached:
+        return cached
+    generation = embedding_cache.generation(class_id)
+    rows = (
+        db.query(models.Student.id, models.Student.face_embedding, models.Student.face_embedding_dtype)
+        .filter(
+            models.Student.class_id == class_id,
+            models.Student.face_embedding.isnot(None),
+            models.Student.face_embedding_dim == FACE_EMBEDDING_DIM,
+        )
+        .all()
+    )
+    ids, matrix = embedding_matrix(rows)
+    return embedding_cache.put(class_id, ids, normalize_rows(matrix), generation)
+
+
+def load_exact_rows(db: Session, student_ids: List[int]) -> np.ndarray:
+    """
+    Normalised float32 embeddings for the given students, in the given order (quantised re-rank).
+    """
+    rows = (
+        db.query(models.Student.id, models.Student.face_embedding, models.Student.face_embedding_dtype)
+        .filter(models.Student.id.in_(student_ids))
+        .all()
+    )
+    ids, matrix = embedding_matrix(rows)
+    position = {student_id: i for i, student_id in enumerate(ids)}
+    # a student un-enrolled since the gallery was cached scores 0 (zero row)
+    exact = np.zeros((len(student_ids), FACE_EMBEDDING_DIM), dtype=np.float32)
+    for i, student_id in enumerate(student_ids):
+        if student_id in position:
+            exact[i] = matrix[position[student_id]]
+    return normalize_rows(exact)
@@ -1,16 +1,25 @@
 # app/utils/excel_utils.py
+import csv
 import io
-from typing import List
-from openpyxl import Workbook, load_workbook
+from typing import Iterable, Iterator, List
+from fastapi import UploadFile
 from fastapi.responses import StreamingResponse
 from app import schemas
+from app.utils.lazy_imports import LazyModule
+
+# openpyxl (and the numpy it pulls in) loads with the first Excel import/export
+openpyxl = LazyModule("openpyxl")
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv"
+CSV_CHUNK_SIZE = 64 * 1024  # flush csv output to the client in ~64KB chunks
 
 
 # ---------------------------
 # EXPORT HELPERS
 # ---------------------------
 def export_students_to_excel(students: List[dict]) -> StreamingResponse:
-    wb = Workbook()
+    wb = openpyxl.Workbook()
     ws = wb.active
     ws.title = "Students"
     ws.append(["ID", "Name", "Roll No", "Class"])
@@ -21,13 +30,13 @@ def export_students_to_excel(students: List[dict]) -> StreamingResponse:
     stream.seek(0)
     return StreamingResponse(
         stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        media_type=XLSX_MEDIA_TYPE,
         headers={"Content-Disposition": "attachment; filename=students.xlsx"},
     )
 
 
 def export_attendance_to_excel(attendance: List[dict]) -> StreamingResponse:
-    wb = Workbook()
+    wb = openpyxl.Workbook()
     ws = wb.active
     ws.title = "Attendance"
     ws.append(["Student Name", "Date", "Status"])
@@ -38,7 +47,7 @@ def export_attendance_to_excel(attendance: List[dict]) -> StreamingResponse:
     stream.seek(0)
     return StreamingResponse(
         stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        media_type=XLSX_MEDIA_TYPE,
         headers={"Content-Disposition": "attachment; filename=attendance.xlsx"},
     )
 
@@ -46,61 +55,106 @@ def export_attendance_to_excel(attendance: List[dict]) -> StreamingResponse:
 # ---------------------------
 # IMPORT HELPERS
 # ---------------------------
-def read_students_excel(file) -> List[schemas.StudentCreate]:
-    wb = load_workbook(file)
-    ws = wb.active
-    students = []
-    for row in ws.iter_rows(min_row=2, values_only=True):  # skip header
-        students.append(schemas.StudentCreate(
-            name=row[0],
-            roll_no=row[1],
-            class_id=row[2],
-        ))
-    return students
-
-
-def read_teachers_excel(file) -> List[schemas.TeacherCreate]:
-    wb = load_workbook(file)
-    ws = wb.active
-    teachers = []
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        teachers.append(schemas.TeacherCreate(
-            name=row[0],
-            email=row[1],
-            subject=row[2],
-            school_id=row[3],
-        ))
-    return teachers
-
-
-def read_administrators_excel(file) -> List[schemas.AdministratorCreate]:
-    wb = load_workbook(file)
-    ws = wb.active
-    admins = []
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        admins.append(schemas.AdministratorCreate(
-            name=row[0],
-            email=row[1],
-            school_id=row[2],
-        ))
-    return admins
+# Row -> schema mapping, shared by the Excel and CSV readers so both formats
+# accept the same columns and go through the same validation.
+def student_from_row(row) -> schemas.StudentImport:
+    return schemas.StudentImport(
+        id=row[0],
+        name=row[1],
+        roll_no=row[2],
+    )
+
+
+def teacher_from_row(row) -> schemas.TeacherImport:
+    return schemas.TeacherImport(
+        name=row[0],
+        email=row[1],
+        password=row[2],
+    )
+
+
+def class_from_row(row) -> schemas.ClassImport:
+    return schemas.ClassImport(
+        name=row[0],
+        teacher_id=row[1],
+    )
 
-# app/utils/excel_utils.py
 
-def read_classes_excel(file) -> List[schemas.ClassCreate]:
-    wb = load_workbook(file)
+def _excel_rows(file):
+    wb = openpyxl.load_workbook(file, read_only=True)
     ws = wb.active
-    classes = []
-    for row in ws.iter_rows(min_row=2, values_only=True):  # skip header
-        classes.append(schemas.ClassCreate(
-            name=row[0],
-            teacher_id=row[1],
-        ))
-    return classes
+    rows = ws.iter_rows(min_row=2, values_only=True)  # skip header
+    return (row for row in rows if any(cell is not None for cell in row))
+
+
+def iter_sheet_rows(file, is_csv: bool):
+    """
+    Raw data rows (header skipped) from an Excel or CSV file, for callers that map/validate rows themselves.
+    """
+    return _csv_rows(file) if is_csv else _excel_rows(file)
+
+
+def _csv_rows(file) -> Iterator[list]:
+    """
+    Yield data rows from a binary file object one at a time, without loading it into memory.
+    Empty cells become None so the row mapping behaves the same as for Excel.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        next(reader, None)  # skip header
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            yield [cell if cell != "" else None for cell in row]
+    finally:
+        if not file.closed:
+            text.detach()  # leave the underlying upload stream open
+
+
+def read_students_excel(file) -> List[schemas.StudentImport]:
+    return [student_from_row(row) for row in _excel_rows(file)]
+
+
+def read_teachers_excel(file) -> List[schemas.TeacherImport]:
+    return [teacher_from_row(row) for row in _excel_rows(file)]
+
+
+def read_classes_excel(file) -> List[schemas.ClassImport]:
+    return [class_from_row(row) for row in _excel_rows(file)]
+
+
+def read_students_csv(file) -> Iterator[schemas.StudentImport]:
+    return (student_from_row(row) for row in _csv_rows(file))
+
+
+def read_teachers_csv(file) -> Iterator[schemas.TeacherImport]:
+    return (teacher_from_row(row) for row in _csv_rows(file))
+
+
+def read_classes_csv(file) -> Iterator[schemas.ClassImport]:
+    return (class_from_row(row) for row in _csv_rows(file))
+
+
+def is_csv_upload(file: UploadFile) -> bool:
+    filename = (file.filename or "").lower()
+    return filename.endswith(".csv") or file.content_type in ("text/csv", "application/csv")
+
+
+def read_students_upload(file: UploadFile):
+    return read_students_csv(file.file) if is_csv_upload(file) else read_students_excel(file.file)
+
+
+def read_teachers_upload(file: UploadFile):
+    return read_teachers_csv(file.file) if is_csv_upload(file) else read_teachers_excel(file.file)
+
+
+def read_classes_upload(file: UploadFile):
+    return read_classes_csv(file.file) if is_csv_upload(file) else read_classes_excel(file.file)
 
 
 def generate_attendance_excel(attendance: List[dict]) -> io.BytesIO:
-    wb = Workbook()
+    wb = openpyxl.Workbook()
     ws = wb.active
     ws.title = "Attendance"
     ws.append(["ID", "Student ID", "Teacher ID", "Status", "Date"])
@@ -115,4 +169,50 @@ def generate_attendance_excel(attendance: List[dict]) -> io.BytesIO:
     stream = io.BytesIO()
     wb.save(stream)
     stream.seek(0)
-    return stream
\ No newline at end of file
+    return stream
+
+
+# ---------------------------
+# CSV EXPORT HELPERS (streamed)
+# ---------------------------
+def iter_csv(header: List[str], rows: Iterable[Iterable]) -> Iterator[bytes]:
+    """
+    Encode rows as CSV and yield them in CSV_CHUNK_SIZE pieces as they are produced.
+    Rows read from the db should come from app.database.stream_rows, which owns its session.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= CSV_CHUNK_SIZE:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def stream_csv(header: List[str], rows: Iterable[Iterable], filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        iter_csv(header, rows),
+        media_type=CSV_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+def export_students_to_csv(students: Iterable[dict]) -> StreamingResponse:
+    rows = ([s.get("id"), s.get("name"), s.get("roll_no"), s.get("class_name")] for s in students)
+    return stream_csv(["ID", "Name", "Roll No", "Class"], rows, "students.csv")
+
+
+def export_attendance_to_csv(attendance: Iterable[dict]) -> StreamingResponse:
+    rows = ([a.get("student_name"), a.get("date"), a.get("status")] for a in attendance)
+    return stream_csv(["Student Name", "Date", "Status"], rows, "attendance.csv")
+
+
+def generate_attendance_csv(attendance: Iterable[dict]) -> Iterator[bytes]:
+    rows = (
+        [a.get("id"), a.get("student_id"), a.get("teacher_id"), a.get("status"), a.get("date")]
+        for a in attendance
+    )
+    return iter_csv(["ID", "Student ID", "Teacher ID", "Status", "Date"], rows)
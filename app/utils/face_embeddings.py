@@ -0,0 +1,356 @@
+# app/utils/face_embeddings.py
+from __future__ import annotations
+
+import io
+import os
+from typing import Iterable, Optional, Sequence
+
+from app.utils.lazy_imports import LazyModule
+
+np = LazyModule("numpy")
+
+# Embeddings are stored as raw little-endian bytes (students.face_embedding) with their
+# dimension, dtype and the model that produced them alongside. 512 float32 values are
+# 2 KB on disk versus ~10 KB of JSON text, and decode with np.frombuffer (no Python floats).
+FACE_EMBEDDING_DIM = int(os.getenv("FACE_EMBEDDING_DIM", "512"))
+FACE_EMBEDDING_DTYPE = os.getenv("FACE_EMBEDDING_DTYPE", "float32")  # or "float16" to halve storage again
+FACE_MODEL_VERSION = os.getenv("FACE_MODEL_VERSION", "default")
+
+DTYPES = {"float32": "<f4", "float16": "<f2"}
+
+
+def encode_embedding(values: Sequence[float], dtype: str = FACE_EMBEDDING_DTYPE) -> bytes:
+    """
+    Pack a vector into bytes. Raises ValueError on a wrong dimension or non-finite values.
+    """
+    vec = np.asarray(values, dtype=np.float32)
+    if vec.ndim != 1 or vec.shape[0] != FACE_EMBEDDING_DIM:
+        raise ValueError(f"face_embedding must have {FACE_EMBEDDING_DIM} values, got {vec.size}")
+    if not np.isfinite(vec).all():
+        raise ValueError("face_embedding contains NaN or infinite values")
+    return vec.astype(DTYPES[dtype]).tobytes()
+
+
+def decode_embedding(blob: bytes, dtype: str = FACE_EMBEDDING_DTYPE) -> np.ndarray:
+    """
+    Read-only float32 view over a stored embedding (float16 rows are widened).
+    """
+    vec = np.frombuffer(blob, dtype=DTYPES[dtype])
+    return vec if vec.dtype == np.float32 else vec.astype(np.float32)
+
+
+def stack_embeddings(blobs: Iterable[bytes], dtype: str = FACE_EMBEDDING_DTYPE, dim: int = FACE_EMBEDDING_DIM) -> np.ndarray:
+    """
+    (n, dim) float32 matrix from stored blobs: one join and one frombuffer for the whole batch.
+    """
+    buf = b"".join(blobs)
+    matrix = np.frombuffer(buf, dtype=DTYPES[dtype]).reshape(-1, dim)
+    return matrix if matrix.dtype == np.float32 else matrix.astype(np.float32)
+
+
+def set_student_embedding(student, values: Optional[Sequence[float]], model_version: Optional[str] = None):
+    """
+    Store (or clear, with None) a student's embedding together with its metadata.
+    A single vector replaces any enrolled samples.
+    """
+    if values is None:
+        for column in EMBEDDING_COLUMNS:
+            setattr(student, column, None)
+        return
+    encode_embedding(values)  # validates
+    for column, value in sample_columns(np.asarray(values, dtype=np.float32).reshape(1, -1), model_version).items():
+        setattr(student, column, value)
+
+
+# ---------------------------
+# MULTI-SAMPLE ENROLLMENT
+# ---------------------------
+# Every enrolled sample is kept (students.face_samples, n x dim in FACE_EMBEDDING_DTYPE);
+# face_embedding holds their normalised centroid, which is what matching uses.
+FACE_MAX_SAMPLES = int(os.getenv("FACE_MAX_SAMPLES", "20"))  # newest kept
+
+EMBEDDING_COLUMNS = (
+    "face_embedding",
+    "face_embedding_dim",
+    "face_embedding_dtype",
+    "face_embedding_model",
+    "face_samples",
+    "face_sample_count",
+)
+
+
+def centroid(samples: np.ndarray) -> np.ndarray:
+    """
+    Normalised mean of the normalised samples, so no single sample's scale dominates.
+    """
+    mean = normalize_rows(samples).mean(axis=0, keepdims=True)
+    return normalize_rows(mean)[0]
+
+
+def sample_columns(samples: np.ndarray, model_version: Optional[str] = None) -> dict:
+    """
+    Column values for a student enrolled with `samples` ((n, dim) float32).
+    """
+    samples = samples[-FACE_MAX_SAMPLES:]
+    dtype = DTYPES[FACE_EMBEDDING_DTYPE]
+    return {
+        "face_embedding": centroid(samples).astype(dtype).tobytes(),
+        "face_embedding_dim": FACE_EMBEDDING_DIM,
+        "face_embedding_dtype": FACE_EMBEDDING_DTYPE,
+        "face_embedding_model": model_version or FACE_MODEL_VERSION,
+        "face_samples": np.ascontiguousarray(samples, dtype=dtype).tobytes(),
+        "face_sample_count": len(samples),
+    }
+
+
+def read_samples_upload(data: bytes, is_npy: bool) -> np.ndarray:
+    """
+    float32 array from an uploaded .npy file or raw little-endian float32 bytes (rows of
+    FACE_EMBEDDING_DIM). Raises ValueError on anything malformed.
+    """
+    if is_npy:
+        array = np.load(io.BytesIO(data), allow_pickle=False)
+        if array.dtype.kind != "f":
+            raise ValueError("Expected a float array")
+        array = array.astype(np.float32, copy=False)
+    else:
+        if len(data) % (4 * FACE_EMBEDDING_DIM):
+            raise ValueError(f"Raw body must be float32 rows of {FACE_EMBEDDING_DIM} values")
+        array = np.frombuffer(data, dtype="<f4").reshape(-1, FACE_EMBEDDING_DIM)
+    if array.shape[-1] != FACE_EMBEDDING_DIM or array.ndim not in (2, 3) or not array.size:
+        raise ValueError(f"Expected (samples, {FACE_EMBEDDING_DIM}) or (students, samples, {FACE_EMBEDDING_DIM})")
+    if not np.isfinite(array).all():
+        raise ValueError("Samples contain NaN or infinite values")
+    return array
+
+
+# ---------------------------
+# MATCHING
+# ---------------------------
+# cosine similarity a probe needs with its best gallery embedding to count as a match
+FACE_MATCH_THRESHOLD = float(os.getenv("FACE_MATCH_THRESHOLD", "0.5"))
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalise each row (zero rows stay zero) into a new C-contiguous float32 array.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms)
+
+
+def embedding_matrix(rows) -> tuple:
+    """
+    (ids, (n, dim) float32 matrix) from (id, blob, dtype) rows. Rows are grouped by
+    dtype so each group is still decoded with a single frombuffer.
+    """
+    groups = {}
+    for row_id, blob, dtype in rows:
+        ids, blobs = groups.setdefault(dtype or FACE_EMBEDDING_DTYPE, ([], []))
+        ids.append(row_id)
+        blobs.append(blob)
+    if not groups:
+        return [], np.empty((0, FACE_EMBEDDING_DIM), dtype=np.float32)
+    all_ids = [i for ids, _ in groups.values() for i in ids]
+    matrix = np.concatenate([stack_embeddings(blobs, dtype) for dtype, (_, blobs) in groups.items()])
+    return all_ids, matrix
+
+
+# ---------------------------
+# INT8 QUANTISATION
+# ---------------------------
+# Symmetric per-vector int8: row ~= codes * scale. A quarter of the float32 memory; scores
+# are approximate, so the top candidates are re-ranked against the exact float vectors.
+QUANT_RERANK_K = int(os.getenv("QUANT_RERANK_K", "5"))
+QUANT_CHUNK_ROWS = 4096  # bounds the float32 scratch used by the kernel
+
+
+class QuantizedMatrix:
+    """
+    int8 codes + per-row float32 scales. `floats` optionally points at the exact
+    normalised rows (e.g. a memory-mapped .npy) for re-ranking.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray, floats: Optional[np.ndarray] = None):
+        self.codes = codes
+        self.scales = scales
+        self.floats = floats
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        # a memory-mapped `floats` lives in the shared page cache, not in this process
+        return self.codes.nbytes + self.scales.nbytes
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def dequantize(self, rows) -> np.ndarray:
+        return self.codes[rows].astype(np.float32) * self.scales[rows, None]
+
+
+def quantize_rows(matrix: np.ndarray, floats: Optional[np.ndarray] = None) -> QuantizedMatrix:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.empty(0, dtype=np.float32)
+    scales = scales.astype(np.float32)
+    safe = np.where(scales == 0, 1.0, scales)
+    codes = np.clip(np.rint(matrix / safe[:, None]), -127, 127).astype(np.int8)
+    return QuantizedMatrix(codes, scales, floats)
+
+
+def quantized_scores(gallery: QuantizedMatrix, probes: np.ndarray) -> np.ndarray:
+    """
+    Approximate (probes x gallery) inner products: each chunk of int8 codes is widened to
+    float32 for the BLAS multiply, then scaled per row.
+    """
+    n = len(gallery)
+    scores = np.empty((probes.shape[0], n), dtype=np.float32)
+    for start in range(0, n, QUANT_CHUNK_ROWS):
+        stop = min(start + QUANT_CHUNK_ROWS, n)
+        scores[:, start:stop] = probes @ gallery.codes[start:stop].astype(np.float32).T
+    scores *= gallery.scales
+    return scores
+
+
+def rerank(gallery: QuantizedMatrix, probes: np.ndarray, approx: np.ndarray, k: int = QUANT_RERANK_K, exact_rows=None):
+    """
+    Exact scores for each probe's top-k approximate candidates. Returns (best_index, best_score).
+    Exact rows come from `gallery.floats`, else `exact_rows(indices)`, else the dequantised codes.
+    """
+    k = min(k, approx.shape[1])
+    candidates = np.argpartition(-approx, k - 1, axis=1)[:, :k] if k < approx.shape[1] else \
+        np.broadcast_to(np.arange(approx.shape[1]), approx.shape)
+    unique, inverse = np.unique(candidates, return_inverse=True)
+    if gallery.floats is not None:
+        rows = np.asarray(gallery.floats[unique], dtype=np.float32)
+    elif exact_rows is not None:
+        rows = exact_rows(unique)
+    else:
+        rows = normalize_rows(gallery.dequantize(unique))
+    exact = np.einsum("pd,pkd->pk", probes, rows[inverse.reshape(candidates.shape)])
+    pick = exact.argmax(axis=1)
+    return candidates[np.arange(len(probes)), pick], exact[np.arange(len(probes)), pick]
+
+
+def match_probes(gallery, probes: np.ndarray, threshold: float = FACE_MATCH_THRESHOLD, exact_rows=None):
+    """
+    Best gallery row for every probe via one (probes x gallery) matrix multiply.
+    `gallery` is a row-normalised float matrix or a QuantizedMatrix (approximate scores,
+    then an exact re-rank of the top candidates). Returns (best_index, best_score, matched_mask).
+    """
+    if gallery.shape[0] == 0:
+        n = probes.shape[0]
+        return np.zeros(n, dtype=np.intp), np.zeros(n, dtype=np.float32), np.zeros(n, dtype=bool)
+    probes = normalize_rows(probes)
+    if isinstance(gallery, QuantizedMatrix):
+        best, best_scores = rerank(gallery, probes, quantized_scores(gallery, probes), exact_rows=exact_rows)
+    else:
+        scores = probes @ gallery.T
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(scores.shape[0]), best]
+    return best, best_scores, best_scores >= threshold
+
+
+# ---------------------------
+# FRAME ASSIGNMENT (one photo, many faces)
+# ---------------------------
+def similarity_matrix(gallery, probes: np.ndarray, exact_rows=None) -> np.ndarray:
+    """
+    Full (probes x gallery) cosine matrix. Quantised galleries are scored exactly here,
+    since an assignment needs every pair, not just each probe's top candidates.
+    """
+    probes = normalize_rows(probes)
+    if isinstance(gallery, QuantizedMatrix):
+        if gallery.floats is not None:
+            rows = np.asarray(gallery.floats, dtype=np.float32)
+        elif exact_rows is not None:
+            rows = exact_rows(np.arange(len(gallery)))
+        else:
+            rows = normalize_rows(gallery.dequantize(slice(None)))
+        return probes @ rows.T
+    return probes @ gallery.T
+
+
+def assign_greedy(scores: np.ndarray, threshold: float):
+    """
+    Highest-scoring pairs first, skipping probes/students already taken.
+    """
+    probe_idx, student_idx = np.nonzero(scores >= threshold)
+    order = np.argsort(-scores[probe_idx, student_idx], kind="stable")
+    used_probes, used_students, pairs = set(), set(), []
+    for p, s in zip(probe_idx[order].tolist(), student_idx[order].tolist()):
+        if p not in used_probes and s not in used_students:
+            used_probes.add(p)
+            used_students.add(s)
+            pairs.append((p, s))
+    return pairs
+
+
+def _hungarian_min(cost: np.ndarray) -> np.ndarray:
+    """
+    Minimum-cost assignment of every row of an (n, m) matrix, n <= m (shortest augmenting
+    paths with potentials, O(n^2 m)); returns the column for each row.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)  # p[j]: row (1-based) assigned to column j
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(candidates.argmin()) + 1
+            delta = candidates[j1 - 1]
+            visited = np.flatnonzero(used)
+            u[p[visited]] += delta
+            v[visited] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    rows = np.full(n, -1, dtype=np.int64)
+    assigned = np.flatnonzero(p[1:])
+    rows[p[1:][assigned] - 1] = assigned
+    return rows
+
+
+def assign_hungarian(scores: np.ndarray, threshold: float):
+    """
+    Assignment maximising the total score of above-threshold pairs.
+    """
+    # below-threshold pairs are worth nothing, so pairing them is the same as leaving both free
+    gain = np.where(scores >= threshold, scores, 0.0)
+    transposed = gain.shape[0] > gain.shape[1]
+    cols = _hungarian_min(-(gain.T if transposed else gain))
+    pairs = [(c, r) if transposed else (r, c) for r, c in enumerate(cols.tolist())]
+    return [(p, s) for p, s in pairs if scores[p, s] >= threshold]
+
+
+def assign_one_to_one(scores: np.ndarray, threshold: float, method: str = "greedy"):
+    """
+    (probe_index, gallery_index) pairs with every probe and every student used at most once.
+    """
+    if not scores.size:
+        return []
+    pairs = assign_hungarian(scores, threshold) if method == "hungarian" else assign_greedy(scores, threshold)
+    return sorted(pairs)
@@ -0,0 +1,345 @@
+# app/utils/import_jobs.py
+import os
+import uuid
+import itertools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.utils.auth_utils import get_password_hash
+from app.utils.change_bus import change_bus
+from app.utils.excel_utils import iter_sheet_rows, teacher_from_row, class_from_row, student_from_row
+
+logger = logging.getLogger(__name__)
+
+IMPORT_DIR = os.getenv("IMPORT_DIR", "uploads")
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+# a "running" job whose heartbeat is older than this is assumed to belong to a dead worker
+IMPORT_STALE_SECONDS = int(os.getenv("IMPORT_STALE_SECONDS", "600"))
+# a running job's heartbeat is refreshed this often, also while a batch is still being imported
+IMPORT_HEARTBEAT_SECONDS = float(os.getenv("IMPORT_HEARTBEAT_SECONDS", str(max(1, IMPORT_STALE_SECONDS // 10))))
+MAX_STORED_ERRORS = 100
+
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import")
+
+
+# ---------------------------
+# ROW IMPORTERS (background jobs; the class upload endpoint uses them directly)
+# ---------------------------
+def import_teacher_row(db: Session, school_id: int, t) -> bool:
+    if db.query(models.Teacher).filter(models.Teacher.email == t.email).first():
+        return False
+    db.add(models.Teacher(
+        name=t.name,
+        email=t.email,
+        password=get_password_hash(t.password),
+        school_id=school_id,
+    ))
+    return True
+
+
+def import_class_row(db: Session, school_id: int, c) -> bool:
+    db.add(models.Class(name=c.name, teacher_id=c.teacher_id, school_id=school_id))
+    return True
+
+
+def import_student_row(db: Session, school_id: int, s) -> bool:
+    db_student = db.query(models.Student).filter(models.Student.id == s.id).first()
+    if not db_student:
+        return False
+    # Only update if student belongs to admin's school
+    cls = db.query(models.Class).filter(models.Class.id == db_student.class_id).first()
+    if not cls or cls.school_id != school_id:
+        return False
+    db_student.name = s.name
+    db_student.roll_no = s.roll_no
+    return True
+
+
+# Batch versions: one lookup per IMPORT_BATCH_SIZE rows instead of one (or two) per row, for the
+# synchronous upload endpoints and the background jobs. Same rules as the row importers above.
+def import_teacher_rows(db: Session, school_id: int, rows) -> int:
+    count = 0
+    for batch in _batches(rows):
+        emails = {t.email for t in batch}
+        taken = {
+            email for (email,) in db.query(models.Teacher.email).filter(models.Teacher.email.in_(emails))
+        }
+        for t in batch:
+            if t.email in taken:
+                continue
+            taken.add(t.email)
+            db.add(models.Teacher(
+                name=t.name,
+                email=t.email,
+                password=get_password_hash(t.password),
+                school_id=school_id,
+            ))
+            count += 1
+    return count
+
+
+def import_class_rows(db: Session, school_id: int, rows) -> int:
+    count = 0
+    for c in rows:
+        count += import_class_row(db, school_id, c)
+    return count
+
+
+def import_student_rows(db: Session, school_id: int, rows) -> int:
+    count = 0
+    for batch in _batches(rows):
+        # Only update students belonging to the admin's school
+        students = {
+            s.id: s
+            for s in db.query(models.Student)
+            .join(models.Class, models.Student.class_id == models.Class.id)
+            .filter(models.Student.id.in_({s.id for s in batch}), models.Class.school_id == school_id)
+        }
+        for s in batch:
+            db_student = students.get(s.id)
+            if db_student is None:
+                continue
+            db_student.name = s.name
+            db_student.roll_no = s.roll_no
+            count += 1
+    return count
+
+
+def _batches(rows):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, IMPORT_BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+# kind -> (row mapper, batch importer, row importer); a batch that fails is retried row by row
+# to find and report the bad rows
+IMPORTERS = {
+    "teachers": (teacher_from_row, import_teacher_rows, import_teacher_row),
+    "classes": (class_from_row, import_class_rows, import_class_row),
+    "students": (student_from_row, import_student_rows, import_student_row),
+}
+# change bus entity per job kind
+IMPORT_ENTITIES = {"teachers": "teacher", "classes": "class", "students": "student"}
+
+
+# ---------------------------
+# UPLOAD FILES
+# ---------------------------
+def job_path(job: models.ImportJob) -> str:
+    ext = ".csv" if job.filename.lower().endswith(".csv") else ".xlsx"
+    return os.path.join(IMPORT_DIR, f"import_{job.id}{ext}")
+
+
+def write_chunk(job: models.ImportJob, offset: int, data: bytes) -> int:
+    """
+    Write `data` at `offset` of the job's upload file and return the new received size.
+    Re-sending an already received chunk simply overwrites it, which makes retries safe.
+    """
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    path = job_path(job)
+    mode = "r+b" if os.path.exists(path) else "wb"
+    with open(path, mode) as f:
+        f.seek(offset)
+        f.write(data)
+        f.truncate()
+    return offset + len(data)
+
+
+def rows_per_second(job: models.ImportJob):
+    if not job.started_at:
+        return None
+    end = job.finished_at or job.heartbeat_at or datetime.utcnow()
+    elapsed = (end - job.started_at).total_seconds()
+    return round(job.rows_processed / elapsed, 2) if elapsed > 0 else None
+
+
+# ---------------------------
+# BACKGROUND PROCESSING
+# ---------------------------
+def _claim(db: Session, job_id: int, owner: str) -> bool:
+    """
+    Atomically move a queued (or stale running) job to running under `owner`, so only one
+    worker processes it.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=IMPORT_STALE_SECONDS)
+    claimed = (
+        db.query(models.ImportJob)
+        .filter(
+            models.ImportJob.id == job_id,
+            or_(
+                models.ImportJob.status == "queued",
+                (models.ImportJob.status == "running") & (models.ImportJob.heartbeat_at < stale),
+            ),
+        )
+        .update({"status": "running", "heartbeat_at": now, "owner": owner}, synchronize_session=False)
+    )
+    db.commit()
+    return claimed == 1
+
+
+def _update_owned(db: Session, job_id: int, owner: str, values: dict) -> bool:
+    """
+    Update the job only while `owner` still holds it; False once another worker has taken over.
+    """
+    return db.query(models.ImportJob).filter(
+        models.ImportJob.id == job_id, models.ImportJob.owner == owner
+    ).update(values, synchronize_session=False) == 1
+
+
+class _Heartbeat(threading.Thread):
+    """
+    Refreshes a running job's heartbeat from its own session every IMPORT_HEARTBEAT_SECONDS,
+    so a batch that takes longer than IMPORT_STALE_SECONDS doesn't make a live job look stale.
+    """
+
+    def __init__(self, job_id: int, owner: str):
+        super().__init__(name=f"import-heartbeat-{job_id}", daemon=True)
+        self.job_id = job_id
+        self.owner = owner
+        self.lost = False  # another worker claimed the job
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(IMPORT_HEARTBEAT_SECONDS):
+            db = SessionLocal()
+            try:
+                if not _update_owned(db, self.job_id, self.owner, {"heartbeat_at": datetime.utcnow()}):
+                    self.lost = True
+                db.commit()
+            except Exception:  # e.g. SQLite busy while the batch holds the write lock; retried next tick
+                logger.warning("Heartbeat for import job %s failed", self.job_id, exc_info=True)
+                db.rollback()
+            finally:
+                db.close()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def _import_batch(db: Session, kind: str, school_id: int, batch: list, first_row_no: int, errors: list):
+    """
+    (imported, failed) for one batch, imported in a savepoint; if the import fails, it is
+    rolled back and retried one row at a time so only the bad rows are skipped (and reported).
+    """
+    mapper, import_rows, import_row = IMPORTERS[kind]
+    failed = 0
+
+    def report(row_no: int, e: Exception):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_STORED_ERRORS:
+            errors.append({"row": row_no + 1, "error": str(e)})  # +1 for the header row
+
+    mapped = []  # (row number, mapped row); rows that don't map are reported straight away
+    for row_no, row in enumerate(batch, start=first_row_no):
+        try:
+            mapped.append((row_no, mapper(row)))
+        except Exception as e:  # bad rows are reported, not fatal
+            report(row_no, e)
+    try:
+        with db.begin_nested():
+            return import_rows(db, school_id, [m for _, m in mapped]), failed
+    except Exception:
+        pass
+    imported = 0
+    for row_no, m in mapped:
+        try:
+            with db.begin_nested():
+                if import_row(db, school_id, m):
+                    imported += 1
+        except Exception as e:
+            report(row_no, e)
+    return imported, failed
+
+
+def run_import(job_id: int):
+    owner = uuid.uuid4().hex
+    heartbeat = None
+    db = SessionLocal()
+    try:
+        if not _claim(db, job_id, owner):
+            return
+        heartbeat = _Heartbeat(job_id, owner)
+        heartbeat.start()
+        job = db.query(models.ImportJob).filter(models.ImportJob.id == job_id).first()
+        # progress is kept here and written with a conditional UPDATE, not through `job`
+        started_at = job.started_at or datetime.utcnow()
+        errors = list(job.errors or [])
+        kind, entity, school_id = job.kind, IMPORT_ENTITIES[job.kind], job.school_id
+        path = job_path(job)
+
+        with open(path, "rb") as f:
+            rows = iter_sheet_rows(f, path.endswith(".csv"))
+            # resume after the last committed checkpoint
+            rows = itertools.islice(rows, job.rows_processed, None)
+            row_no = job.rows_processed
+            rows_imported, error_count = job.rows_imported, job.error_count
+            while True:
+                batch = list(itertools.islice(rows, IMPORT_BATCH_SIZE))
+                if not batch:
+                    break
+                imported, failed = _import_batch(db, kind, school_id, batch, row_no + 1, errors)
+                rows_imported += imported
+                error_count += failed
+                row_no += len(batch)
+                # the checkpoint is committed together with the batch it describes, and only
+                # while this worker still owns the job
+                if heartbeat.lost or not _update_owned(db, job_id, owner, {
+                    "started_at": started_at,
+                    "rows_processed": row_no,
+                    "rows_imported": rows_imported,
+                    "error_count": error_count,
+                    "errors": list(errors),
+                    "heartbeat_at": datetime.utcnow(),
+                }):
+                    db.rollback()
+                    logger.warning("Import job %s was taken over by another worker; stopping", job_id)
+                    return
+                db.commit()
+                change_bus.publish(entity, school_id)
+
+        if _update_owned(db, job_id, owner, {"status": "done", "finished_at": datetime.utcnow()}):
+            db.commit()
+            os.remove(path)
+    except Exception:
+        logger.exception("Import job %s failed", job_id)
+        db.rollback()
+        _update_owned(db, job_id, owner, {"status": "failed", "finished_at": datetime.utcnow()})
+        db.commit()
+    finally:
+        if heartbeat is not None:
+            heartbeat.stop()
+        db.close()
+
+
+def enqueue_import(job_id: int):
+    _executor.submit(run_import, job_id)
+
+
+def resume_pending_imports():
+    """
+    Re-queue jobs that were queued or interrupted mid-way (e.g. the worker crashed).
+    Called on startup; _claim makes sure a job still owned by a live worker is left alone.
+    """
+    db = SessionLocal()
+    try:
+        job_ids = [
+            j.id for j in db.query(models.ImportJob.id).filter(models.ImportJob.status.in_(["queued", "running"]))
+        ]
+    finally:
+        db.close()
+    for job_id in job_ids:
+        enqueue_import(job_id)
@@ -0,0 +1,34 @@
+# app/utils/lazy_imports.py
+import importlib
+
+# Heavy libraries that only some endpoints need (numpy for face matching, openpyxl for Excel,
+# passlib for password hashing) are imported on first use instead of when app.main loads, so a
+# new worker starts serving sooner. benchmarks/import_time.py keeps them out of the import graph.
+
+
+class LazyModule:
+    """
+    Stand-in for a module that imports it on first attribute access:
+
+        np = LazyModule("numpy")
+        np.zeros(3)  # numpy is imported here
+
+    Annotations that mention the module are evaluated at import time, so modules using it in
+    signatures need `from __future__ import annotations`.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # only called for attributes not cached on the instance yet
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)  # thread-safe
+        value = getattr(module, attr)
+        setattr(self, attr, value)
+        return value
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}{'' if self._module is None else ' (loaded)'}>"
@@ -0,0 +1,228 @@
+# app/utils/live_attendance.py
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+from datetime import timedelta
+from typing import Dict, Iterable, List, NamedTuple
+
+from sqlalchemy import and_, case, func, select
+from starlette.concurrency import run_in_threadpool
+
+from app import models
+from app.database import SessionLocal
+from app.utils.attendance_utils import today_start
+from app.utils.change_bus import Change, change_bus
+
+logger = logging.getLogger(__name__)
+
+# Live roll-call progress for GET /administrator/attendance/live (Server-Sent Events). Attendance
+# writes in any worker publish the student ids they touched on the change bus; one feed task per
+# worker turns them into per-class counts with a single query and fans them out to that school's
+# subscribers. Writes within one interval are coalesced, so each class gets at most one event
+# per LIVE_ATTENDANCE_INTERVAL.
+LIVE_ATTENDANCE_INTERVAL = float(os.getenv("LIVE_ATTENDANCE_INTERVAL", "1"))  # seconds
+# comment line sent on idle streams so proxies keep them open and closed clients are noticed
+LIVE_ATTENDANCE_KEEPALIVE = float(os.getenv("LIVE_ATTENDANCE_KEEPALIVE", "15"))
+LIVE_ATTENDANCE_RETRY_MS = 3000  # EventSource reconnect delay
+
+
+class ClassCounts(NamedTuple):
+    class_id: int
+    school_id: int
+    name: str
+    marked: int
+    present: int
+    absent: int
+
+
+def class_counts(*criteria) -> List[ClassCounts]:
+    """
+    Today's marked/present/absent per class (zeros for classes nobody has marked yet),
+    filtered by `criteria` on Class. Runs on its own primary session: replicas may lag.
+    """
+    today = today_start()
+    status = func.lower(models.Attendance.status)
+    with SessionLocal() as db:
+        rows = (
+            db.query(
+                models.Class.id,
+                models.Class.school_id,
+                models.Class.name,
+                func.count(models.Attendance.id),
+                func.sum(case((status == "present", 1), else_=0)),
+                func.sum(case((status == "absent", 1), else_=0)),
+            )
+            .outerjoin(models.Student, models.Student.class_id == models.Class.id)
+            .outerjoin(models.Attendance, and_(
+                models.Attendance.student_id == models.Student.id,
+                models.Attendance.date >= today,
+                models.Attendance.date < today + timedelta(days=1),
+            ))
+            .filter(*criteria)
+            .group_by(models.Class.id, models.Class.school_id, models.Class.name)
+            .all()
+        )
+    return [ClassCounts(cid, sid, name, marked, present or 0, absent or 0) for cid, sid, name, marked, present, absent in rows]
+
+
+class Subscription:
+    """
+    One SSE client. Holds only the latest counts per class until the stream sends them, so a
+    slow client costs one entry per class, not a growing queue.
+    """
+
+    __slots__ = ("school_id", "pending", "ready")
+
+    def __init__(self, school_id: int):
+        self.school_id = school_id
+        self.pending: Dict[int, ClassCounts] = {}
+        self.ready = asyncio.Event()
+
+    def push(self, counts: ClassCounts):
+        self.pending[counts.class_id] = counts
+        self.ready.set()
+
+    def drain(self) -> List[ClassCounts]:
+        pending, self.pending = self.pending, {}
+        self.ready.clear()
+        return list(pending.values())
+
+
+class LiveAttendanceFeed:
+    """
+    Per-worker fan-out from attendance changes to SSE streams. publish() is cheap and
+    thread-safe (it runs on whichever thread published or received the change); everything
+    else runs on the event loop. Subscribers are plain objects waiting on an asyncio.Event, so thousands of
+    open streams cost no threads and one query per interval in total.
+    """
+
+    def __init__(self, interval: float = LIVE_ATTENDANCE_INTERVAL):
+        self.interval = interval
+        self.subscribers: Dict[int, set] = {}  # school_id -> {Subscription}
+        self.published = 0
+        self.events = 0
+        self._dirty = set()  # student ids written since the last push
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    def on_changes(self, changes: List[Change]):
+        """
+        Change bus subscriber: "attendance" changes carry the student id.
+        """
+        self.publish(c.id for c in changes if c.school_id in self.subscribers)
+
+    def publish(self, student_ids: Iterable[int]):
+        if not self.subscribers:
+            return
+        with self._lock:
+            self._dirty.update(student_ids)
+            self.published += 1
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass  # loop closed (worker shutting down)
+
+    def subscribe(self, school_id: int) -> Subscription:
+        self._ensure_running()
+        subscription = Subscription(school_id)
+        self.subscribers.setdefault(school_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self.subscribers.get(subscription.school_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[subscription.school_id]
+
+    def stats(self) -> dict:
+        return {
+            "schools": len(self.subscribers),
+            "subscribers": sum(len(s) for s in self.subscribers.values()),
+            "published": self.published,
+            "events": self.events,
+            "interval_seconds": self.interval,
+        }
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop, self._wakeup = loop, asyncio.Event()
+        # empty context: the feed's queries must not count toward the request that started it
+        self._task = loop.create_task(self._run(), context=contextvars.Context())
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            schools = list(self.subscribers)
+            if dirty and schools:
+                try:
+                    changed = await run_in_threadpool(
+                        class_counts,
+                        models.Class.school_id.in_(schools),
+                        models.Class.id.in_(select(models.Student.class_id).where(models.Student.id.in_(dirty))),
+                    )
+                except Exception:
+                    logger.exception("Live attendance update failed")
+                    changed = []
+                for counts in changed:
+                    for subscription in self.subscribers.get(counts.school_id, ()):
+                        subscription.push(counts)
+                        self.events += 1
+            # writes arriving during the pause go out together in the next round
+            await asyncio.sleep(self.interval)
+
+
+live_attendance = LiveAttendanceFeed()
+change_bus.subscribe(live_attendance.on_changes, entities=["attendance"])
+
+
+# ---------------------------
+# SERVER-SENT EVENTS
+# ---------------------------
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def school_attendance_events(school_id: int):
+    """
+    SSE body: a `snapshot` of every class in the school, then a `class` event with the new
+    counts and the change since the last event whenever a class's attendance changes.
+    """
+    subscription = live_attendance.subscribe(school_id)  # before the snapshot, so no write is missed
+    try:
+        snapshot = await run_in_threadpool(class_counts, models.Class.school_id == school_id)
+        known = {c.class_id: c for c in snapshot}
+        yield f"retry: {LIVE_ATTENDANCE_RETRY_MS}\n" + sse("snapshot", {
+            "school_id": school_id,
+            "date": today_start().date().isoformat(),
+            "classes": [c._asdict() for c in snapshot],
+        })
+        while True:
+            try:
+                await asyncio.wait_for(subscription.ready.wait(), LIVE_ATTENDANCE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            chunk = []
+            for counts in subscription.drain():
+                previous = known.get(counts.class_id) or counts._replace(marked=0, present=0, absent=0)
+                known[counts.class_id] = counts
+                delta = {k: getattr(counts, k) - getattr(previous, k) for k in ("marked", "present", "absent")}
+                if any(delta.values()):
+                    chunk.append(sse("class", {**counts._asdict(), "delta": delta}))
+            if chunk:
+                yield "".join(chunk)
+    finally:
+        live_attendance.unsubscribe(subscription)
@@ -0,0 +1,37 @@
+# app/utils/metrics.py
+import bisect
+import threading
+from typing import Sequence
+
+# seconds; tuned for pool waits / request latencies (1ms .. 30s)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    Minimal thread-safe cumulative histogram (Prometheus-style buckets, count and sum).
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.sum
+        cumulative, running = {}, 0
+        for bound, c in zip(self.buckets + (float("inf"),), counts):
+            running += c
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = running
+        return {"buckets": cumulative, "count": count, "sum": round(total, 6)}
@@ -0,0 +1,65 @@
+# app/utils/pool_metrics.py
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from app.utils.metrics import Histogram
+
+# Time spent waiting for a connection from the pool, per engine ("primary", "async", ...)
+pool_wait_seconds = {}
+pool_timeouts = {}
+
+
+class _TimedPoolMixin:
+    """
+    Records how long each checkout waited for a connection, and how often it timed out.
+    Set `metrics_name` on the pool after creating the engine to label a second engine.
+    """
+
+    metrics_name = "primary"
+
+    def recreate(self):
+        # keep the metrics name when SQLAlchemy rebuilds the pool (e.g. engine.dispose())
+        new_pool = super().recreate()
+        new_pool.metrics_name = self.metrics_name
+        return new_pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_timeouts[self.metrics_name] = pool_timeouts.get(self.metrics_name, 0) + 1
+            raise
+        finally:
+            hist = pool_wait_seconds.get(self.metrics_name)
+            if hist is None:
+                hist = pool_wait_seconds.setdefault(self.metrics_name, Histogram())
+            hist.observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_stats(name: str, engine) -> dict:
+    pool = engine.pool
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    if name in pool_wait_seconds:
+        stats["timeouts"] = pool_timeouts.get(name, 0)
+        stats["wait_seconds"] = pool_wait_seconds[name].snapshot()
+    return stats
@@ -0,0 +1,245 @@
+# app/utils/profiling.py
+import os
+import sys
+import json
+import time
+import secrets
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.utils.auth_utils import RoleChecker, decode_access_token
+from app.utils.request_metrics import QueryStats, current_query_stats, start_query_stats, stop_query_stats
+
+# In-place profiling of a single request: send `X-Profile: <superadmin access token>` along with
+# the normal Authorization header (e.g. a school administrator's token for
+# /administrator/attendance/school). The request runs under a sampling profiler with every SQL
+# statement timed; the result is saved under PROFILE_DIR and its id returned as X-Profile-Id.
+# Off unless REQUEST_PROFILING=1; even then, requests without the header only pay for a header lookup.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.002"))  # seconds between samples
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))  # newest profiles kept on disk
+PROFILE_MAX_STATEMENTS = 2000  # logged with timings; the count is always exact
+PROFILE_ID_PATTERN = r"^\d{8}T\d{6}-[0-9a-f]{8}$"
+
+profiler_required = RoleChecker(["superadmin"])
+
+# stack bottoms of threads waiting for work (event loop in select, idle pool workers)
+_IDLE_FRAMES = {("selectors.py", "select"), ("queue.py", "get"), ("thread.py", "_worker")}
+_SITE_PACKAGES = "site-packages" + os.sep
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) + os.sep
+
+
+# ---------------------------
+# SAMPLING PROFILER
+# ---------------------------
+class StackSampler(threading.Thread):
+    """
+    Wall-clock sampler over every busy thread, so sync endpoints (threadpool), the event loop and
+    pool waits all show up. Other requests running on the same worker at the same time are
+    sampled too; profile when the worker is quiet or read the stacks under the route's endpoint.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._labels = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own and not _is_idle(frame):
+                    self.stacks[self._stack(names.get(ident, "thread"), frame)] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def _stack(self, thread_name: str, frame) -> str:
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _frame_label(code)
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(thread_name.replace(";", ":"))
+        return ";".join(reversed(labels))
+
+    def folded(self) -> str:
+        """
+        Brendan Gregg's collapsed-stack format: flamegraph.pl, speedscope and inferno read it as is.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _is_idle(frame) -> bool:
+    while frame is not None and os.path.basename(frame.f_code.co_filename) == "threading.py":
+        frame = frame.f_back
+    return frame is None or (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_FRAMES
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if _SITE_PACKAGES in filename:
+        filename = filename.split(_SITE_PACKAGES, 1)[1]
+    elif filename.startswith(_ROOT):
+        filename = filename[len(_ROOT):]
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+# ---------------------------
+# ARTIFACTS
+# ---------------------------
+def _profile_path(profile_id: str, suffix: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}{suffix}")
+
+
+def save_profile(profile_id: str, summary: dict, folded: str):
+    """
+    <id>.json (request, timings, SQL) and <id>.folded (flamegraph input); prunes beyond PROFILE_KEEP.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(_profile_path(profile_id, ".folded"), "w") as f:
+        f.write(folded)
+    with open(_profile_path(profile_id, ".json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    # ids start with a UTC timestamp, so name order is age order
+    ids = sorted(name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith(".json"))
+    for old in ids[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        for suffix in (".json", ".folded"):
+            try:
+                os.remove(_profile_path(old, suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> list:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if name.endswith(".json"):
+            summary = load_profile(name[:-5])
+            if summary:
+                profiles.append({key: summary.get(key) for key in
+                                 ("id", "created_at", "method", "path", "status", "duration_ms")}
+                                | {"sql_statements": summary["sql"]["statements"]})
+    return profiles
+
+
+def load_profile(profile_id: str) -> Optional[dict]:
+    try:
+        with open(_profile_path(profile_id, ".json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def load_folded(profile_id: str) -> Optional[str]:
+    try:
+        with open(_profile_path(profile_id, ".folded")) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+# ---------------------------
+# ASGI MIDDLEWARE
+# ---------------------------
+class ProfilingMiddleware:
+    """
+    Sits inside RequestMetricsMiddleware so the profiled request's SQL lands in the same
+    QueryStats (and in /metrics, like any other request).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                token = value.decode("latin-1").removeprefix("Bearer ").strip()
+                break
+        if token is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            user_id, role = decode_access_token(token)
+            profiler_required({"id": user_id, "role": role})
+        except HTTPException as exc:
+            response = JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+            await response(scope, receive, send)
+            return
+
+        await self._profile(scope, receive, send, user_id)
+
+    async def _profile(self, scope, receive, send, user_id):
+        profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{secrets.token_hex(4)}"
+        stats = current_query_stats()
+        stats_token = None
+        if stats is None:  # REQUEST_METRICS=0
+            stats = QueryStats(scope=scope)
+            stats_token = start_query_stats(stats)
+        stats.log = []
+        status = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler = StackSampler()
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            duration = time.perf_counter() - start
+            sampler.stop()
+            log, stats.log = stats.log, None
+            if stats_token is not None:
+                stop_query_stats(stats_token)
+            route = getattr(scope.get("route"), "path", None)
+            summary = {
+                "id": profile_id,
+                "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+                "profiled_by": int(user_id),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query_string": scope.get("query_string", b"").decode("latin-1"),
+                "route": route,
+                "status": status,
+                "duration_ms": round(duration * 1000, 2),
+                "sampler": {"interval_ms": sampler.interval * 1000, "samples": sampler.samples},
+                "sql": {
+                    "statements": len(log),
+                    "total_ms": round(sum(seconds for _, seconds, _ in log) * 1000, 2),
+                    "log": [
+                        {"ms": round(seconds * 1000, 3), "rows": rows, "statement": " ".join(statement.split())}
+                        for statement, seconds, rows in log[:PROFILE_MAX_STATEMENTS]
+                    ],
+                },
+            }
+            await run_in_threadpool(save_profile, profile_id, summary, sampler.folded())
@@ -0,0 +1,65 @@
+# app/utils/query_budget.py
+import os
+import logging
+from typing import Optional
+
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+# off: nothing is checked (production); log: warn about requests over budget (staging);
+# raise: fail the request (tests / local runs) so a new query-in-a-loop can't slip in. The
+# metrics middleware holds the response back and answers 500 instead; a streamed response has
+# started before its body is done, so for those the exception is only raised (and logged by the
+# server) after it was sent.
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off")
+# the same SELECT run more often than this in one request is reported as a likely N+1
+QUERY_BUDGET_MAX_REPEATS = int(os.getenv("QUERY_BUDGET_MAX_REPEATS", "5"))
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_statements: Optional[int], max_repeats: int = QUERY_BUDGET_MAX_REPEATS):
+    """
+    Dependency declaring how many SQL statements a request may issue (auth lookups included).
+    Router-level budgets act as defaults; a budget on the route itself replaces them.
+    `max_statements=None` only checks for repeated statements.
+
+        @router.get("/x", dependencies=[Depends(query_budget(4))])
+    """
+
+    def declare_budget(request: Request):
+        request.scope["query_budget"] = (max_statements, max_repeats)
+
+    return declare_budget
+
+
+def query_budget_violation(scope: dict, route: str, statements: int, seen: dict) -> Optional[str]:
+    """
+    What the request did over its budget, None when it stayed within it.
+    """
+    max_statements, max_repeats = scope.get("query_budget") or (None, QUERY_BUDGET_MAX_REPEATS)
+    problems = []
+    if max_statements is not None and statements > max_statements:
+        problems.append(f"{statements} SQL statements (budget {max_statements})")
+    if seen:
+        statement, count = max(seen.items(), key=lambda item: item[1])
+        if count > max_repeats:
+            problems.append(f"the same statement {count} times, likely an N+1: {' '.join(statement.split())[:300]}")
+    if not problems:
+        return None
+    return f"Query budget exceeded on {scope['method']} {route}: " + "; ".join(problems)
+
+
+def check_query_budget(scope: dict, route: str, statements: int, seen: dict):
+    """
+    Called by the request metrics middleware once the response is finished.
+    """
+    message = query_budget_violation(scope, route, statements, seen)
+    if message is None:
+        return
+    if QUERY_BUDGET_MODE == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
@@ -0,0 +1,295 @@
+# app/utils/request_metrics.py
+import os
+import time
+import threading
+from contextvars import ContextVar, Token
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+
+from app.utils.metrics import Histogram
+from app.utils.pool_metrics import pool_timeouts, pool_wait_seconds
+from app.utils.query_budget import QUERY_BUDGET_MODE, check_query_budget, query_budget_violation
+
+# Per-route request latency plus the SQL each request ran (statements, DB time, rows),
+# exposed in Prometheus text format at /metrics. REQUEST_METRICS=0 turns the middleware off
+# (and with it the query budget checks).
+REQUEST_METRICS = os.getenv("REQUEST_METRICS", "1") == "1"
+# X-Profile requests (app/utils/profiling.py) reuse the same hooks to log each statement;
+# off unless REQUEST_PROFILING=1
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "0") == "1"
+# statements per request; an N+1 shows up as requests drifting into the high buckets
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+
+class QueryStats:
+    """
+    SQL run on behalf of one request. Row counts are what the driver reports:
+    psycopg2 counts SELECTed rows, SQLite/asyncpg only rows touched by INSERT/UPDATE/DELETE.
+    """
+
+    __slots__ = ("statements", "db_seconds", "rows", "seen", "log", "scope")
+
+    def __init__(self, track_statements: bool = False, scope: Optional[dict] = None):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        # SELECT text -> executions, only while query budgets are being checked (a flush of many
+        # new rows can legitimately repeat one INSERT, a repeated SELECT is a query in a loop)
+        self.seen = {} if track_statements else None
+        # (statement, seconds, rowcount) per execution, only for profiled requests
+        self.log = None
+        self.scope = scope  # the ASGI scope of the request, for current_route()
+
+
+# Set by the middleware for the duration of a request; the threadpool and the async engine's
+# greenlets run in copies of the request's context, so they all see the same QueryStats.
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+def current_route() -> Optional[str]:
+    """
+    "GET /route/{template}" of the request running the current code, None outside requests.
+    """
+    stats = _current_stats.get()
+    if stats is None or stats.scope is None:
+        return None
+    scope = stats.scope
+    return f"{scope['method']} {getattr(scope.get('route'), 'path', None) or scope['path']}"
+
+
+def start_query_stats(stats: QueryStats) -> Token:
+    return _current_stats.set(stats)
+
+
+def stop_query_stats(token: Token):
+    _current_stats.reset(token)
+
+
+# ---------------------------
+# SQLALCHEMY EVENT HOOKS
+# ---------------------------
+# The start time lives on the statement's execution context rather than conn.info, where a
+# failed statement (no after_cursor_execute) would leave it behind on the pooled connection.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current_stats.get() is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    started = getattr(context, "_query_started", None)
+    if stats is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats.statements += 1
+    stats.db_seconds += elapsed
+    if cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+    if stats.log is not None:
+        stats.log.append((statement, elapsed, cursor.rowcount))
+    if stats.seen is not None and statement.lstrip()[:6].upper() == "SELECT":
+        stats.seen[statement] = stats.seen.get(statement, 0) + 1
+
+
+def instrument_engine(engine):
+    """
+    Count statements, DB time and rows per request on a (sync) engine;
+    pass `async_engine.sync_engine` for an AsyncEngine.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ---------------------------
+# PER-ROUTE REGISTRY
+# ---------------------------
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram()
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.db_seconds = Histogram()
+        self.rows = 0
+        self.responses = {}  # status code -> count
+
+
+class MetricsRegistry:
+    """
+    (method, route template) -> RouteMetrics. Templates ("/teacher/attendance/class/{class_id}")
+    keep the label set bounded; requests that match no route share "unmatched".
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: QueryStats):
+        key = (method, route)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            with self._lock:
+                metrics = self.routes.setdefault(key, RouteMetrics())
+        metrics.latency.observe(seconds)
+        metrics.statements.observe(stats.statements)
+        metrics.db_seconds.observe(stats.db_seconds)
+        with self._lock:
+            metrics.rows += stats.rows
+            metrics.responses[status] = metrics.responses.get(status, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            routes = dict(self.routes)
+        return {
+            key: {
+                "latency": m.latency.snapshot(),
+                "statements": m.statements.snapshot(),
+                "db_seconds": m.db_seconds.snapshot(),
+                "rows": m.rows,
+                "responses": dict(m.responses),
+            }
+            for key, m in routes.items()
+        }
+
+
+registry = MetricsRegistry()
+
+
+# ---------------------------
+# ASGI MIDDLEWARE
+# ---------------------------
+class RequestMetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware task hop, streaming bodies pass straight
+    through). Latency runs until the last body chunk has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats(track_statements=QUERY_BUDGET_MODE != "off", scope=scope)
+        token = start_query_stats(stats)
+        status = 500  # an exception escaping the app is reported as a 500 by the server
+        start = time.perf_counter()
+        # raise mode: the response start waits for the first body chunk; when that is the whole
+        # body the budget is checked before anything is sent, so an over-budget request fails
+        held = None
+        checked = False
+
+        async def send_with_status(message):
+            nonlocal status, held, checked
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if stats.seen is not None and QUERY_BUDGET_MODE == "raise":
+                    held = message
+                    return
+            elif held is not None:
+                response_start, held = held, None
+                if not message.get("more_body", False):
+                    checked = True
+                    route = getattr(scope.get("route"), "path", None) or "unmatched"
+                    violation = query_budget_violation(scope, route, stats.statements, stats.seen)
+                    if violation is not None:
+                        status = 500
+                        await JSONResponse({"detail": violation}, status_code=500)(scope, receive, send)
+                        return
+                await send(response_start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            stop_query_stats(token)
+            # the router stores the matched APIRoute in the scope
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            registry.observe(scope["method"], route, status, time.perf_counter() - start, stats)
+        # only for requests that completed; a failing request already reports its own error
+        if stats.seen is not None and not checked:
+            check_query_budget(scope, route, stats.statements, stats.seen)
+
+
+# ---------------------------
+# PROMETHEUS TEXT FORMAT
+# ---------------------------
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _histogram(lines: list, name: str, snapshot: dict, **labels):
+    for bound, count in snapshot["buckets"].items():
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {snapshot['sum']}")
+    lines.append(f"{name}_count{_labels(**labels)} {snapshot['count']}")
+
+
+def render_prometheus() -> str:
+    routes = sorted(registry.snapshot().items())
+    lines = []
+
+    lines += ["# HELP http_requests_total Requests by route template and status code.",
+              "# TYPE http_requests_total counter"]
+    for (method, route), m in routes:
+        for status, count in sorted(m["responses"].items()):
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+    histograms = (
+        ("http_request_duration_seconds", "latency", "Request latency in seconds, until the last body chunk."),
+        ("http_request_sql_statements", "statements", "SQL statements executed per request."),
+        ("http_request_db_seconds", "db_seconds", "Time per request spent executing SQL."),
+    )
+    for name, field, help_text in histograms:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (method, route), m in routes:
+            _histogram(lines, name, m[field], method=method, route=route)
+
+    lines += ["# HELP http_request_db_rows_total Rows returned or affected, as reported by the driver.",
+              "# TYPE http_request_db_rows_total counter"]
+    for (method, route), m in routes:
+        lines.append(f"http_request_db_rows_total{_labels(method=method, route=route)} {m['rows']}")
+
+    lines += ["# HELP db_pool_wait_seconds Time spent waiting for a pooled connection.",
+              "# TYPE db_pool_wait_seconds histogram"]
+    for pool, hist in sorted(pool_wait_seconds.items()):
+        _histogram(lines, "db_pool_wait_seconds", hist.snapshot(), pool=pool)
+    lines += ["# HELP db_pool_timeouts_total Checkouts that timed out waiting for a connection.",
+              "# TYPE db_pool_timeouts_total counter"]
+    for pool in sorted(pool_wait_seconds):
+        lines.append(f"db_pool_timeouts_total{_labels(pool=pool)} {pool_timeouts.get(pool, 0)}")
+
+    # imported here: admission reads the pool settings from app.database, which imports this module
+    from app.utils.admission import ADMISSION_CONTROL, admission
+
+    if ADMISSION_CONTROL:
+        lines += ["# HELP admission_decisions_total Requests admitted at once, admitted after queueing or shed with 429.",
+                  "# TYPE admission_decisions_total counter"]
+        for (priority, decision), count in sorted(admission.decisions.items()):
+            lines.append(f"admission_decisions_total{_labels(priority=priority, decision=decision)} {count}")
+        lines += ["# HELP admission_queue_wait_seconds Time requests waited for an admission slot.",
+                  "# TYPE admission_queue_wait_seconds histogram"]
+        for priority, hist in admission.queue_wait.items():
+            _histogram(lines, "admission_queue_wait_seconds", hist.snapshot(), priority=priority)
+        lines += ["# HELP admission_in_flight Requests holding an admission slot.",
+                  "# TYPE admission_in_flight gauge"]
+        for priority, count in admission.in_flight.items():
+            lines.append(f"admission_in_flight{_labels(priority=priority)} {count}")
+        lines += ["# HELP admission_queued Requests waiting for an admission slot.",
+                  "# TYPE admission_queued gauge"]
+        for priority, queue in admission.queues.items():
+            lines.append(f"admission_queued{_labels(priority=priority)} {len(queue)}")
+        lines += ["# HELP admission_fair_share_deferrals_total Waiters passed over because their school was over its share.",
+                  "# TYPE admission_fair_share_deferrals_total counter",
+                  f"admission_fair_share_deferrals_total {admission.deferred}"]
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,247 @@
+# app/utils/school_calendar.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.change_bus import change_bus
+from app.utils.lazy_imports import LazyModule
+
+np = LazyModule("numpy")
+
+# Instructional days per school and academic year: one bit per day in SchoolCalendar.days
+# (46 bytes a year), held in memory as prefix sums, so the instructional days between two dates
+# are two array lookups and a whole report is a few vectorised numpy operations. Years a school
+# hasn't stored fall back to SCHOOL_WEEKDAYS with no holidays.
+ACADEMIC_YEAR_START_MONTH = int(os.getenv("ACADEMIC_YEAR_START_MONTH", "6"))  # June, after the summer break
+SCHOOL_WEEKDAYS = tuple(int(d) for d in os.getenv("SCHOOL_WEEKDAYS", "0,1,2,3,4,5").split(","))  # 0 = Monday
+# Other workers hear about edits through the change bus ("calendar" changes); the TTL is the
+# fallback for notifications lost while the bus was down (CHANGE_BUS=off).
+SCHOOL_CALENDAR_TTL = float(os.getenv("SCHOOL_CALENDAR_TTL", "300"))
+
+
+def academic_year(day: date) -> int:
+    """
+    The calendar year in which the academic year containing `day` started.
+    """
+    return day.year if day.month >= ACADEMIC_YEAR_START_MONTH else day.year - 1
+
+
+def year_span(year: int) -> Tuple[date, date]:
+    """
+    First day of academic year `year` and first day of the next one.
+    """
+    return date(year, ACADEMIC_YEAR_START_MONTH, 1), date(year + 1, ACADEMIC_YEAR_START_MONTH, 1)
+
+
+def weekday_mask(weekdays: Iterable[int]) -> int:
+    return sum(1 << d for d in set(weekdays))
+
+
+def mask_weekdays(mask: int) -> Tuple[int, ...]:
+    return tuple(d for d in range(7) if mask >> d & 1)
+
+
+# ---------------------------
+# BITSETS
+# ---------------------------
+def pack_days(year: int, open_days: Iterable[date]) -> bytes:
+    """
+    SchoolCalendar.days for an explicit set of instructional days (days outside the year are ignored).
+    """
+    start, end = year_span(year)
+    bits = np.zeros((end - start).days, dtype=bool)
+    for day in open_days:
+        if start <= day < end:
+            bits[(day - start).days] = True
+    return np.packbits(bits).tobytes()
+
+
+def build_days(year: int, weekdays: Iterable[int], holidays: Iterable[date] = (),
+               extra_days: Iterable[date] = ()) -> bytes:
+    """
+    SchoolCalendar.days for a weekly pattern, minus `holidays`, plus `extra_days` (e.g. a
+    Saturday make-up day). Raises ValueError for a date outside the academic year.
+    """
+    start, end = year_span(year)
+    bits = np.isin((start.weekday() + np.arange((end - start).days)) % 7, list(weekdays))
+    for day, is_open in [(d, False) for d in holidays] + [(d, True) for d in extra_days]:
+        if not start <= day < end:
+            raise ValueError(f"{day} is not in academic year {year} ({start} to {end - timedelta(days=1)})")
+        bits[(day - start).days] = is_open
+    return np.packbits(bits).tobytes()
+
+
+class YearCalendar:
+    """
+    One school's academic year. `open[i]` is True when day i of the year is instructional and
+    `cumulative[i]` counts the instructional days before day i.
+    """
+
+    __slots__ = ("year", "start", "weekdays", "stored", "open", "cumulative", "loaded_at")
+
+    def __init__(self, year: int, days: bytes, weekdays: Tuple[int, ...], stored: bool):
+        self.year = year
+        self.start, end = year_span(year)
+        self.weekdays = weekdays
+        self.stored = stored  # False: the SCHOOL_WEEKDAYS default
+        self.open = np.unpackbits(np.frombuffer(days, dtype=np.uint8), count=(end - self.start).days).astype(bool)
+        self.cumulative = np.concatenate(([0], np.cumsum(self.open)))
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def default(cls, year: int) -> YearCalendar:
+        return cls(year, build_days(year, SCHOOL_WEEKDAYS), SCHOOL_WEEKDAYS, stored=False)
+
+    def is_open(self, day: date) -> bool:
+        return bool(self.open[(day - self.start).days])
+
+    def count(self, first: np.ndarray, last: np.ndarray) -> np.ndarray:
+        """
+        Instructional days of this year from first[i] to last[i] (day ordinals, inclusive).
+        """
+        base, n = self.start.toordinal(), len(self.open)
+        lo = np.clip(first - base, 0, n)
+        hi = np.clip(last - base + 1, 0, n)
+        return np.maximum(self.cumulative[hi] - self.cumulative[lo], 0)
+
+    def describe(self) -> dict:
+        """
+        The year as the weekly pattern plus the days that differ from it.
+        """
+        n = len(self.open)
+        on_pattern = np.isin((self.start.weekday() + np.arange(n)) % 7, list(self.weekdays))
+        return {
+            "year": self.year,
+            "start": self.start,
+            "end": self.start + timedelta(days=n - 1),
+            "weekdays": list(self.weekdays),
+            "instructional_days": int(self.cumulative[-1]),
+            "holidays": [self.start + timedelta(days=int(i)) for i in np.flatnonzero(on_pattern & ~self.open)],
+            "extra_days": [self.start + timedelta(days=int(i)) for i in np.flatnonzero(~on_pattern & self.open)],
+            "stored": self.stored,
+        }
+
+
+# ---------------------------
+# CACHE
+# ---------------------------
+class CalendarCache:
+    """
+    (school_id, year) -> YearCalendar, loaded on first use (a few KB each, so never evicted).
+    Call invalidate() after committing a change to a school's calendar.
+    """
+
+    def __init__(self, ttl: float = SCHOOL_CALENDAR_TTL):
+        self.ttl = ttl
+        self.entries: Dict[Tuple[int, int], YearCalendar] = {}
+        # bumped by invalidate(); a load that raced with an invalidation isn't stored
+        self.generations: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, school_id: int, years: Iterable[int]) -> Dict[int, YearCalendar]:
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for year in years:
+                calendar = self.entries.get((school_id, year))
+                if calendar is not None and now - calendar.loaded_at < self.ttl:
+                    found[year] = calendar
+                else:
+                    missing.append(year)
+            self.hits += len(found)
+            self.misses += len(missing)
+            generation = self.generations.get(school_id, 0)
+        if not missing:
+            return found
+
+        stored = {
+            year: YearCalendar(year, days, mask_weekdays(mask), stored=True)
+            for year, days, mask in db.query(
+                models.SchoolCalendar.year, models.SchoolCalendar.days, models.SchoolCalendar.weekdays
+            ).filter(models.SchoolCalendar.school_id == school_id, models.SchoolCalendar.year.in_(missing))
+        }
+        loaded = {year: stored.get(year) or YearCalendar.default(year) for year in missing}
+        with self._lock:
+            if self.generations.get(school_id, 0) == generation:
+                self.entries.update(((school_id, year), calendar) for year, calendar in loaded.items())
+        found.update(loaded)
+        return found
+
+    def year(self, db: Session, school_id: int, day: date) -> YearCalendar:
+        year = academic_year(day)
+        return self.get(db, school_id, [year])[year]
+
+    def invalidate(self, *school_ids: Optional[int]):
+        with self._lock:
+            for school_id in {s for s in school_ids if s is not None}:
+                self.generations[school_id] = self.generations.get(school_id, 0) + 1
+                for key in [k for k in self.entries if k[0] == school_id]:
+                    del self.entries[key]
+
+    def clear(self):
+        with self._lock:
+            for school_id in {k[0] for k in self.entries}:
+                self.generations[school_id] = self.generations.get(school_id, 0) + 1
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calendars": len(self.entries),
+                "stored": sum(c.stored for c in self.entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "ttl_seconds": self.ttl,
+            }
+
+
+calendar_cache = CalendarCache()
+# calendars edited through other workers; this worker's write path invalidates directly
+change_bus.subscribe(
+    lambda changes: calendar_cache.invalidate(*(c.school_id for c in changes)),
+    entities=["calendar"], remote_only=True, on_resync=calendar_cache.clear,
+)
+
+
+# ---------------------------
+# EXPECTED DAYS
+# ---------------------------
+def _day(value) -> Optional[date]:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def expected_range(start: Optional[date], end: Optional[date], first_recorded, last_recorded) -> Tuple[Optional[date], date]:
+    """
+    Days a student is expected in for a report: from `start` (else their first record) to `end`,
+    but never past yesterday, or today once they have been marked today.
+    """
+    today = date.today()
+    last = today if _day(last_recorded) == today else today - timedelta(days=1)
+    if end is not None:
+        last = min(last, end)
+    return start or _day(first_recorded), last
+
+
+def expected_days(db: Session, school_id: int, ranges: Sequence[Tuple[Optional[date], date]]) -> np.ndarray:
+    """
+    Instructional days in each (first, last) range, both inclusive; 0 for an empty range or
+    one without a first day (e.g. no records and no report start).
+    """
+    result = np.zeros(len(ranges), dtype=np.int64)
+    valid = [i for i, (first, last) in enumerate(ranges) if first is not None and first <= last]
+    if not valid:
+        return result
+    first = np.fromiter((ranges[i][0].toordinal() for i in valid), dtype=np.int64, count=len(valid))
+    last = np.fromiter((ranges[i][1].toordinal() for i in valid), dtype=np.int64, count=len(valid))
+    years = range(academic_year(date.fromordinal(int(first.min()))), academic_year(date.fromordinal(int(last.max()))) + 1)
+    result[valid] = sum(calendar.count(first, last) for calendar in calendar_cache.get(db, school_id, years).values())
+    return result
@@ -0,0 +1,227 @@
+# app/utils/slow_queries.py
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+from sqlalchemy import event
+
+from app.utils.request_metrics import current_route
+
+# Statements slower than SLOW_QUERY_MS are logged (one JSON line each) to SLOW_QUERY_LOG with their
+# bound parameters, the route that ran them and, for a sample of SELECTs, the query plan
+# (EXPLAIN (ANALYZE, BUFFERS) on PostgreSQL, EXPLAIN QUERY PLAN on SQLite). Unset = off, no hooks.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS") or 0)
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "slow_queries.log")
+SLOW_QUERY_LOG_BYTES = int(os.getenv("SLOW_QUERY_LOG_BYTES", str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+# ANALYZE runs the statement a second time, so plans are sampled: the first slow execution of a
+# fingerprint always, afterwards at most once per interval and then only with this probability
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))  # seconds
+SLOW_QUERY_PARAM_CHARS = 200  # longer parameter values are truncated in the log
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------
+# FINGERPRINTS
+# ---------------------------
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|:\w+|\?")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Statement with literals and bind placeholders (any paramstyle) replaced by ?, IN lists
+    collapsed and whitespace squeezed, so every execution of one query maps to the same text.
+    """
+    text = _STRING.sub("?", statement)
+    text = _PLACEHOLDER.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    text = _IN_LIST.sub("IN (...)", text)
+    return _SPACE.sub(" ", text).strip()
+
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+# ---------------------------
+# AGGREGATES
+# ---------------------------
+class SlowQueryStats:
+    """
+    Slow executions per fingerprint, for /internal/slow-queries.
+    """
+
+    def __init__(self):
+        self.queries = {}
+        self._lock = threading.Lock()
+
+    def record(self, fp: str, normalized: str, seconds: float, route: Optional[str]) -> bool:
+        """
+        Count one slow execution; returns whether this one should be explained.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self.queries.get(fp)
+            if entry is None:
+                entry = self.queries[fp] = {
+                    "statement": normalized, "count": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                    "routes": {}, "explained_at": None, "plan": None,
+                }
+            entry["count"] += 1
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            route = route or "background"
+            entry["routes"][route] = entry["routes"].get(route, 0) + 1
+            last = entry["explained_at"]
+            explain = last is None or (
+                now - last >= SLOW_QUERY_EXPLAIN_INTERVAL and random.random() < SLOW_QUERY_EXPLAIN_RATE
+            )
+            if explain:
+                entry["explained_at"] = now
+            return explain
+
+    def set_plan(self, fp: str, plan: str):
+        with self._lock:
+            self.queries[fp]["plan"] = plan
+
+    def snapshot(self, limit: int = 50) -> list:
+        with self._lock:
+            entries = [dict(entry, routes=dict(entry["routes"]), fingerprint=fp) for fp, entry in self.queries.items()]
+        entries.sort(key=lambda e: e["total_seconds"], reverse=True)
+        for entry in entries:
+            entry.pop("explained_at")
+            entry["total_ms"] = round(entry.pop("total_seconds") * 1000, 1)
+            entry["max_ms"] = round(entry.pop("max_seconds") * 1000, 1)
+            entry["mean_ms"] = round(entry["total_ms"] / entry["count"], 1)
+        return entries[:limit]
+
+
+slow_queries = SlowQueryStats()
+
+_log = logging.getLogger("app.slow_queries.log")
+_log.propagate = False
+
+
+def _log_line(record: dict):
+    if not _log.handlers:
+        handler = RotatingFileHandler(SLOW_QUERY_LOG, maxBytes=SLOW_QUERY_LOG_BYTES,
+                                      backupCount=SLOW_QUERY_LOG_BACKUPS, delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _log.addHandler(handler)
+        _log.setLevel(logging.INFO)
+    _log.info(json.dumps(record, default=str))
+
+
+def _param_value(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, str) and len(value) > SLOW_QUERY_PARAM_CHARS:
+        return value[:SLOW_QUERY_PARAM_CHARS] + "..."
+    return value
+
+
+def _loggable_params(parameters):
+    if isinstance(parameters, dict):
+        return {key: _param_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_param_value(value) for value in parameters]
+    return parameters
+
+
+# ---------------------------
+# EXPLAIN
+# ---------------------------
+def explain(conn, statement: str, parameters) -> Optional[str]:
+    """
+    Plan for a statement that just ran, on the same DBAPI connection and transaction (so it sees
+    the same data and session settings) without going through the engine events again. On
+    PostgreSQL it runs inside a savepoint: a failing EXPLAIN must not abort the request's
+    transaction.
+    """
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    elif dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return None
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if dialect == "postgresql":
+            cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception:
+            if dialect == "postgresql":
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            raise
+        if dialect == "postgresql":
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        cursor.close()
+    # PostgreSQL: one text line per row; SQLite: (id, parent, notused, detail)
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+# ---------------------------
+# SQLALCHEMY EVENT HOOKS
+# ---------------------------
+# The start time lives on the statement's execution context, not on the connection: when a
+# statement fails after_cursor_execute never fires, and anything left in conn.info would stay
+# on the pooled connection.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._slow_query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slow_query_started", None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    if seconds * 1000 < SLOW_QUERY_MS:
+        return
+    normalized = normalize_statement(statement)
+    fp = fingerprint(normalized)
+    route = current_route()
+    record = {
+        "ts": datetime.utcnow().isoformat(timespec="milliseconds"),
+        "fingerprint": fp,
+        "ms": round(seconds * 1000, 2),
+        "route": route,
+        "statement": statement,
+        "parameters": None if executemany else _loggable_params(parameters),
+    }
+    # only plain reads: EXPLAIN ANALYZE executes the statement, a write would happen twice
+    if (slow_queries.record(fp, normalized, seconds, route) and not executemany
+            and statement.lstrip()[:6].upper() == "SELECT"):
+        try:
+            record["plan"] = explain(conn, statement, parameters)
+            if record["plan"]:
+                slow_queries.set_plan(fp, record["plan"])
+        except Exception as exc:
+            logger.warning("EXPLAIN failed for slow query %s: %s", fp, exc)
+    _log_line(record)
+
+
+def log_slow_queries(engine):
+    """
+    Slow statement logging on a (sync) engine; pass `async_engine.sync_engine` for an AsyncEngine.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,177 @@
+"""
+Morning peak with and without admission control (app/utils/admission.py).
+
+Seeds --schools schools and boots uvicorn once with ADMISSION_CONTROL=0 and once with
+ADMISSION_CONTROL=1 (or just --modes on / off). For --duration seconds, all at once:
+
+  exports    --exporters clients of the first ("big") school's administrator looping over the
+             school report and the xlsx/CSV exports (bulk)
+  dashboard  --readers clients of the big school polling lists (default)
+  roll_call  --writers teachers from every school marking attendance (critical)
+  login      --logins clients logging teachers in (critical)
+
+Clients are closed loops; a 429 is counted and the client sleeps for its Retry-After before the
+next request. Reports completed requests, 429s, other errors and p50/p99 latency per load (roll
+call split into the big school and the rest), plus /internal/admission for the "on" run.
+
+    python benchmarks/admission.py
+    python benchmarks/admission.py --exporters 40 --writers 60 --duration 30
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from scenarios import PASSWORD, PORT, seed, start_server  # noqa: E402
+
+
+def district(database_url: str):
+    """
+    (school id, administrator id, [(teacher id, email, [student ids])]) per school.
+    """
+    os.environ["DATABASE_URL"] = database_url
+    from app import models
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        schools = []
+        for school_id, admin_id in db.query(models.School.id, models.School.administrator_id).order_by(models.School.id):
+            teachers = []
+            for teacher in db.query(models.Teacher).filter(models.Teacher.school_id == school_id).order_by(models.Teacher.id):
+                students = [s.id for c in teacher.classes for s in c.students]
+                if students:
+                    teachers.append((teacher.id, teacher.email, students))
+            schools.append((school_id, admin_id, teachers))
+        return schools
+
+
+class Load:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = []
+        self.shed = 0
+        self.errors = 0
+
+    def row(self) -> str:
+        q = statistics.quantiles(self.latencies, n=100) if len(self.latencies) > 1 else [0.0] * 99
+        return (f"  {self.name:<22}{len(self.latencies):>8}{self.shed:>7}{self.errors:>8}"
+                f"{q[49] * 1000:>10.0f}{q[98] * 1000:>10.0f}")
+
+
+async def client_loop(client, load: Load, next_request, deadline: float):
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            r = await next_request(client, i)
+        except httpx.HTTPError:
+            load.errors += 1
+            continue
+        finally:
+            i += 1
+        if r.status_code == 429:
+            load.shed += 1
+            await asyncio.sleep(float(r.headers.get("Retry-After", "1")))
+        elif r.status_code >= 400:
+            load.errors += 1
+        else:
+            load.latencies.append(time.perf_counter() - start)
+
+
+async def drive(args, schools) -> list:
+    from app.utils.auth_utils import create_access_token
+
+    def bearer(sub, role, school_id):
+        token = create_access_token({"sub": str(sub), "role": role, "school_id": school_id})
+        return {"Authorization": f"Bearer {token}"}
+
+    big_id, big_admin, big_teachers = schools[0]
+    admin = bearer(big_admin, "administrator", big_id)
+    writers = [(school_id, bearer(t_id, "teacher", school_id), students)
+               for school_id, _, teachers in schools for t_id, _, students in teachers]
+    emails = [email for _, _, teachers in schools for _, email, _ in teachers]
+    loads = {name: Load(name) for name in ("exports", "dashboard", "roll_call big school", "roll_call others", "login")}
+
+    async def export(c, i):
+        path = ("/administrator/attendance/school", "/administrator/attendance/school/excel")[i % 2]
+        return await c.get(path, params={"format": "csv"} if i % 4 == 3 else None, headers=admin)
+
+    async def dashboard(c, i):
+        return await c.get(("/administrator/teachers", "/administrator/classes", "/administrator/students")[i % 3],
+                           headers=admin)
+
+    def roll_call(n):
+        school_id, headers, students = writers[n % len(writers)]
+
+        async def mark(c, i):
+            return await c.post(f"/teacher/attendance/student/{students[i % len(students)]}",
+                                params={"status": "Present"}, headers=headers)
+        return school_id, mark
+
+    async def login(c, i):
+        return await c.post("/auth/login", data={"username": emails[i % len(emails)], "password": PASSWORD})
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=args.timeout) as client:
+        deadline = time.perf_counter() + args.duration
+        tasks = [client_loop(client, loads["exports"], export, deadline) for _ in range(args.exporters)]
+        tasks += [client_loop(client, loads["dashboard"], dashboard, deadline) for _ in range(args.readers)]
+        for n in range(args.writers):
+            school_id, mark = roll_call(n)
+            load = loads["roll_call big school" if school_id == big_id else "roll_call others"]
+            tasks.append(client_loop(client, load, mark, deadline))
+        tasks += [client_loop(client, loads["login"], login, deadline) for _ in range(args.logins)]
+        await asyncio.gather(*tasks)
+    return list(loads.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schools", type=int, default=3)
+    parser.add_argument("--teachers-per-school", type=int, default=10)
+    parser.add_argument("--students-per-class", type=int, default=30)
+    parser.add_argument("--years", type=float, default=0.5)
+    parser.add_argument("--exporters", type=int, default=30)
+    parser.add_argument("--readers", type=int, default=20)
+    parser.add_argument("--writers", type=int, default=30)
+    parser.add_argument("--logins", type=int, default=5)
+    parser.add_argument("--duration", type=float, default=20, help="seconds per mode")
+    parser.add_argument("--timeout", type=float, default=30, help="client timeout, seconds")
+    parser.add_argument("--modes", default="off,on", help="admission control off and/or on")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/admission.db"
+    seed(database_url, args)
+    schools = district(database_url)
+
+    for mode in args.modes.split(","):
+        os.environ["ADMISSION_CONTROL"] = "1" if mode == "on" else "0"
+        server = start_server(database_url, workers=1)
+        try:
+            loads = asyncio.run(drive(args, schools))
+            stats = httpx.get(f"http://127.0.0.1:{PORT}/internal/admission", timeout=10).json() if mode == "on" else None
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+        print(f"\nadmission control {mode}, {args.duration:.0f} s")
+        print(f"  {'load':<22}{'done':>8}{'429':>7}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}")
+        for load in loads:
+            print(load.row())
+        if stats:
+            print(f"  decisions {stats['decisions']}, fair-share deferrals {stats['deferred']}")
+
+
+if __name__ == "__main__":
+    main()
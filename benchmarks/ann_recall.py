@@ -0,0 +1,90 @@
+"""
+Recall and latency of the school-wide IVF index against exact (brute-force) search.
+
+Gallery embeddings are random unit vectors; each probe is a noisy copy of one of them,
+like a gate-camera frame of an enrolled student. Recall@1 is the share of probes whose
+IVF answer equals the exact answer.
+
+    python benchmarks/ann_recall.py --students 5000 --students 20000 --probes 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app modules expect one; nothing is queried
+
+from app.utils.ann_index import IVFIndex  # noqa: E402
+from app.utils.face_embeddings import FACE_EMBEDDING_DIM, normalize_rows  # noqa: E402
+
+
+def per_probe_ms(fn, probes, repeat):
+    # gate frames arrive one face at a time, so time single-probe searches
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for p in probes:
+            fn(p.reshape(1, -1))
+        best = min(best, (time.perf_counter() - t0) / len(probes))
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, action="append", help="gallery size (repeatable)")
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.04, help="per-dimension noise added to probes")
+    parser.add_argument("--nprobe", type=int, action="append", help="lists scanned (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for n in args.students or [5000]:
+        gallery = normalize_rows(rng.standard_normal((n, FACE_EMBEDDING_DIM)).astype(np.float32))
+        ids = np.arange(1, n + 1)
+        truth = rng.choice(n, size=args.probes, replace=False)
+        probes = gallery[truth] + args.noise * rng.standard_normal((args.probes, FACE_EMBEDDING_DIM)).astype(np.float32)
+
+        def exact(p):
+            scores = normalize_rows(p) @ gallery.T
+            return ids[scores.argmax(axis=1)]
+
+        exact_ids = exact(probes)
+        exact_ms = per_probe_ms(exact, probes, args.repeat)
+
+        t0 = time.perf_counter()
+        index = IVFIndex()
+        index.train(ids, gallery)
+        build_s = time.perf_counter() - t0
+        path = os.path.join(tempfile.mkdtemp(), "index.npz")
+        t0 = time.perf_counter()
+        index.save(path)
+        save_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        index = IVFIndex.load(path)
+        load_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        extra = normalize_rows(rng.standard_normal((100, FACE_EMBEDDING_DIM)).astype(np.float32))
+        for i, v in enumerate(extra):
+            index.add([n + 1 + i], v.reshape(1, -1))
+        index.remove(list(range(n + 1, n + 101)))
+        update_ms = (time.perf_counter() - t0) / 200 * 1000
+
+        print(f"\n{n} students, nlist={index.nlist}: build {build_s:.2f}s, save {save_s * 1000:.0f}ms, "
+              f"load {load_s * 1000:.0f}ms, insert/delete {update_ms:.3f}ms each")
+        print(f"{'search':<12}{'recall@1':>10}{'ms/probe':>10}{'speedup':>9}")
+        print(f"{'exact':<12}{1.0:>10.3f}{exact_ms:>10.3f}{1.0:>8.1f}x")
+        for nprobe in args.nprobe or [1, 4, 8, 16]:
+            found, _ = index.search(probes, nprobe=nprobe)
+            recall = float((found == exact_ids).mean())
+            ms = per_probe_ms(lambda p: index.search(p, nprobe=nprobe), probes, args.repeat)
+            print(f"{f'nprobe={nprobe}':<12}{recall:>10.3f}{ms:>10.3f}{exact_ms / ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
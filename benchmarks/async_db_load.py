@@ -0,0 +1,170 @@
+"""
+Sync vs async (USE_ASYNC_DB=1) load comparison for the hot endpoints.
+
+Boots uvicorn twice against the same seeded database and fires CONCURRENCY
+simultaneous requests at each endpoint, reporting throughput and latency percentiles.
+
+    DATABASE_URL=postgresql://... python benchmarks/async_db_load.py --concurrency 200 --requests 4000
+
+Without DATABASE_URL a throwaway SQLite file is used (needs aiosqlite), which is good
+enough for a smoke run but not for real numbers: SQLite serialises writes.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PORT = 8765
+STUDENTS_PER_CLASS = 40
+
+
+def seed(database_url: str):
+    os.environ["DATABASE_URL"] = database_url
+    from app import models
+    from app.database import Base, engine, SessionLocal
+    from app.utils.auth_utils import get_password_hash
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        teacher = db.query(models.Teacher).filter(models.Teacher.email == "bench.teacher@example.com").first()
+        if teacher:
+            return teacher.id, [s.id for c in teacher.classes for s in c.students]
+        admin = models.Administrator(name="bench", email="bench.admin@example.com", password=get_password_hash("bench"))
+        db.add(admin)
+        db.flush()
+        school = models.School(name="Bench School", administrator_id=admin.id)
+        db.add(school)
+        db.flush()
+        teacher = models.Teacher(name="bench", email="bench.teacher@example.com",
+                                 password=get_password_hash("bench"), school_id=school.id)
+        db.add(teacher)
+        db.flush()
+        students = []
+        for i in range(3):
+            cls = models.Class(name=f"Bench {i}", school_id=school.id, teacher_id=teacher.id)
+            db.add(cls)
+            db.flush()
+            for j in range(STUDENTS_PER_CLASS):
+                students.append(models.Student(name=f"S{i}-{j}", roll_no=str(j), class_id=cls.id, school_id=school.id))
+        db.add_all(students)
+        db.commit()
+        return teacher.id, [s.id for s in students]
+    finally:
+        db.close()
+
+
+def start_server(database_url: str, use_async: bool, workers: int):
+    env = dict(os.environ, DATABASE_URL=database_url, USE_ASYNC_DB="1" if use_async else "0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/", timeout=0.5)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+async def run_scenario(name, make_request, total, concurrency):
+    latencies = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=30) as client:
+        async def one(i):
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    r = await make_request(client, i)
+                    failed = r.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                latencies.append(time.perf_counter() - t0)
+                errors += failed
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - t0
+
+    q = statistics.quantiles(latencies, n=100)
+    return {
+        "scenario": name,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(q[49] * 1000, 1),
+        "p95_ms": round(q[94] * 1000, 1),
+        "p99_ms": round(q[98] * 1000, 1),
+        "errors": errors,
+    }
+
+
+async def run_all(token, student_ids, total, concurrency):
+    headers = {"Authorization": f"Bearer {token}"}
+    scenarios = [
+        ("teacher classes", lambda c, i: c.get("/teacher/classes", headers=headers)),
+        ("teacher students", lambda c, i: c.get("/teacher/students", headers=headers)),
+        ("attendance list", lambda c, i: c.get("/attendance/", params={"student_id": student_ids[i % len(student_ids)]})),
+        ("mark attendance", lambda c, i: c.post(
+            f"/teacher/attendance/student/{student_ids[i % len(student_ids)]}",
+            params={"status": "Present"}, headers=headers)),
+    ]
+    results = []
+    for name, fn in scenarios:
+        results.append(await run_scenario(name, fn, total, concurrency))
+        print(f"  {name}: {results[-1]['rps']} req/s, {results[-1]['errors']} errors", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    teacher_id, student_ids = seed(database_url)
+    from app.utils.auth_utils import create_access_token
+    token = create_access_token({"sub": str(teacher_id), "role": "teacher"})
+
+    results = {}
+    for mode in ("sync", "async"):
+        print(f"{mode}:", file=sys.stderr)
+        proc = start_server(database_url, mode == "async", args.workers)
+        try:
+            results[mode] = asyncio.run(run_all(token, student_ids, args.requests, args.concurrency))
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()  # a wedged sync server may never finish its in-flight requests
+                proc.wait()
+
+    print(f"{args.requests} requests per scenario at concurrency {args.concurrency}, {args.workers} worker(s)")
+    print(f"{'scenario':<18}{'mode':<7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for sync_row, async_row in zip(results["sync"], results["async"]):
+        for mode, row in (("sync", sync_row), ("async", async_row)):
+            print(f"{row['scenario']:<18}{mode:<7}{row['rps']:>9}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+                  f"{row['p99_ms']:>9}{row['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
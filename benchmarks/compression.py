@@ -0,0 +1,90 @@
+"""
+Bandwidth and latency effect of response compression (app/utils/compression.py) on the report endpoints.
+
+Seeds a district with app/seed_district.py into a throwaway SQLite file (or uses DATABASE_URL with
+--no-seed) and fetches each endpoint with Accept-Encoding identity, gzip and br. Reports the bytes
+on the wire, server time (including compression) and the modelled end-to-end time on a slow link:
+
+    end to end = server time + RTT + wire bytes / link bandwidth
+
+    python benchmarks/compression.py --link-kbps 750 --rtt-ms 300      # a poor 3G connection
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ENCODINGS = ("identity", "gzip", "br")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schools", type=int, default=1)
+    parser.add_argument("--teachers-per-school", type=int, default=10)
+    parser.add_argument("--students-per-class", type=int, default=40)
+    parser.add_argument("--years", type=float, default=0.25)
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--link-kbps", type=float, default=750.0, help="downlink bandwidth")
+    parser.add_argument("--rtt-ms", type=float, default=300.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/compression.db"
+    if not args.no_seed:
+        subprocess.run(
+            [sys.executable, os.path.join(ROOT, "app", "seed_district.py"), "--create-tables",
+             "--schools", str(args.schools), "--teachers-per-school", str(args.teachers_per_school),
+             "--students-per-class", str(args.students_per_class), "--years", str(args.years)],
+            env=dict(os.environ, DATABASE_URL=database_url), check=True, stdout=subprocess.DEVNULL,
+        )
+    os.environ["DATABASE_URL"] = database_url
+    from fastapi.testclient import TestClient
+    from app import models
+    from app.database import SessionLocal
+    from app.main import app
+    from app.utils.auth_utils import create_access_token
+    from app.utils.compression import BROTLI_QUALITY, GZIP_LEVEL
+
+    db = SessionLocal()
+    superadmin = db.query(models.SuperAdmin).first()
+    if superadmin is None:
+        superadmin = models.SuperAdmin(name="bench", email="bench.superadmin@example.com", password="x")
+        db.add(superadmin)
+        db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(superadmin.id), 'role': 'superadmin'})}"}
+    db.close()
+
+    endpoints = [
+        "/superadmin/attendance/report",
+        "/superadmin/attendance/report/excel?format=csv",
+        "/superadmin/attendance/report/excel",
+        "/superadmin/students",
+    ]
+    client = TestClient(app)
+    print(f"\nlink {args.link_kbps:.0f} kbit/s, RTT {args.rtt_ms:.0f} ms, gzip level {GZIP_LEVEL}, "
+          f"brotli quality {BROTLI_QUALITY}\n")
+    print(f"{'endpoint':<48}{'encoding':<10}{'wire KB':>10}{'ratio':>7}{'server ms':>11}{'end to end s':>14}")
+    for url in endpoints:
+        baseline = None
+        for encoding in ENCODINGS:
+            best, wire = float("inf"), 0
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                with client.stream("GET", url, headers={**headers, "Accept-Encoding": encoding}) as r:
+                    wire = sum(len(chunk) for chunk in r.iter_raw())
+                    applied = r.headers.get("content-encoding", "identity")
+                best = min(best, time.perf_counter() - t0)
+            baseline = baseline or wire
+            total = best + args.rtt_ms / 1000 + wire * 8 / (args.link_kbps * 1000)
+            label = encoding if applied == encoding else f"{encoding}*"
+            print(f"{url:<48}{label:<10}{wire / 1024:>10.1f}{baseline / wire:>7.1f}{best * 1000:>11.0f}{total:>14.2f}")
+    print("\n* not compressed (already-compressed media type)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Storage size and decode time of face embeddings: JSON text vs binary float32/float16.
+
+Decoding is measured from what the database driver hands back (a JSON string or raw
+bytes) to an (n, dim) float32 matrix ready for matching.
+
+    python benchmarks/embedding_storage.py --rows 60 --rows 5000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.face_embeddings import FACE_EMBEDDING_DIM, stack_embeddings  # noqa: E402
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, action="append", help="embeddings per load (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"dim={FACE_EMBEDDING_DIM}, best of {args.repeat}")
+    print(f"{'rows':>6}{'format':>9}{'bytes/row':>11}{'decode ms':>11}{'speedup':>9}")
+    for n in args.rows or [60, 5000]:
+        vectors = rng.standard_normal((n, FACE_EMBEDDING_DIM)).astype(np.float32)
+        as_json = [json.dumps(v.tolist()) for v in vectors]
+        as_f32 = [v.tobytes() for v in vectors]
+        as_f16 = [v.astype("<f2").tobytes() for v in vectors]
+
+        json_s = best_of(lambda: np.array([json.loads(s) for s in as_json], dtype=np.float32), args.repeat)
+        f32_s = best_of(lambda: stack_embeddings(as_f32, "float32"), args.repeat)
+        f16_s = best_of(lambda: stack_embeddings(as_f16, "float16"), args.repeat)
+
+        for name, rows, seconds in (("json", as_json, json_s), ("float32", as_f32, f32_s), ("float16", as_f16, f16_s)):
+            size = sum(len(r) for r in rows) / n
+            print(f"{n:>6}{name:>9}{size:>11.0f}{seconds * 1000:>11.3f}{json_s / seconds:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Import-time budget for app.main, i.e. how long a new uvicorn worker spends importing before it
+can serve.
+
+Runs `python -X importtime -c "import app.main"` in fresh interpreters, reports the median
+cumulative import time and the heaviest top-level packages, and fails (exit 1) when:
+
+  - app.main takes longer than --budget-ms (median of --runs), or
+  - a module that must load lazily (app/utils/lazy_imports.py) shows up in the import graph.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget-ms 600 --top 20
+
+The millisecond budget depends on the machine; set IMPORT_BUDGET_MS in CI to the runner's
+baseline plus headroom. The lazy-module check holds everywhere.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+# only some endpoints need these; importing them at startup is a regression
+MUST_BE_LAZY = ("numpy", "openpyxl", "pandas", "passlib", "scipy", "sklearn")
+
+
+def import_profile() -> list:
+    """
+    (module, self µs, cumulative µs, depth) for every module imported by `import app.main`.
+    """
+    env = dict(os.environ, DATABASE_URL=os.getenv("DATABASE_URL", "sqlite://"), PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import app.main failed:\n{result.stderr[-2000:]}")
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:       123 |        456 |     package.module" (two spaces per nesting level)
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15, help="heaviest top-level packages to list")
+    args = parser.parse_args()
+
+    runs = [import_profile() for _ in range(args.runs)]
+    totals = [next(cum for name, _, cum, _ in run if name == "app.main") / 1000 for run in runs]
+    median = statistics.median(totals)
+    profile = runs[totals.index(sorted(totals)[len(totals) // 2])]
+
+    # self time summed per top-level package, so e.g. all of sqlalchemy.* shows up as one line
+    packages = defaultdict(int)
+    for name, self_us, _, _ in profile:
+        packages[name.split(".")[0]] += self_us
+    print(f"\nimport app.main: median {median:.0f} ms over {args.runs} runs "
+          f"(min {min(totals):.0f}, max {max(totals):.0f}), budget {args.budget_ms:.0f} ms\n")
+    print(f"{'package':<28}{'self ms':>9}")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{package:<28}{self_us / 1000:>9.1f}")
+
+    imported = {name for name, _, _, _ in profile}
+    eager = sorted(m for m in MUST_BE_LAZY if m in imported)
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f"app.main imports in {median:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    if eager:
+        failures.append(f"imported at startup but should load lazily: {', '.join(eager)}")
+    if failures:
+        print("\nFAIL\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+List endpoint serialization: FastAPI's default pipeline vs the row fast path (app/utils/fast_json.py).
+
+Loads ROWS attendance records into a throwaway SQLite file, then times GET /attendance/ three ways:
+
+  default    ORM objects -> response_model validation -> jsonable_encoder -> json.dumps
+             (the endpoint as it was, mounted on a scratch app)
+  fast path  the real endpoint: selected columns -> TypeAdapter.dump_json
+  orjson     same rows through orjson, for reference (only if installed)
+
+Each is split into query time and serialization time, plus the full request through TestClient.
+The responses are checked to be identical.
+
+    python benchmarks/list_serialization.py --rows 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/serialization.db")
+os.environ.setdefault("REQUEST_METRICS", "0")
+
+from fastapi import Depends, FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.database import Base, SessionLocal, engine, get_read_db
+from app.main import app
+from app.utils.fast_json import dump_rows, schema_columns
+
+
+def seed(rows: int):
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        if conn.execute(models.Attendance.__table__.select().limit(1)).first():
+            return
+        conn.execute(models.Administrator.__table__.insert(), {"id": 1, "name": "a", "email": "a@example.com", "password": "x"})
+        conn.execute(models.School.__table__.insert(), {"id": 1, "name": "s", "administrator_id": 1})
+        conn.execute(models.Teacher.__table__.insert(), {"id": 1, "name": "t", "email": "t@example.com", "password": "x", "school_id": 1})
+        conn.execute(models.Class.__table__.insert(), {"id": 1, "name": "c", "school_id": 1, "teacher_id": 1})
+        students = max(rows // 250, 1)
+        conn.execute(models.Student.__table__.insert(), [
+            {"id": i + 1, "name": f"student {i}", "roll_no": str(i), "class_id": 1, "school_id": 1} for i in range(students)
+        ])
+        start = datetime(2024, 6, 1)
+        conn.execute(models.Attendance.__table__.insert(), [
+            {"student_id": i % students + 1, "teacher_id": 1, "status": "Absent" if i % 9 == 0 else "Present",
+             "date": start + timedelta(days=i // students)}
+            for i in range(rows)
+        ])
+
+
+def legacy_app() -> FastAPI:
+    """
+    /attendance/ as it was before the fast path.
+    """
+    legacy = FastAPI()
+
+    @legacy.get("/attendance/", response_model=List[schemas.AttendanceOut])
+    def list_attendance(db: Session = Depends(get_read_db)):
+        return db.query(models.Attendance).all()
+
+    return legacy
+
+
+def best_of(repeat: int, fn):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    seed(args.rows)
+    db = SessionLocal()
+    adapter = TypeAdapter(List[schemas.AttendanceOut])
+    columns = schema_columns(schemas.AttendanceOut, models.Attendance)
+
+    def default_serialize(objects):
+        # what FastAPI does with a response_model: validate, dump, jsonable_encoder, JSONResponse.render
+        content = jsonable_encoder(adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json"))
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+    results = {}
+    q_orm, objects = best_of(args.repeat, lambda: (db.expunge_all(), db.query(models.Attendance).all())[1])
+    s_orm, default_body = best_of(args.repeat, lambda: default_serialize(objects))
+    results["default"] = (q_orm, s_orm)
+
+    q_rows, rows = best_of(args.repeat, lambda: db.query(*columns).all())
+    s_fast, fast_body = best_of(args.repeat, lambda: dump_rows(schemas.AttendanceOut, rows))
+    results["fast path"] = (q_rows, s_fast)
+    assert fast_body == default_body, "fast path output differs from the default pipeline"
+
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+    if orjson is not None:
+        keys = tuple(schemas.AttendanceOut.model_fields)
+        s_orjson, orjson_body = best_of(args.repeat, lambda: orjson.dumps([dict(zip(keys, r)) for r in rows]))
+        results["orjson"] = (q_rows, s_orjson)
+        if orjson_body != default_body:
+            print("note: orjson output differs from the default pipeline", file=sys.stderr)
+    db.close()
+
+    legacy_client, client = TestClient(legacy_app()), TestClient(app)
+    e_default, r_default = best_of(args.repeat, lambda: legacy_client.get("/attendance/"))
+    e_fast, r_fast = best_of(args.repeat, lambda: client.get("/attendance/"))
+    assert r_default.content == r_fast.content, "endpoint responses differ"
+
+    print(f"\n{len(objects):,} attendance rows, {len(fast_body) / 1e6:.1f} MB of JSON, best of {args.repeat}\n")
+    print(f"{'path':<12}{'query ms':>10}{'serialize ms':>14}{'total ms':>10}")
+    for name, (query, serialize) in results.items():
+        print(f"{name:<12}{query * 1000:>10.0f}{serialize * 1000:>14.0f}{(query + serialize) * 1000:>10.0f}")
+    print(f"\nGET /attendance/ end to end: default {e_default * 1000:.0f} ms, fast path {e_fast * 1000:.0f} ms "
+          f"({e_default / e_fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
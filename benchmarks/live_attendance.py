@@ -0,0 +1,149 @@
+"""
+Fan-out of the live attendance stream (GET /administrator/attendance/live) to many subscribers.
+
+Seeds one school, boots uvicorn (one worker unless --workers; with more, streams and writes land
+on different workers and events cross over the change bus) and opens --subscribers SSE
+connections as the school's administrator. Then:
+
+  rounds  one attendance mark at a time (POST /teacher/attendance/student/{id}); reports how long
+          after the write was sent the first and the last subscriber got the class event
+  burst   --burst marks as fast as possible on one class; with coalescing each subscriber should
+          get about one event per LIVE_ATTENDANCE_INTERVAL, not one per write
+
+plus the server's peak RSS and /internal/live-attendance.
+
+    python benchmarks/live_attendance.py --subscribers 2000
+    python benchmarks/live_attendance.py --subscribers 2000 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from scenarios import PORT, RssSampler, load_district, seed, start_server  # noqa: E402
+
+
+class Subscriber:
+    def __init__(self):
+        self.events = []  # (arrival time, class id) per class event
+        self.snapshot = asyncio.Event()
+
+    async def run(self, token: str):
+        reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+        writer.write((f"GET /administrator/attendance/live HTTP/1.1\r\nHost: localhost\r\n"
+                      f"Authorization: Bearer {token}\r\nAccept: text/event-stream\r\n\r\n").encode())
+        await writer.drain()
+        event = None
+        try:
+            while line := await reader.readline():
+                if line.startswith(b"event: "):
+                    event = line[7:].strip()
+                elif line.startswith(b"data: ") and event == b"snapshot":
+                    self.snapshot.set()
+                elif line.startswith(b"data: ") and event == b"class":
+                    class_id = int(line.split(b'"class_id":', 1)[1].split(b",", 1)[0])
+                    self.events.append((time.perf_counter(), class_id))
+        finally:
+            writer.close()
+
+
+async def wait_for(condition, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep(0.005)
+    return True
+
+
+async def drive(args, admin_token: str, teacher_token: str, students: list):
+    subscribers = [Subscriber() for _ in range(args.subscribers)]
+    tasks = []
+    connect_start = time.perf_counter()
+    # a few at a time: each connect is a normal authenticated request and a burst larger than the
+    # DB pool ties up the threadpool until the pool timeout
+    for i in range(0, len(subscribers), 10):
+        tasks += [asyncio.create_task(s.run(admin_token)) for s in subscribers[i:i + 10]]
+        await asyncio.gather(*(s.snapshot.wait() for s in subscribers[i:i + 10]))
+    print(f"{args.subscribers} subscribers connected in {time.perf_counter() - connect_start:.1f} s")
+
+    first, last = [], []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}",
+                                 headers={"Authorization": f"Bearer {teacher_token}"}) as client:
+        for student_id in students[:args.rounds]:
+            seen = [len(s.events) for s in subscribers]
+            written = time.perf_counter()
+            r = await client.post(f"/teacher/attendance/student/{student_id}", params={"status": "Present"})
+            r.raise_for_status()
+            if not await wait_for(lambda: all(len(s.events) > n for s, n in zip(subscribers, seen)), 10):
+                print("  some subscribers got no event within 10 s")
+            arrivals = [s.events[n][0] for s, n in zip(subscribers, seen) if len(s.events) > n]
+            first.append((min(arrivals) - written) * 1000)
+            last.append((max(arrivals) - written) * 1000)
+            await asyncio.sleep(args.interval * 1.5)  # let the coalescing window close
+
+        seen = [len(s.events) for s in subscribers]
+        burst_start = time.perf_counter()
+        for student_id in students[args.rounds:args.rounds + args.burst]:
+            (await client.post(f"/teacher/attendance/student/{student_id}", params={"status": "Absent"})).raise_for_status()
+        burst_seconds = time.perf_counter() - burst_start
+        await asyncio.sleep(args.interval * 2)
+        stats = (await client.get("/internal/live-attendance")).json()
+
+    for task in tasks:
+        task.cancel()
+    burst_events = [len(s.events) - n for s, n in zip(subscribers, seen)]
+    print(f"\nsingle writes ({args.rounds} rounds), ms from sending the write to the event:")
+    print(f"  first subscriber  p50 {statistics.median(first):7.1f}  max {max(first):7.1f}")
+    print(f"  last subscriber   p50 {statistics.median(last):7.1f}  max {max(last):7.1f}")
+    print(f"\nburst: {args.burst} writes in {burst_seconds:.2f} s -> events per subscriber "
+          f"min {min(burst_events)}, max {max(burst_events)}")
+    print(f"\nserver: {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--burst", type=int, default=30)
+    parser.add_argument("--interval", type=float, default=1.0, help="LIVE_ATTENDANCE_INTERVAL for the server")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    args.schools, args.teachers_per_school, args.years = 1, 2, 0
+    args.students_per_class = (args.rounds + args.burst) * 3 // 2  # classes vary by +-20%
+
+    database_url = os.getenv("DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/live.db"
+    seed(database_url, args)
+    teachers, admins = load_district(database_url)
+    from app import models
+    from app.database import SessionLocal
+    from app.utils.attendance_utils import today_start
+    from app.utils.auth_utils import create_access_token
+
+    with SessionLocal() as db:  # start today's roll call from scratch
+        db.query(models.Attendance).filter(models.Attendance.date >= today_start()).delete()
+        db.commit()
+
+    teacher = teachers[0]
+    admin_token = create_access_token({"sub": str(admins[0]["id"]), "role": "administrator"})
+    teacher_token = create_access_token({"sub": str(teacher["id"]), "role": "teacher"})
+    os.environ["LIVE_ATTENDANCE_INTERVAL"] = str(args.interval)
+    server = start_server(database_url, workers=args.workers)
+    try:
+        with RssSampler(server.pid) as rss:
+            asyncio.run(drive(args, admin_token, teacher_token, teacher["students"]))
+        print(f"peak server RSS {rss.peak_kb / 1024:.0f} MB")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+int8 vs float32 gallery matching: memory, throughput and accuracy.
+
+Galleries are random unit vectors; probes are noisy copies of gallery rows (half of them)
+or unrelated faces (the other half). "top-1 agree" compares the chosen student with the
+float32 path; "decision agree" compares matched/unmatched at FACE_MATCH_THRESHOLD.
+
+    python benchmarks/quantized_match.py --gallery 60 --gallery 5000 --gallery 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app modules expect one; nothing is queried
+
+from app.utils.face_embeddings import (  # noqa: E402
+    FACE_EMBEDDING_DIM,
+    FACE_MATCH_THRESHOLD,
+    match_probes,
+    normalize_rows,
+    quantize_rows,
+    quantized_scores,
+)
+
+
+def best_ms(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gallery", type=int, action="append", help="gallery rows (repeatable)")
+    parser.add_argument("--probes", type=int, default=100)
+    parser.add_argument("--noise", type=float, default=0.04)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>7}{'path':>14}{'MB':>9}{'ms':>9}{'probes/s':>11}{'top-1 agree':>13}{'decision agree':>16}{'max |dscore|':>14}")
+    for n in args.gallery or [60, 5000, 50000]:
+        gallery = normalize_rows(rng.standard_normal((n, FACE_EMBEDDING_DIM)).astype(np.float32))
+        half = args.probes // 2
+        known = gallery[rng.integers(0, n, size=half)] + args.noise * rng.standard_normal((half, FACE_EMBEDDING_DIM))
+        unknown = rng.standard_normal((args.probes - half, FACE_EMBEDDING_DIM))
+        probes = np.vstack([known, unknown]).astype(np.float32)
+
+        quantized = quantize_rows(gallery)
+        reranked = quantize_rows(gallery, floats=gallery)  # exact rows resident, as with an mmap'd .npy
+
+        ref_best, ref_scores, ref_matched = match_probes(gallery, probes)
+        approx = quantized_scores(quantized, normalize_rows(probes))
+        results = {
+            "float32": (gallery.nbytes, lambda: match_probes(gallery, probes), None),
+            "int8": (quantized.nbytes, lambda: quantized_scores(quantized, normalize_rows(probes)), approx),
+            "int8+rerank": (reranked.nbytes, lambda: match_probes(reranked, probes), None),
+        }
+        for name, (nbytes, fn, scores) in results.items():
+            ms = best_ms(fn, args.repeat)
+            if scores is None:
+                best, best_scores, matched = fn()
+            else:
+                best = scores.argmax(axis=1)
+                best_scores = scores[np.arange(len(best)), best]
+                matched = best_scores >= FACE_MATCH_THRESHOLD
+            print(f"{n:>7}{name:>14}{nbytes / 2**20:>9.2f}{ms:>9.3f}{args.probes / ms * 1000:>11.0f}"
+                  f"{(best == ref_best).mean():>13.3f}{(matched == ref_matched).mean():>16.3f}"
+                  f"{np.abs(best_scores - ref_scores).max():>14.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+End-to-end load scenarios against app.main:app on a seeded database.
+
+Seeds a district with app/seed_district.py (unless --no-seed), boots uvicorn and runs:
+
+  login_storm      morning logins, every teacher hitting POST /auth/login at once
+  roll_call        teachers marking their classes through POST /teacher/attendance/student/{id}
+  admin_dashboard  administrators polling the school/class reports and lists
+  excel_exports    concurrent xlsx exports (school-wide and per teacher)
+
+For each: throughput, p50/p95/p99 latency, errors, SQL statements and DB time per request
+(from the server's /metrics) and the server's peak RSS. Results are written as JSON; pass
+--baseline with an earlier file to compare and exit non-zero on regressions.
+
+    python benchmarks/scenarios.py --schools 5 --years 1
+    python benchmarks/scenarios.py --baseline benchmarks/results/scenarios-<before>.json
+
+Without DATABASE_URL a throwaway SQLite file is used; fine for SQL counts and relative
+comparisons, but use PostgreSQL for absolute numbers (SQLite serialises writes).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PORT = 8766
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+PASSWORD = "password"  # what seed_district gives every user
+# metric -> True when higher is better; compared against --baseline
+COMPARED = {"rps": True, "p50_ms": False, "p95_ms": False, "p99_ms": False,
+            "sql_per_request": False, "peak_rss_mb": False}
+
+
+# ---------------------------
+# SETUP
+# ---------------------------
+def seed(database_url: str, args):
+    cmd = [sys.executable, os.path.join(ROOT, "app", "seed_district.py"), "--create-tables",
+           "--schools", str(args.schools), "--teachers-per-school", str(args.teachers_per_school),
+           "--students-per-class", str(args.students_per_class), "--years", str(args.years),
+           "--seed", str(args.seed), "--password", PASSWORD]
+    subprocess.run(cmd, env=dict(os.environ, DATABASE_URL=database_url), check=True, stdout=sys.stderr)
+
+
+def load_district(database_url: str):
+    """
+    Teachers (email, id, class ids, student ids) and administrators (id, class ids) to drive.
+    """
+    os.environ["DATABASE_URL"] = database_url
+    from app import models
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        students = {}
+        for student_id, class_id in db.query(models.Student.id, models.Student.class_id).order_by(models.Student.id):
+            students.setdefault(class_id, []).append(student_id)
+        teachers, admins = [], {}
+        for teacher_id, email, class_id, admin_id in (
+            db.query(models.Teacher.id, models.Teacher.email, models.Class.id, models.School.administrator_id)
+            .join(models.Class, models.Class.teacher_id == models.Teacher.id)
+            .join(models.School, models.School.id == models.Class.school_id)
+            .order_by(models.Teacher.id)
+        ):
+            if not teachers or teachers[-1]["id"] != teacher_id:
+                teachers.append({"id": teacher_id, "email": email, "classes": [], "students": []})
+            teachers[-1]["classes"].append(class_id)
+            teachers[-1]["students"] += students.get(class_id, [])
+            admins.setdefault(admin_id, []).append(class_id)
+        return teachers, [{"id": a, "classes": c} for a, c in admins.items()]
+    finally:
+        db.close()
+
+
+def start_server(database_url: str, workers: int):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=ROOT,
+    )
+    for _ in range(150):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/", timeout=0.5)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+# ---------------------------
+# SERVER-SIDE MEASUREMENTS
+# ---------------------------
+def _process_tree(pid: int) -> list:
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            for child in f.read().split():
+                pids += _process_tree(int(child))
+    except OSError:
+        pass
+    return pids
+
+
+def _rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class RssSampler:
+    """
+    Peak resident memory of the server (all workers together), sampled every 20 ms.
+    Linux only; reports 0 elsewhere.
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_kb = max(self.peak_kb, sum(_rss_kb(p) for p in _process_tree(self.pid)))
+            self._stop.wait(0.02)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def sql_totals() -> dict:
+    """
+    Statements, DB seconds and request count summed over every route, from /metrics.
+    """
+    totals = {"statements": 0.0, "db_seconds": 0.0, "requests": 0.0}
+    text = httpx.get(f"http://127.0.0.1:{PORT}/metrics", timeout=10).text
+    for line in text.splitlines():
+        if 'route="/metrics"' in line:
+            continue
+        name, _, value = line.rpartition(" ")
+        if name.startswith("http_request_sql_statements_sum"):
+            totals["statements"] += float(value)
+        elif name.startswith("http_request_sql_statements_count"):
+            totals["requests"] += float(value)
+        elif name.startswith("http_request_db_seconds_sum"):
+            totals["db_seconds"] += float(value)
+    return totals
+
+
+# ---------------------------
+# SCENARIOS
+# ---------------------------
+def scenarios(teachers, admins, args):
+    from app.utils.auth_utils import create_access_token
+
+    def bearer(sub, role):
+        return {"Authorization": f"Bearer {create_access_token({'sub': str(sub), 'role': role})}"}
+
+    teacher_headers = [bearer(t["id"], "teacher") for t in teachers]
+    admin_headers = [bearer(a["id"], "administrator") for a in admins]
+    # roll call: round-robin over teachers, each walking through their own students
+    marks = []
+    for n in range(max(len(t["students"]) for t in teachers)):
+        for i, t in enumerate(teachers):
+            if n < len(t["students"]):
+                marks.append((i, t["students"][n]))
+
+    def login(c, i):
+        return c.post("/auth/login", data={"username": teachers[i % len(teachers)]["email"], "password": PASSWORD})
+
+    def mark(c, i):
+        t, student_id = marks[i % len(marks)]
+        status = "Absent" if i % 10 == 0 else "Present"
+        return c.post(f"/teacher/attendance/student/{student_id}", params={"status": status}, headers=teacher_headers[t])
+
+    def dashboard(c, i):
+        a = i % len(admins)
+        page = (i // len(admins)) % 4
+        if page == 0:
+            return c.get("/administrator/attendance/school", headers=admin_headers[a])
+        if page == 1:
+            classes = admins[a]["classes"]
+            return c.get(f"/administrator/attendance/class/{classes[i % len(classes)]}", headers=admin_headers[a])
+        if page == 2:
+            return c.get("/administrator/teachers", headers=admin_headers[a])
+        return c.get("/administrator/classes", headers=admin_headers[a])
+
+    def export(c, i):
+        if i % 2:
+            return c.get("/administrator/attendance/school/excel", headers=admin_headers[i % len(admins)])
+        return c.get("/teacher/attendance/class/export", headers=teacher_headers[i % len(teachers)])
+
+    scale = args.scale
+    return [
+        ("login_storm", login, max(1, int(len(teachers) * 2 * scale)), min(len(teachers), 50)),
+        ("roll_call", mark, max(1, int(len(marks) * scale)), min(len(teachers), 100)),
+        ("admin_dashboard", dashboard, max(1, int(400 * scale)), 20),
+        ("excel_exports", export, max(1, int(24 * scale)), 6),
+    ]
+
+
+async def run_scenario(name, make_request, total, concurrency, server_pid):
+    latencies = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=120) as client:
+        async def one(i):
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    r = await make_request(client, i)
+                    failed = r.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                latencies.append(time.perf_counter() - t0)
+                errors += failed
+
+        before = await asyncio.to_thread(sql_totals)
+        with RssSampler(server_pid) as rss:
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(total)))
+            elapsed = time.perf_counter() - t0
+        after = await asyncio.to_thread(sql_totals)
+
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [latencies[0]] * 99
+    requests = max(after["requests"] - before["requests"], 1)
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(q[49] * 1000, 1),
+        "p95_ms": round(q[94] * 1000, 1),
+        "p99_ms": round(q[98] * 1000, 1),
+        "errors": errors,
+        "sql_per_request": round((after["statements"] - before["statements"]) / requests, 2),
+        "db_ms_per_request": round((after["db_seconds"] - before["db_seconds"]) * 1000 / requests, 2),
+        "peak_rss_mb": round(rss.peak_kb / 1024, 1),
+    }
+
+
+# ---------------------------
+# RESULTS
+# ---------------------------
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Print metric changes per scenario and return the ones worse than `tolerance` (a fraction).
+    """
+    regressions = []
+    print(f"\nvs baseline {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}), "
+          f"tolerance {tolerance:.0%}")
+    for name, row in results["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if not base:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED.items():
+            old, new = base.get(metric), row.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > tolerance:
+                flag = " !"
+                regressions.append(f"{name}.{metric}: {old} -> {new}")
+            changes.append(f"{metric} {change:+.0%}{flag}")
+        print(f"  {name:<17}" + ", ".join(changes))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schools", type=int, default=2)
+    parser.add_argument("--teachers-per-school", type=int, default=10)
+    parser.add_argument("--students-per-class", type=int, default=40)
+    parser.add_argument("--years", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-seed", action="store_true", help="use the district already in DATABASE_URL")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every scenario's request count")
+    parser.add_argument("--only", action="append", help="run just this scenario (repeatable)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", help="results file (default benchmarks/results/scenarios-<time>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    if not args.no_seed:
+        seed(database_url, args)
+    teachers, admins = load_district(database_url)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "database": database_url.split(":", 1)[0],
+            "workers": args.workers,
+            "teachers": len(teachers),
+            "students": sum(len(t["students"]) for t in teachers),
+            "args": vars(args),
+        },
+        "scenarios": {},
+    }
+    proc = start_server(database_url, args.workers)
+    try:
+        for name, fn, total, concurrency in scenarios(teachers, admins, args):
+            if args.only and name not in args.only:
+                continue
+            print(f"{name}: {total} requests at concurrency {concurrency}", file=sys.stderr)
+            results["scenarios"][name] = asyncio.run(run_scenario(name, fn, total, concurrency, proc.pid))
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+    print(f"\n{'scenario':<17}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+          f"{'SQL/req':>9}{'DB ms/req':>11}{'RSS MB':>9}")
+    for name, r in results["scenarios"].items():
+        print(f"{name:<17}{r['rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['errors']:>8}"
+              f"{r['sql_per_request']:>9}{r['db_ms_per_request']:>11}{r['peak_rss_mb']:>9}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"scenarios-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
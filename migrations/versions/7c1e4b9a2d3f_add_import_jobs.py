@@ -0,0 +1,43 @@
+"""add import_jobs
+
+Revision ID: 7c1e4b9a2d3f
+Revises: 0f58c3d8a45e
+Create Date: 2026-10-19 09:12:44.218305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e4b9a2d3f'
+down_revision: Union[str, Sequence[str], None] = '0f58c3d8a45e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "import_jobs",
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("kind", sa.String(20), nullable=False),
+        sa.Column("filename", sa.String(255), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("school_id", sa.Integer, sa.ForeignKey("schools.id"), nullable=False),
+        sa.Column("administrator_id", sa.Integer, sa.ForeignKey("administrators.id"), nullable=False),
+        sa.Column("total_bytes", sa.Integer, nullable=False),
+        sa.Column("received_bytes", sa.Integer, nullable=False),
+        sa.Column("rows_processed", sa.Integer, nullable=False),
+        sa.Column("rows_imported", sa.Integer, nullable=False),
+        sa.Column("error_count", sa.Integer, nullable=False),
+        sa.Column("errors", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+        sa.Column("started_at", sa.DateTime, nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime, nullable=True),
+        sa.Column("finished_at", sa.DateTime, nullable=True),
+    )
+
+def downgrade():
+    op.drop_table("import_jobs")
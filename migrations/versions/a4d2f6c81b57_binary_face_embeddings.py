@@ -0,0 +1,110 @@
+"""store face_embedding as binary float32
+
+Revision ID: a4d2f6c81b57
+Revises: 7c1e4b9a2d3f
+Create Date: 2026-10-19 11:02:17.640211
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d2f6c81b57'
+down_revision: Union[str, Sequence[str], None] = '7c1e4b9a2d3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+MODEL_VERSION = os.getenv("FACE_MODEL_VERSION", "default")
+
+students = sa.table(
+    "students",
+    sa.column("id", sa.Integer),
+    sa.column("face_embedding", sa.JSON),
+    sa.column("face_embedding_bin", sa.LargeBinary),
+    sa.column("face_embedding_dim", sa.Integer),
+    sa.column("face_embedding_dtype", sa.String),
+    sa.column("face_embedding_model", sa.String),
+)
+
+
+def _batches(bind, query):
+    """
+    Rows of `query` (id first) BATCH_SIZE at a time, paged on id. Each page is read in full
+    before the caller writes, since some drivers can't interleave an open cursor with updates.
+    """
+    last_id = None
+    while True:
+        page = query if last_id is None else query.where(students.c.id > last_id)
+        rows = bind.execute(page.order_by(students.c.id).limit(BATCH_SIZE)).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    op.add_column('students', sa.Column('face_embedding_bin', sa.LargeBinary(), nullable=True))
+    op.add_column('students', sa.Column('face_embedding_dim', sa.Integer(), nullable=True))
+    op.add_column('students', sa.Column('face_embedding_dtype', sa.String(10), nullable=True))
+    op.add_column('students', sa.Column('face_embedding_model', sa.String(50), nullable=True))
+
+    bind = op.get_bind()
+    query = sa.select(students.c.id, students.c.face_embedding).where(students.c.face_embedding.isnot(None))
+    update = (
+        students.update()
+        .where(students.c.id == sa.bindparam("_id"))
+        .values(
+            face_embedding_bin=sa.bindparam("blob"),
+            face_embedding_dim=sa.bindparam("dim"),
+            face_embedding_dtype="float32",
+            face_embedding_model=MODEL_VERSION,
+        )
+    )
+    for rows in _batches(bind, query):
+        params = []
+        for student_id, values in rows:
+            if not values:
+                continue
+            vec = np.asarray(values, dtype="<f4")
+            params.append({"_id": student_id, "blob": vec.tobytes(), "dim": int(vec.size)})
+        if params:
+            bind.execute(update, params)
+
+    with op.batch_alter_table('students') as batch_op:
+        batch_op.drop_column('face_embedding')
+        batch_op.alter_column('face_embedding_bin', new_column_name='face_embedding')
+
+
+def downgrade():
+    with op.batch_alter_table('students') as batch_op:
+        batch_op.alter_column('face_embedding', new_column_name='face_embedding_bin')
+    op.add_column('students', sa.Column('face_embedding', sa.JSON(), nullable=True))
+
+    bind = op.get_bind()
+    query = (
+        sa.select(students.c.id, students.c.face_embedding_bin, students.c.face_embedding_dtype)
+        .where(students.c.face_embedding_bin.isnot(None))
+    )
+    update = (
+        students.update()
+        .where(students.c.id == sa.bindparam("_id"))
+        .values(face_embedding=sa.bindparam("values"))
+    )
+    for rows in _batches(bind, query):
+        params = [
+            {"_id": student_id, "values": np.frombuffer(blob, dtype="<f2" if dtype == "float16" else "<f4").tolist()}
+            for student_id, blob, dtype in rows
+        ]
+        bind.execute(update, params)
+
+    with op.batch_alter_table('students') as batch_op:
+        batch_op.drop_column('face_embedding_bin')
+        batch_op.drop_column('face_embedding_dim')
+        batch_op.drop_column('face_embedding_dtype')
+        batch_op.drop_column('face_embedding_model')
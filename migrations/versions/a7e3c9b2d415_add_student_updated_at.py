@@ -0,0 +1,30 @@
+"""add updated_at to students
+
+Revision ID: a7e3c9b2d415
+Revises: f3a9d1c0b7e2
+Create Date: 2026-10-20 14:31:08.562917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e3c9b2d415'
+down_revision: Union[str, Sequence[str], None] = 'f3a9d1c0b7e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # SQLite can't ADD COLUMN with a non-constant default, so it copies the table instead
+    recreate = "always" if op.get_bind().dialect.name == "sqlite" else "auto"
+    with op.batch_alter_table('students', recreate=recreate) as batch_op:
+        batch_op.add_column(sa.Column("updated_at", sa.DateTime, server_default=sa.func.now()))
+
+
+def downgrade():
+    with op.batch_alter_table('students') as batch_op:
+        batch_op.drop_column("updated_at")
@@ -0,0 +1,34 @@
+"""add face_samples to student
+
+Revision ID: c9b5e2a7f013
+Revises: a4d2f6c81b57
+Create Date: 2026-10-19 13:25:40.118502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9b5e2a7f013'
+down_revision: Union[str, Sequence[str], None] = 'a4d2f6c81b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column('students', sa.Column('face_samples', sa.LargeBinary(), nullable=True))
+    op.add_column('students', sa.Column('face_sample_count', sa.Integer(), nullable=True))
+    # existing embeddings become each student's single enrolled sample
+    op.execute(
+        "UPDATE students SET face_samples = face_embedding, face_sample_count = 1 "
+        "WHERE face_embedding IS NOT NULL"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('students') as batch_op:
+        batch_op.drop_column('face_sample_count')
+        batch_op.drop_column('face_samples')
@@ -0,0 +1,46 @@
+"""unique attendance per student and day
+
+Revision ID: d2a8c4f6e190
+Revises: c9b5e2a7f013
+Create Date: 2026-10-19 14:40:08.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a8c4f6e190'
+down_revision: Union[str, Sequence[str], None] = 'c9b5e2a7f013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _day(dialect: str) -> str:
+    # midnight of each record's day, in the form the app stores today_start() in
+    if dialect == "postgresql":
+        return "date_trunc('day', date)"
+    if dialect == "sqlite":
+        return "strftime('%Y-%m-%d 00:00:00.000000', date)"
+    return "CAST(CAST(date AS DATE) AS DATETIME)"
+
+
+def upgrade():
+    # records are one per student per day: keep the newest where a student was marked more than
+    # once on a day (e.g. /attendance/mark, which stored the time, plus a roll-call upsert at
+    # midnight), then move the rest to midnight so the constraint covers the day
+    day = _day(op.get_bind().dialect.name)
+    op.execute(
+        "DELETE FROM attendance WHERE id NOT IN ("
+        f"SELECT MAX(id) FROM attendance GROUP BY student_id, {day})"
+    )
+    op.execute(f"UPDATE attendance SET date = {day} WHERE date <> {day}")
+    with op.batch_alter_table('attendance') as batch_op:
+        batch_op.create_unique_constraint('uq_attendance_student_date', ['student_id', 'date'])
+
+
+def downgrade():
+    with op.batch_alter_table('attendance') as batch_op:
+        batch_op.drop_constraint('uq_attendance_student_date', type_='unique')
@@ -0,0 +1,34 @@
+"""add school_calendars
+
+Revision ID: e5c1b7d94a26
+Revises: d2a8c4f6e190
+Create Date: 2026-10-19 18:27:51.604733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c1b7d94a26'
+down_revision: Union[str, Sequence[str], None] = 'd2a8c4f6e190'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "school_calendars",
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("school_id", sa.Integer, sa.ForeignKey("schools.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("year", sa.Integer, nullable=False),
+        sa.Column("days", sa.LargeBinary, nullable=False),
+        sa.Column("weekdays", sa.Integer, nullable=False),
+        sa.Column("updated_at", sa.DateTime, server_default=sa.func.now()),
+        sa.UniqueConstraint("school_id", "year", name="uq_school_calendar_year"),
+    )
+
+def downgrade():
+    op.drop_table("school_calendars")
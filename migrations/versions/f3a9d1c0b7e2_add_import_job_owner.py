@@ -0,0 +1,27 @@
+"""add owner to import_jobs
+
+Revision ID: f3a9d1c0b7e2
+Revises: e5c1b7d94a26
+Create Date: 2026-10-20 10:12:44.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d1c0b7e2'
+down_revision: Union[str, Sequence[str], None] = 'e5c1b7d94a26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column("import_jobs", sa.Column("owner", sa.String(32), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("import_jobs") as batch_op:
+        batch_op.drop_column("owner")
@@ -0,0 +1,20 @@
+"""
+Settings shared by every test module. app.* reads them at import time, so they are set here,
+before pytest imports any test module (and through it the app), against a throwaway directory.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="attendance_tests_")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR}/tests.db"
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ["REQUEST_METRICS"] = "1"
+os.environ["ADMISSION_CONTROL"] = "0"
+os.environ["REQUEST_PROFILING"] = "1"  # the X-Profile routes are budgeted too
+os.environ["INTERNAL_TOKEN"] = "budget-test"
+for name in ("ANN_INDEX_DIR", "IMPORT_DIR", "PROFILE_DIR", "CHANGE_BUS_DIR"):
+    os.environ[name] = os.path.join(WORK_DIR, name.lower())
+sys.path.insert(0, ROOT)
@@ -0,0 +1,162 @@
+"""
+Admission control (app/utils/admission.py): slots, reserved critical capacity, and 429 +
+Retry-After once a priority's queue is full, on small controllers with no app around them.
+
+    python -m pytest -q tests/test_admission.py
+"""
+import asyncio
+
+import pytest
+
+from app.utils.admission import AdmissionController, AdmissionMiddleware, Overloaded, request_priority
+
+LIMITS = {"critical": 2, "default": 1, "bulk": 1}
+
+
+def controller(**kwargs) -> AdmissionController:
+    options = dict(concurrency=4, reserved=1, bulk_concurrency=1, queue_timeout=5.0, queue_limits=LIMITS)
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+async def settle():
+    # let queued acquire() calls run up to their wait
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_request_priorities():
+    assert request_priority("POST", "/attendance/mark") == "critical"
+    assert request_priority("POST", "/teacher/attendance/student/12") == "critical"
+    assert request_priority("GET", "/administrator/attendance/school") == "bulk"
+    assert request_priority("GET", "/teacher/classes") == "default"
+    assert request_priority("GET", "/metrics") is None
+    assert request_priority("OPTIONS", "/attendance/mark") is None
+
+
+def test_sheds_when_the_queue_is_full():
+    async def scenario():
+        c = controller(concurrency=2, reserved=0)
+        running = [await c.acquire("default", None) for _ in range(2)]
+        queued = asyncio.create_task(c.acquire("default", None))
+        await settle()
+        assert not queued.done() and len(c.queues["default"]) == 1
+
+        with pytest.raises(Overloaded) as shed:
+            await c.acquire("default", None)
+        assert 1 <= shed.value.retry_after <= 30
+
+        c.release(running[0])
+        waiter = await queued
+        assert c.running == 2
+        for w in (running[1], waiter):
+            c.release(w)
+        assert c.running == 0
+        return c.stats()["decisions"]
+
+    assert asyncio.run(scenario()) == {"default:admitted": 2, "default:queued": 1, "default:shed_queue_full": 1}
+
+
+def test_sheds_after_the_queue_timeout():
+    async def scenario():
+        c = controller(concurrency=1, reserved=0, queue_timeout=0.05)
+        holder = await c.acquire("default", None)
+        with pytest.raises(Overloaded):
+            await c.acquire("default", None)
+        assert not c.queues["default"]
+        c.release(holder)
+        return c.stats()["decisions"]
+
+    assert asyncio.run(scenario())["default:shed_timeout"] == 1
+
+
+def test_reserved_slots_are_only_for_critical_requests():
+    async def scenario():
+        c = controller()  # 4 slots, 1 reserved, 1 bulk
+        bulk = await c.acquire("bulk", None)
+        queued_bulk = asyncio.create_task(c.acquire("bulk", None))
+        defaults = [await c.acquire("default", None) for _ in range(2)]
+        queued_default = asyncio.create_task(c.acquire("default", None))
+        await settle()
+        # 3 running: the non-reserved slots are full, the bulk limit too
+        assert c.running == 3
+        assert not queued_bulk.done() and not queued_default.done()
+
+        critical = await asyncio.wait_for(c.acquire("critical", None), timeout=1)
+        assert c.running == 4
+
+        # the critical request still counts against the shared slots
+        c.release(defaults[0])
+        await settle()
+        assert not queued_default.done()
+
+        # a freed slot goes to the queued default request, not the bulk one (bulk is at its limit)
+        c.release(critical)
+        await asyncio.wait_for(queued_default, timeout=1)
+        assert not queued_bulk.done()
+        c.release(bulk)
+        await asyncio.wait_for(queued_bulk, timeout=1)
+
+    asyncio.run(scenario())
+
+
+def test_one_school_waits_behind_another_once_over_its_share():
+    async def scenario():
+        c = controller(concurrency=4, reserved=0, school_share=0.5, queue_limits={**LIMITS, "default": 4})
+        busy = [await c.acquire("default", 1) for _ in range(2)]
+        others = [await c.acquire("default", 2) for _ in range(2)]
+        first = asyncio.create_task(c.acquire("default", 1))  # queued first, but school 1 is at its share
+        second = asyncio.create_task(c.acquire("default", 3))
+        await settle()
+        c.release(others[0])
+        await asyncio.wait_for(second, timeout=1)
+        assert not first.done() and c.deferred == 1
+        c.release(busy[0])
+        await asyncio.wait_for(first, timeout=1)
+
+    asyncio.run(scenario())
+
+
+async def call(middleware, method: str, path: str) -> list:
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware({"type": "http", "method": method, "path": path, "headers": []}, receive, send)
+    return messages
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_middleware_answers_429_with_retry_after():
+    async def scenario():
+        c = controller(concurrency=1, reserved=0, queue_limits={"critical": 1, "default": 0, "bulk": 0})
+        middleware = AdmissionMiddleware(ok_app, controller=c)
+        assert (await call(middleware, "GET", "/teacher/classes"))[0]["status"] == 429
+
+        c.queue_limits = {**c.queue_limits, "default": 1}
+        assert (await call(middleware, "GET", "/teacher/classes"))[0]["status"] == 200
+        assert c.running == 0  # the slot is released after the body
+
+        holder = await c.acquire("critical", None)
+        queued = asyncio.create_task(c.acquire("default", None))
+        await settle()
+        start = (await call(middleware, "GET", "/teacher/classes"))[0]
+        assert start["status"] == 429
+        headers = dict(start["headers"])
+        assert 1 <= int(headers[b"retry-after"]) <= 30
+
+        # monitoring and CORS preflights skip the queue even now
+        assert (await call(middleware, "GET", "/metrics"))[0]["status"] == 200
+        assert (await call(middleware, "OPTIONS", "/attendance/mark"))[0]["status"] == 200
+        c.release(holder)
+        c.release(await queued)
+
+    asyncio.run(scenario())
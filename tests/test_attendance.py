@@ -0,0 +1,107 @@
+"""
+Marking attendance: one-to-one probe assignment (app/utils/face_embeddings.py) and the
+per-day upsert every marking path goes through (app/utils/attendance_utils.py).
+
+    python -m pytest -q tests/test_attendance.py
+"""
+from datetime import timedelta
+from itertools import permutations
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import Base
+from app.utils.attendance_utils import today_start, upsert_attendance, upsert_statement
+from app.utils.face_embeddings import _hungarian_min, assign_one_to_one
+
+THRESHOLD = 0.5
+
+
+def total(scores: np.ndarray, pairs) -> float:
+    return float(sum(scores[p, s] for p, s in pairs))
+
+
+def brute_force_best(scores: np.ndarray, threshold: float) -> float:
+    """
+    Best total over every one-to-one assignment, counting only above-threshold pairs.
+    """
+    n, m = scores.shape
+    if n > m:
+        return brute_force_best(scores.T, threshold)
+    return max(
+        sum(scores[p, s] for p, s in enumerate(cols) if scores[p, s] >= threshold)
+        for cols in permutations(range(m), n)
+    )
+
+
+def test_hungarian_min_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for shape in [(3, 3), (3, 5), (4, 6)]:
+        cost = rng.random(shape)
+        cols = _hungarian_min(cost)
+        assert len(set(cols.tolist())) == shape[0]
+        best = min(sum(cost[r, c] for r, c in enumerate(p)) for p in permutations(range(shape[1]), shape[0]))
+        assert cost[np.arange(shape[0]), cols].sum() == pytest.approx(best)
+
+
+def test_greedy_can_lose_to_optimal():
+    # greedy takes the single best pair (0, 0) and leaves probe 1 nothing above threshold
+    scores = np.array([[0.9, 0.8], [0.85, 0.1]])
+    greedy = assign_one_to_one(scores, THRESHOLD)
+    optimal = assign_one_to_one(scores, THRESHOLD, method="hungarian")
+    assert greedy == [(0, 0)]
+    assert optimal == [(0, 1), (1, 0)]
+    assert total(scores, optimal) == pytest.approx(brute_force_best(scores, THRESHOLD))
+
+
+@pytest.mark.parametrize("shape", [(3, 4), (4, 3), (5, 5)])
+def test_assignment_is_one_to_one_and_optimal(shape):
+    rng = np.random.default_rng(sum(shape))
+    for _ in range(20):
+        scores = rng.random(shape)
+        for method in ("greedy", "hungarian"):
+            pairs = assign_one_to_one(scores, THRESHOLD, method=method)
+            assert len({p for p, _ in pairs}) == len({s for _, s in pairs}) == len(pairs)
+            assert all(scores[p, s] >= THRESHOLD for p, s in pairs)
+        best = brute_force_best(scores, THRESHOLD)
+        assert total(scores, assign_one_to_one(scores, THRESHOLD, method="hungarian")) == pytest.approx(best)
+        assert total(scores, assign_one_to_one(scores, THRESHOLD)) <= best + 1e-9
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def rows(db: Session):
+    return db.query(models.Attendance).order_by(models.Attendance.date).all()
+
+
+def test_upsert_statement_updates_on_conflict(db):
+    day = today_start()
+    db.execute(upsert_statement("sqlite", {1: (10, "Present"), 2: (10, "Present")}, day))
+    db.execute(upsert_statement("sqlite", {1: (11, "Absent")}, day))
+    db.commit()
+    assert [(a.student_id, a.teacher_id, a.status) for a in rows(db)] == [(1, 11, "Absent"), (2, 10, "Present")]
+
+
+def test_upsert_statement_without_upsert_support():
+    assert upsert_statement("mssql", {1: (10, "Present")}, today_start()) is None
+
+
+def test_same_day_double_mark_keeps_one_record(db):
+    upsert_attendance(db, {1: (10, "Present")})
+    upsert_attendance(db, {1: (10, "Absent")})
+    assert [(a.date, a.status) for a in rows(db)] == [(today_start(), "Absent")]
+
+    # the next day is a new record
+    tomorrow = today_start() + timedelta(days=1)
+    upsert_attendance(db, {1: (10, "Present")}, tomorrow)
+    assert [(a.date, a.status) for a in rows(db)] == [(today_start(), "Absent"), (tomorrow, "Present")]
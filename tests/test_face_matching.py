@@ -0,0 +1,60 @@
+"""
+int8 galleries (app/utils/face_embeddings.py): approximate scores from quantized_scores, then an
+exact re-rank of the top candidates, must pick the same student as the exact float search.
+
+    python -m pytest -q tests/test_face_matching.py
+"""
+import numpy as np
+import pytest
+
+from app.utils.face_embeddings import (
+    FACE_EMBEDDING_DIM,
+    QUANT_CHUNK_ROWS,
+    match_probes,
+    normalize_rows,
+    quantize_rows,
+    quantized_scores,
+    rerank,
+)
+
+
+def gallery_and_probes(n: int, n_probes: int = 64, noise: float = 0.5, seed: int = 0):
+    """
+    `n` unit-length students and noisy captures of `n_probes` of them.
+    """
+    rng = np.random.default_rng(seed)
+    gallery = normalize_rows(rng.standard_normal((n, FACE_EMBEDDING_DIM)).astype(np.float32))
+    who = rng.choice(n, size=n_probes, replace=False)
+    jitter = rng.standard_normal((n_probes, FACE_EMBEDDING_DIM)).astype(np.float32) / np.sqrt(FACE_EMBEDDING_DIM)
+    return gallery, normalize_rows(gallery[who] + noise * jitter), who
+
+
+def test_quantized_scores_track_exact_scores():
+    # more rows than one chunk, so the chunked multiply is covered too
+    gallery, probes, _ = gallery_and_probes(QUANT_CHUNK_ROWS + 100, n_probes=8)
+    approx = quantized_scores(quantize_rows(gallery), probes)
+    assert approx.shape == (8, len(gallery))
+    assert np.abs(approx - probes @ gallery.T).max() < 0.02
+
+
+@pytest.mark.parametrize("exact", ["floats", "exact_rows", "dequantized"])
+def test_rerank_top1_agrees_with_exact_search(exact):
+    gallery, probes, who = gallery_and_probes(5000)
+    quantized = quantize_rows(gallery, floats=gallery if exact == "floats" else None)
+    exact_rows = (lambda rows: gallery[rows]) if exact == "exact_rows" else None
+
+    best, scores = rerank(quantized, probes, quantized_scores(quantized, probes), exact_rows=exact_rows)
+    exact_best = (probes @ gallery.T).argmax(axis=1)
+    assert (best == exact_best).all()
+    assert (best == who).all()
+    if exact != "dequantized":
+        assert scores == pytest.approx((probes * gallery[best]).sum(axis=1), abs=1e-5)
+
+
+def test_match_probes_quantized_matches_float_gallery():
+    gallery, probes, _ = gallery_and_probes(300, noise=2.0, seed=1)
+    best, scores, matched = match_probes(gallery, probes)
+    q_best, q_scores, q_matched = match_probes(quantize_rows(gallery, floats=gallery), probes)
+    assert (q_best == best).all()
+    assert q_scores == pytest.approx(scores, abs=1e-5)
+    assert (q_matched == matched).all()
@@ -0,0 +1,267 @@
+"""
+Query budgets (app/utils/query_budget.py) on seeded data: every budgeted route is called once
+with QUERY_BUDGET_MODE=raise, so a route over its statement budget, or running the same SELECT
+in a loop, fails with a 500 naming the budget.
+
+    python -m pytest -q tests
+    USE_ASYNC_DB=1 python -m pytest -q tests    # the async hot endpoints instead of the sync ones
+"""
+import io
+import os
+import subprocess
+import sys
+from datetime import date
+
+import numpy as np
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+# the database, QUERY_BUDGET_MODE=raise and the other settings come from conftest.py
+from app import models
+from app.database import SessionLocal
+from app.main import app
+from app.utils.auth_utils import create_access_token, get_password_hash
+from app.utils.face_embeddings import FACE_EMBEDDING_DIM
+from app.utils.request_metrics import registry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "budget-pass"
+
+# budgeted routes this module doesn't call, and why
+NOT_CALLED = {
+    ("GET", "/administrator/attendance/live"): "an event stream that never ends; its budget covers only the setup",
+}
+
+
+def budgeted_routes() -> set:
+    def has_budget(dependant) -> bool:
+        return any(getattr(d.call, "__name__", "") == "declare_budget" or has_budget(d)
+                   for d in dependant.dependencies)
+
+    return {
+        (method, route.path)
+        for route in app.routes
+        if isinstance(route, APIRoute) and has_budget(route.dependant)
+        for method in route.methods
+    }
+
+
+@pytest.fixture(scope="module")
+def district():
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, "app", "seed_district.py"), "--create-tables",
+         "--schools", "2", "--teachers-per-school", "2", "--students-per-class", "8",
+         "--years", "0.2", "--embeddings", "2", "--password", PASSWORD, "--seed", "7"],
+        env=dict(os.environ), check=True, stdout=subprocess.DEVNULL,
+    )
+    with SessionLocal() as db:
+        superadmin = models.SuperAdmin(name="Budget", email="budget@example.com",
+                                       password=get_password_hash(PASSWORD))
+        db.add(superadmin)
+        db.commit()
+        school = db.query(models.School).order_by(models.School.id).first()
+        teacher = db.query(models.Teacher).filter(models.Teacher.school_id == school.id).order_by(models.Teacher.id).first()
+        classes = [c.id for c in teacher.classes]
+        students = [s.id for c in teacher.classes for s in c.students]
+        return {
+            "superadmin": superadmin.id,
+            "school": school.id,
+            "administrator": school.administrator_id,
+            "teacher": teacher.id,
+            "teacher_email": teacher.email,
+            "class": classes[0],
+            "students": students,
+        }
+
+
+@pytest.fixture(scope="module")
+def client(district):
+    with TestClient(app) as client:
+        yield client
+
+
+def bearer(role: str, user_id: int, school_id=None) -> dict:
+    claims = {"sub": str(user_id), "role": role}
+    if school_id is not None:
+        claims["school_id"] = school_id
+    return {"Authorization": f"Bearer {create_access_token(claims)}"}
+
+
+def call(client, method: str, path: str, headers=None, **kwargs):
+    response = client.request(method, path, headers=headers or {}, **kwargs)
+    assert response.status_code < 400, f"{method} {path}: {response.status_code} {response.text[:500]}"
+    return response
+
+
+def csv_file(rows) -> dict:
+    return {"file": ("rows.csv", "\n".join(",".join(map(str, row)) for row in rows).encode(), "text/csv")}
+
+
+def probes(n: int) -> list:
+    rng = np.random.default_rng(n)
+    return rng.standard_normal((n, FACE_EMBEDDING_DIM)).astype(np.float32).tolist()
+
+
+def test_auth_and_attendance(client, district):
+    call(client, "GET", "/")
+    call(client, "POST", "/auth/login", data={"username": district["teacher_email"], "password": PASSWORD})
+    call(client, "POST", "/attendance/mark",
+         json={"student_id": district["students"][-1], "teacher_id": district["teacher"], "status": "Present"})
+    call(client, "GET", "/attendance/")
+
+
+def test_superadmin(client, district):
+    h = bearer("superadmin", district["superadmin"])
+    sa = call(client, "POST", "/superadmin/", h, json={"name": "s", "email": "s2@example.com", "password": "pw"}).json()["id"]
+    call(client, "GET", "/superadmin/", h)
+    call(client, "PUT", f"/superadmin/{sa}", h, json={"name": "s3", "email": "s3@example.com", "password": "pw"})
+    call(client, "DELETE", f"/superadmin/{sa}", h)
+    admin = call(client, "POST", "/superadmin/administrators", h,
+                 json={"name": "a", "email": "a2@example.com", "password": "pw"}).json()["id"]
+    call(client, "GET", "/superadmin/administrators", h)
+    call(client, "PUT", f"/superadmin/administrators/{admin}", h,
+         json={"name": "a3", "email": "a3@example.com", "password": "pw"})
+    school = call(client, "POST", "/superadmin/schools", h, json={"name": "S", "administrator_id": admin}).json()["id"]
+    call(client, "GET", "/superadmin/schools", h)
+    call(client, "PUT", f"/superadmin/schools/{school}", h, json={"name": "S2", "administrator_id": admin})
+    teacher = call(client, "POST", "/superadmin/teachers", h,
+                   json={"name": "t", "email": "t2@example.com", "password": "pw", "school_id": school}).json()["id"]
+    call(client, "GET", "/superadmin/teachers", h)
+    call(client, "PUT", f"/superadmin/teachers/{teacher}", h,
+         json={"name": "t3", "email": "t3@example.com", "password": "pw", "school_id": school})
+    student = call(client, "POST", "/superadmin/students", h,
+                   json={"name": "n", "roll_no": "1", "class_id": district["class"], "school_id": district["school"]}).json()["id"]
+    call(client, "GET", "/superadmin/students", h)
+    call(client, "PUT", f"/superadmin/students/{student}", h, json={"name": "m", "face_embedding": probes(1)[0]})
+    call(client, "DELETE", f"/superadmin/students/{student}", h)
+    call(client, "DELETE", f"/superadmin/teachers/{teacher}", h)
+    call(client, "DELETE", f"/superadmin/schools/{school}", h)
+    call(client, "DELETE", f"/superadmin/administrators/{admin}", h)
+    call(client, "GET", "/superadmin/students/export-excel", h)
+    call(client, "GET", "/superadmin/attendance/report", h)
+    call(client, "GET", "/superadmin/attendance/report/excel", h)
+    # profile a request in place, then read it back
+    profile_id = call(client, "GET", "/superadmin/schools", {**h, "X-Profile": h["Authorization"][7:]}).headers["X-Profile-Id"]
+    call(client, "GET", "/superadmin/profiles", h)
+    call(client, "GET", f"/superadmin/profiles/{profile_id}", h)
+    call(client, "GET", f"/superadmin/profiles/{profile_id}/folded", h)
+
+
+def test_administrator(client, district):
+    h = bearer("administrator", district["administrator"], district["school"])
+    school, class_id, students = district["school"], district["class"], district["students"]
+    teacher = call(client, "POST", "/administrator/teachers", h,
+                   json={"name": "t", "email": "t4@example.com", "password": "pw", "school_id": school}).json()["id"]
+    call(client, "GET", "/administrator/teachers", h)
+    call(client, "PUT", f"/administrator/teachers/{teacher}", h, json={"name": "t5"})
+    call(client, "POST", "/administrator/teachers/upload-excel", h,
+         files=csv_file([["name", "email", "password"]] + [[f"u{i}", f"u{i}@example.com", "pw"] for i in range(30)]))
+    new_class = call(client, "POST", "/administrator/classes", h,
+                     json={"name": "C9", "school_id": school, "teacher_id": teacher}).json()["id"]
+    call(client, "GET", "/administrator/classes", h)
+    call(client, "PUT", f"/administrator/classes/{new_class}", h, json={"name": "C10"})
+    call(client, "POST", "/administrator/classes/upload-excel", h,
+         files=csv_file([["name", "teacher_id"]] + [[f"K{i}", district["teacher"]] for i in range(30)]))
+    student = call(client, "POST", "/administrator/students", h,
+                   json={"name": "n", "roll_no": "1", "class_id": class_id, "school_id": school}).json()["id"]
+    call(client, "GET", "/administrator/students", h)
+    call(client, "PUT", f"/administrator/students/{student}", h, json={"name": "q", "face_embedding": probes(1)[0]})
+    call(client, "POST", "/administrator/students/upload-excel", h,
+         files=csv_file([["id", "name", "roll_no"]] + [[s, f"r{s}", "9"] for s in students]))
+    samples = np.asarray(probes(len(students)), dtype="<f4")
+    call(client, "POST", f"/administrator/classes/{class_id}/enroll", h,
+         files={"file": ("faces.bin", samples.tobytes(), "application/octet-stream")},
+         data={"student_ids": ",".join(map(str, students))})
+    call(client, "GET", f"/administrator/classes/{class_id}/students", h)
+    call(client, "GET", "/administrator/calendar", h)
+    year = date.today().year
+    call(client, "PUT", f"/administrator/calendar/{year}", h, json={"weekdays": [0, 1, 2, 3, 4]})
+    call(client, "GET", f"/administrator/attendance/student/{students[0]}", h)
+    call(client, "GET", f"/administrator/attendance/class/{class_id}", h)
+    call(client, "GET", "/administrator/attendance/school", h)
+    call(client, "GET", "/administrator/attendance/unmarked", h)
+    call(client, "GET", "/administrator/attendance/school/excel", h)
+    call(client, "GET", "/administrator/attendance/school/excel", h, params={"format": "csv"})
+    call(client, "POST", "/administrator/attendance/school/recognize", h, json={"probes": samples[:5].tolist()})
+    call(client, "DELETE", f"/administrator/classes/{new_class}", h)
+    call(client, "DELETE", f"/administrator/teachers/{teacher}", h)
+
+
+def test_teacher(client, district):
+    h = bearer("teacher", district["teacher"], district["school"])
+    class_id, student = district["class"], district["students"][0]
+    call(client, "GET", "/teacher/students", h)
+    call(client, "GET", "/teacher/classes", h)
+    call(client, "POST", f"/teacher/attendance/student/{student}", h, params={"status": "Present"})
+    call(client, "POST", f"/teacher/attendance/class/{class_id}/recognize", h, json={"probes": probes(6), "frame": True})
+    call(client, "GET", f"/teacher/attendance/student/{student}", h)
+    call(client, "GET", "/teacher/attendance/class", h)
+    call(client, "GET", "/teacher/attendance/unmarked", h)
+    call(client, "GET", f"/teacher/attendance/student/{student}/export", h)
+    call(client, "GET", "/teacher/attendance/class/export", h)
+    call(client, "GET", "/teacher/attendance/class/export", h, params={"format": "csv"})
+
+
+def test_classes(client, district):
+    h = bearer("superadmin", district["superadmin"])
+    with SessionLocal() as db:
+        spare = models.Class(name="Spare", school_id=district["school"], teacher_id=district["teacher"])
+        db.add(spare)
+        db.commit()
+        spare_id = spare.id
+    call(client, "GET", "/classes/", h)
+    call(client, "GET", f"/classes/{district['class']}", h)
+    call(client, "PUT", f"/classes/{spare_id}", h, json={"name": "Spare 2"})
+    call(client, "DELETE", f"/classes/{spare_id}", h)
+
+
+def test_imports(client, district):
+    h = bearer("administrator", district["administrator"], district["school"])
+    data = b"name,email,password\n" + b"".join(f"i{i},i{i}@example.com,pw\n".encode() for i in range(20))
+    job = call(client, "POST", "/imports/", h,
+               json={"kind": "teachers", "filename": "teachers.csv", "total_bytes": len(data)}).json()["id"]
+    half = len(data) // 2
+    for offset, chunk in ((0, data[:half]), (half, data[half:])):
+        call(client, "PUT", f"/imports/{job}/chunks", h, params={"offset": offset},
+             files={"chunk": ("chunk", io.BytesIO(chunk), "application/octet-stream")})
+    call(client, "POST", f"/imports/{job}/complete", h)
+    call(client, "GET", f"/imports/{job}", h)
+
+
+def test_internal(client):
+    h = {"X-Internal-Token": os.environ["INTERNAL_TOKEN"]}
+    for path in ("/internal/pool", "/internal/admission", "/internal/embedding-cache", "/internal/school-calendars",
+                 "/internal/live-attendance", "/internal/change-bus", "/internal/slow-queries", "/metrics"):
+        call(client, "GET", path, h)
+
+
+def test_every_budgeted_route_was_called():
+    # runs last: the metrics registry has every route the tests above reached
+    called = {key for key, metrics in registry.routes.items() if metrics.latency.count}
+    missing = budgeted_routes() - called - set(NOT_CALLED)
+    assert not missing, f"budgeted routes without a request in this module: {sorted(missing)}"
+
+
+def test_over_budget_request_fails():
+    from fastapi import Depends, FastAPI
+
+    from app.database import get_db
+    from app.utils.query_budget import query_budget
+    from app.utils.request_metrics import RequestMetricsMiddleware
+
+    probe = FastAPI()
+    probe.add_middleware(RequestMetricsMiddleware)
+
+    @probe.get("/loop", dependencies=[Depends(query_budget(None, max_repeats=3))])
+    def loop(db=Depends(get_db)):
+        return [db.query(models.Student).filter(models.Student.id == i).count() for i in range(5)]
+
+    @probe.get("/many", dependencies=[Depends(query_budget(2))])
+    def many(db=Depends(get_db)):
+        return [db.query(models.Student).count(), db.query(models.Class).count(), db.query(models.School).count()]
+
+    with TestClient(probe) as client:
+        loop_response, many_response = client.get("/loop"), client.get("/many")
+    assert loop_response.status_code == 500 and "likely an N+1" in loop_response.json()["detail"]
+    assert many_response.status_code == 500 and "3 SQL statements (budget 2)" in many_response.json()["detail"]
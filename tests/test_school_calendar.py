@@ -0,0 +1,115 @@
+"""
+Instructional-day bitsets (app/utils/school_calendar.py) against a day-by-day count, for ranges
+that cross New Year (inside one academic year) and the academic year boundary.
+
+    python -m pytest -q tests/test_school_calendar.py
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import Base
+from app.utils.school_calendar import (
+    SCHOOL_WEEKDAYS,
+    YearCalendar,
+    build_days,
+    calendar_cache,
+    expected_days,
+    weekday_mask,
+    year_span,
+)
+
+WEEKDAYS = (0, 1, 2, 3, 4)
+HOLIDAYS = [date(2025, 12, 25), date(2025, 12, 26), date(2026, 1, 1)]
+EXTRA_DAYS = [date(2026, 1, 3)]  # a Saturday make-up day
+SCHOOL_ID = 4242
+
+
+def brute_force(first: date, last: date, is_open) -> int:
+    return sum(is_open(first + timedelta(days=i)) for i in range((last - first).days + 1))
+
+
+def stored_2025(day: date) -> bool:
+    # the calendar stored for academic year 2025 below; other years are the SCHOOL_WEEKDAYS default
+    if day in EXTRA_DAYS:
+        return True
+    return day.weekday() in WEEKDAYS and day not in HOLIDAYS
+
+
+def school_day(day: date) -> bool:
+    start, end = year_span(2025)
+    return stored_2025(day) if start <= day < end else day.weekday() in SCHOOL_WEEKDAYS
+
+
+def ordinals(*days: date) -> np.ndarray:
+    return np.array([d.toordinal() for d in days], dtype=np.int64)
+
+
+def test_build_days_marks_pattern_holidays_and_extra_days():
+    calendar = YearCalendar(2025, build_days(2025, WEEKDAYS, HOLIDAYS, EXTRA_DAYS), WEEKDAYS, stored=True)
+    start, end = year_span(2025)
+    assert len(calendar.open) == (end - start).days == 365
+    assert [calendar.is_open(start + timedelta(days=i)) for i in range(365)] == \
+           [stored_2025(start + timedelta(days=i)) for i in range(365)]
+    described = calendar.describe()
+    assert described["holidays"] == HOLIDAYS
+    assert described["extra_days"] == EXTRA_DAYS
+    assert described["instructional_days"] == brute_force(start, end - timedelta(days=1), stored_2025)
+
+
+@pytest.mark.parametrize("day", [date(2025, 5, 31), date(2026, 6, 1)])
+def test_build_days_rejects_days_outside_the_year(day):
+    with pytest.raises(ValueError):
+        build_days(2025, WEEKDAYS, holidays=[day])
+
+
+def test_count_across_new_year_and_the_academic_year_boundary():
+    calendars = [
+        YearCalendar.default(2024),
+        YearCalendar(2025, build_days(2025, WEEKDAYS, HOLIDAYS, EXTRA_DAYS), WEEKDAYS, stored=True),
+        YearCalendar.default(2026),
+    ]
+    ranges = [
+        (date(2025, 12, 20), date(2026, 1, 10)),  # New Year, inside academic year 2025
+        (date(2025, 5, 20), date(2025, 6, 10)),  # academic years 2024 -> 2025
+        (date(2026, 5, 25), date(2026, 6, 5)),  # academic years 2025 -> 2026
+        (date(2025, 3, 1), date(2026, 9, 30)),  # all three years
+        (date(2025, 6, 1), date(2025, 6, 1)),  # a single (Sunday) day
+    ]
+    first = ordinals(*(f for f, _ in ranges))
+    last = ordinals(*(l for _, l in ranges))
+    counts = sum(calendar.count(first, last) for calendar in calendars)
+    assert counts.tolist() == [brute_force(f, l, school_day) for f, l in ranges]
+
+
+def test_count_is_zero_outside_the_year_and_for_empty_ranges():
+    calendar = YearCalendar.default(2025)
+    first = ordinals(date(2024, 1, 1), date(2027, 1, 1), date(2025, 9, 10))
+    last = ordinals(date(2024, 12, 31), date(2027, 2, 1), date(2025, 9, 1))
+    assert calendar.count(first, last).tolist() == [0, 0, 0]
+
+
+def test_expected_days_uses_the_stored_year_and_defaults_around_it():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    try:
+        with Session(engine) as db:
+            db.add(models.SchoolCalendar(school_id=SCHOOL_ID, year=2025, weekdays=weekday_mask(WEEKDAYS),
+                                         days=build_days(2025, WEEKDAYS, HOLIDAYS, EXTRA_DAYS)))
+            db.commit()
+            calendar_cache.invalidate(SCHOOL_ID)
+            ranges = [
+                (date(2025, 12, 20), date(2026, 1, 10)),
+                (date(2025, 5, 20), date(2025, 6, 10)),
+                (None, date(2025, 6, 10)),  # no first day: nothing expected
+                (date(2026, 1, 10), date(2026, 1, 1)),  # empty
+            ]
+            expected = [brute_force(f, l, school_day) if f and f <= l else 0 for f, l in ranges]
+            assert expected_days(db, SCHOOL_ID, ranges).tolist() == expected
+    finally:
+        calendar_cache.invalidate(SCHOOL_ID)
+        engine.dispose()